@@ -0,0 +1,442 @@
+"""Benchmarks for db_operations.
+
+Run from the repo root:
+    python bench_db_operations.py            # every benchmark
+    python bench_db_operations.py storage    # just the named ones
+    python bench_db_operations.py --memory   # RAM-backed databases, nothing on disk
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import db_async
+import db_operations as db
+import db_transfer
+import db_write_queue
+
+IN_MEMORY = False  # set by --memory
+
+
+@contextmanager
+def temp_database(profile="fast"):
+    """Point db_operations at a throwaway database for the length of the block."""
+    tmp_dir = tempfile.mkdtemp(prefix="bench_db_")
+    old_path, old_profile = db.DBFOLDER, db.STORAGE_PROFILE
+    db.configure(":memory:" if IN_MEMORY else os.path.join(tmp_dir, "bench.db"))
+    try:
+        db.initialize_db(profile=profile)
+        yield
+    finally:
+        db.configure(old_path)
+        db.STORAGE_PROFILE = old_profile
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def report(name, count, seconds, unit="ops"):
+    rate = count / seconds if seconds else float("inf")
+    print(f"  {name:<40} {count:>8} {unit} in {seconds:7.3f}s  {rate:>12,.0f} {unit}/s")
+
+
+def bench_storage_profiles(writes=2000, readers=2):
+    """Single-row commits, then the same writes with reader threads polling."""
+    print("storage profiles")
+    for profile in ("safe", "fast"):
+        with temp_database(profile):
+            db.new_user(db.User(sub="bench"))
+
+            start = time.perf_counter()
+            for i in range(writes):
+                db.add_journal_entry(db.JournalEntry(user_sub="bench", entry_text=f"entry {i}"))
+            report(f"{profile}: sequential writes", writes, time.perf_counter() - start)
+
+            stop = threading.Event()
+            reads = [0] * readers
+
+            def read_loop(slot):
+                while not stop.is_set():
+                    db.get_journal_entry(1 + reads[slot] % writes)
+                    reads[slot] += 1
+
+            threads = [threading.Thread(target=read_loop, args=(n,)) for n in range(readers)]
+            for t in threads:
+                t.start()
+            start = time.perf_counter()
+            for i in range(writes):
+                db.add_journal_entry(db.JournalEntry(user_sub="bench", entry_text=f"entry {i}"))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            for t in threads:
+                t.join()
+            report(f"{profile}: writes with {readers} readers", writes, elapsed)
+            report(f"{profile}: concurrent reads", sum(reads), elapsed)
+
+
+def bench_analysis_writes(entries=1000, nuances_per_entry=5):
+    """Persisting run_workflow results: per-row helpers vs save_analysis vs bulk."""
+    print("analysis writes")
+    scores = db.JournalScores(happy=10, angry=20, fearful=30, surprised=40, bad=50, disgusted=60, sad=70)
+    nuances = [f"nuance {n}" for n in range(nuances_per_entry)]
+    rows = entries * (2 + nuances_per_entry)
+
+    for profile in ("safe", "fast"):
+        with temp_database(profile):
+            db.new_user(db.User(sub="bench"))
+            with db.transaction() as con:
+                con.executemany("INSERT INTO journal_entries(user_sub, entry_text) VALUES ('bench', ?)", [(f"entry {i}",) for i in range(entries)])
+            ids = list(range(1, entries + 1))
+
+            start = time.perf_counter()
+            for entry_no in ids:
+                db.add_journal_scores(scores.model_copy(update={"journal_entry_no": entry_no}))
+                for nuance in nuances:
+                    db.add_journal_nuance(db.JournalNuances(journal_entry_no=entry_no, nuance=nuance))
+                db.add_journal_recommendation(db.JournalRecommendations(journal_entry_no=entry_no, recommendation="walk", is_crisis=False))
+            report(f"{profile}: per-row helpers", rows, time.perf_counter() - start, "rows")
+
+            start = time.perf_counter()
+            for entry_no in ids:
+                db.save_analysis(entry_no, scores, nuances, "walk")
+            report(f"{profile}: save_analysis per entry", rows, time.perf_counter() - start, "rows")
+
+            with db.transaction() as con:
+                for table in ("journal_scores", "journal_nuances", "journal_recommendations"):
+                    con.execute(f"DELETE FROM {table}")
+            start = time.perf_counter()
+            db.add_journal_scores_bulk([scores.model_copy(update={"journal_entry_no": n}) for n in ids])
+            db.add_journal_nuances_bulk([db.JournalNuances(journal_entry_no=n, nuance=x) for n in ids for x in nuances])
+            db.add_journal_recommendations_bulk([db.JournalRecommendations(journal_entry_no=n, recommendation="walk", is_crisis=False) for n in ids])
+            report(f"{profile}: bulk executemany", rows, time.perf_counter() - start, "rows")
+
+
+def bench_search(entries=100_000, users=20, queries=200):
+    """Ranked full-text search latency over a large shared journal table."""
+    print("full-text search")
+    rng = random.Random(7)
+    # Zipf-ish vocabulary: a few very common words, a long tail of rare ones
+    topical = ("feeling anxious calm tired happy exams lecture friends family walk river sleep "
+               "coffee deadline project grateful lonely stressed excited music gym rain weekend").split()
+    vocabulary = topical + [f"word{n}" for n in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    with temp_database("fast"):
+        for u in range(users):
+            db.new_user(db.User(sub=f"user{u}"))
+        start = time.perf_counter()
+        with db.transaction() as con:
+            con.executemany(
+                "INSERT INTO journal_entries(user_sub, entry_text) VALUES (?, ?)",
+                ((f"user{rng.randrange(users)}", " ".join(rng.choices(vocabulary, weights, k=60))) for _ in range(entries)),
+            )
+        report("insert + index entries", entries, time.perf_counter() - start, "rows")
+        start = time.perf_counter()
+        db.optimize_search_index()
+        print(f"  optimize search index {time.perf_counter() - start:31.3f}s")
+
+        # from most to least common: 'feeling' is in ~60% of entries, 'word4000' in ~0.1%
+        terms = ["feeling", "anx", "river walk", "exams deadline stressed", "word40", "word4000"]
+        for term in terms:
+            timings = []
+            for n in range(queries):
+                start = time.perf_counter()
+                db.search_entries(f"user{n % users}", term, limit=20)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            print(f"  search {term!r:<32} p50 {timings[len(timings) // 2] * 1000:6.2f}ms  p95 {timings[int(len(timings) * 0.95)] * 1000:6.2f}ms")
+
+
+def bench_read_rows(entries=20_000, repeats=5):
+    """Objects/sec loading a whole history as pydantic models vs fast row tuples."""
+    print("read paths")
+    with temp_database("fast"):
+        db.new_user(db.User(sub="bench"))
+        with db.transaction() as con:
+            con.executemany("INSERT INTO journal_entries(user_sub, entry_text) VALUES ('bench', ?)", [(f"entry {i} " * 10,) for i in range(entries)])
+            con.executemany(
+                "INSERT INTO journal_scores(journal_entry_no, happy, angry, fearful, surprised, bad, disgusted, sad) VALUES (?, 1, 2, 3, 4, 5, 6, 7)",
+                [(n,) for n in range(1, entries + 1)],
+            )
+        for fast in (False, True):
+            label = "rows" if fast else "pydantic"
+            start = time.perf_counter()
+            for _ in range(repeats):
+                db.fetch_journal_entries("bench", fast=fast)
+            report(f"fetch_journal_entries ({label})", entries * repeats, time.perf_counter() - start, "objs")
+        for fast in (False, True):
+            label = "rows" if fast else "pydantic"
+            start = time.perf_counter()
+            with db.connection():
+                for n in range(1, entries + 1):
+                    db.get_journal_scores(n, fast=fast)
+            report(f"get_journal_scores ({label})", entries, time.perf_counter() - start, "objs")
+
+
+def bench_async(operations=20_000, write_share=0.2):
+    """Mixed read/write throughput from many coroutines: db_async vs asyncio.to_thread per call."""
+    print("async facade")
+
+    async def run(concurrency, call):
+        rng = random.Random(concurrency)
+        per_task = operations // concurrency
+
+        async def worker(n):
+            sub = f"user{n % 20}"
+            for i in range(per_task):
+                if rng.random() < write_share:
+                    await call("add_journal_entry", db.JournalEntry(user_sub=sub, entry_text=f"entry {n} {i}"))
+                else:
+                    await call("fetch_recent_entries", sub, 10, fast=True)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        return per_task * concurrency, time.perf_counter() - start
+
+    async def to_thread(name, *args, **kwargs):
+        return await asyncio.to_thread(getattr(db, name), *args, **kwargs)
+
+    for concurrency in (1, 100, 400):
+        with temp_database("fast"):
+            for u in range(20):
+                db.new_user(db.User(sub=f"user{u}"))
+            database = db_async.AsyncDatabase()
+
+            async def facade(name, *args, **kwargs):
+                return await getattr(database, name)(*args, **kwargs)
+
+            count, elapsed = asyncio.run(run(concurrency, facade))
+            database.close()
+            report(f"db_async, {concurrency} coroutines", count, elapsed)
+            count, elapsed = asyncio.run(run(concurrency, to_thread))
+            report(f"asyncio.to_thread, {concurrency} coroutines", count, elapsed)
+
+
+def bench_group_commit(writes=2000, threads=8):
+    """Journal saves from several threads: one transaction each vs the group-commit writer."""
+    print("group commit")
+    per_thread = writes // threads
+    for profile in ("safe", "fast"):
+        with temp_database(profile):
+            db.new_user(db.User(sub="bench"))
+
+            def direct(n):
+                for i in range(per_thread):
+                    db.add_journal_entry(db.JournalEntry(user_sub="bench", entry_text=f"entry {n} {i}"))
+
+            def queued(n):
+                futures = [writer.submit(db.add_journal_entry, db.JournalEntry(user_sub="bench", entry_text=f"entry {n} {i}"))
+                           for i in range(per_thread)]
+                for future in futures:
+                    future.result()
+
+            for label, target in (("transaction per save", direct), ("group commit", queued)):
+                writer = db_write_queue.GroupCommitWriter()
+                workers = [threading.Thread(target=target, args=(n,)) for n in range(threads)]
+                start = time.perf_counter()
+                for t in workers:
+                    t.start()
+                for t in workers:
+                    t.join()
+                elapsed = time.perf_counter() - start
+                writer.close()
+                report(f"{profile}: {label}", per_thread * threads, elapsed)
+            print(f"  {profile}: {writer.writes} writes in {writer.commits} commits")
+
+
+def traced_peak(fn, *args):
+    """Run fn again under tracemalloc (which slows it down) and return peak Python memory in MB."""
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def bench_transfer(entries=50_000):
+    """Export one large account to JSONL and CSV and import it into a fresh database."""
+    print("export / import")
+    with tempfile.TemporaryDirectory() as out:
+        paths = {"jsonl": os.path.join(out, "bench.jsonl"), "csv": os.path.join(out, "bench_csv")}
+        with temp_database("fast"):
+            db.new_user(db.User(sub="bench"))
+            with db.transaction() as con:
+                con.executemany("INSERT INTO journal_entries(user_sub, entry_text) VALUES ('bench', ?)", [(f"entry {i} " * 20,) for i in range(entries)])
+            scores = db.JournalScores(happy=10, angry=20, fearful=30, surprised=40, bad=50, disgusted=60, sad=70)
+            db.add_journal_scores_bulk([scores.model_copy(update={"journal_entry_no": n}) for n in range(1, entries + 1)])
+            db.add_journal_nuances_bulk([db.JournalNuances(journal_entry_no=n, nuance=x) for n in range(1, entries + 1) for x in ("calm", "tired")])
+            for label, export in (("jsonl", db_transfer.export_jsonl), ("csv", db_transfer.export_csv)):
+                result = export(paths[label], ["bench"])
+                peak = traced_peak(export, paths[label], ["bench"])
+                report(f"export {label} (peak {peak:.1f}MB)", result.total, result.seconds, "rows")
+        for label, load in (("jsonl", db_transfer.import_jsonl), ("csv", db_transfer.import_csv)):
+            with temp_database("fast"):
+                result = load(paths[label])
+            with temp_database("fast"):
+                peak = traced_peak(load, paths[label])
+            report(f"import {label} (peak {peak:.1f}MB)", result.total, result.seconds, "rows")
+
+
+def bench_purge(entries=100_000):
+    """Deleting a large old history: one DELETE vs the chunked purge, with another user writing meanwhile."""
+    print("purge")
+    for label in ("single DELETE", "chunked purge"):
+        with temp_database("fast"):
+            for sub in ("old", "active"):
+                db.new_user(db.User(sub=sub))
+            with db.transaction() as con:
+                con.executemany("INSERT INTO journal_entries(user_sub, created_at, entry_text) VALUES ('old', '2001-01-01', ?)",
+                                [(f"entry {i} " * 20,) for i in range(entries)])
+            db.add_journal_scores_bulk([db.JournalScores(journal_entry_no=n, happy=n % 100) for n in range(1, entries + 1)])
+
+            stop = threading.Event()
+            latencies = []
+
+            def write_loop():
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    db.add_journal_entry(db.JournalEntry(user_sub="active", entry_text="still writing"))
+                    latencies.append(time.perf_counter() - start)
+                    time.sleep(0.005)
+
+            writer = threading.Thread(target=write_loop)
+            writer.start()
+            start = time.perf_counter()
+            if label == "single DELETE":
+                with db.transaction() as con:
+                    deleted = con.execute("DELETE FROM journal_entries WHERE user_sub = 'old'").rowcount
+            else:
+                deleted = db.purge_journal_entries(30)
+            elapsed = time.perf_counter() - start
+            stop.set()
+            writer.join()
+            report(f"{label}", deleted, elapsed, "rows")
+            print(f"  {label}: other writer's worst save {max(latencies) * 1000:.0f}ms over {len(latencies)} saves")
+
+
+def bench_card_analysis(entries=2000, page=50, pages=20):
+    """Loading pages of history cards with their analysis: N+1 getters vs batched lookup vs the joined view."""
+    print("card analysis")
+    with temp_database("fast"):
+        db.new_user(db.User(sub="bench"))
+        with db.transaction() as con:
+            con.executemany("INSERT INTO journal_entries(user_sub, entry_text) VALUES ('bench', ?)", [(f"entry {i}",) for i in range(entries)])
+        for n in range(1, entries + 1):
+            db.save_analysis(n, db.JournalScores(happy=n % 100, sad=50), ["calm", "tired", "hopeful"], "walk")
+
+        def n_plus_one():
+            after = None
+            for _ in range(pages):
+                rows = db.fetch_journal_entries_page("bench", after=after, limit=page, fast=True)
+                for row in rows:
+                    db.get_journal_scores(row.journal_entry_no, fast=True)
+                    db.get_journal_recommendation(row.journal_entry_no, fast=True)
+                    db.get_journal_nuances(row.journal_entry_no, fast=True)
+                after = db.entry_cursor(rows[-1])
+
+        def batched():
+            after = None
+            for _ in range(pages):
+                rows = db.fetch_journal_entries_page("bench", after=after, limit=page, fast=True)
+                db.get_analysis_for_entries([row.journal_entry_no for row in rows])
+                after = db.entry_cursor(rows[-1])
+
+        def joined():
+            after = None
+            for _ in range(pages):
+                rows = db.fetch_entries_with_analysis("bench", after=after, limit=page, fast=True)
+                after = db.entry_cursor(rows[-1])
+
+        for label, load, cold in (("N+1: page + 3 getters per card", n_plus_one, False),
+                                  ("page + batched analysis, cold cache", batched, True),
+                                  ("page + batched analysis, warm cache", batched, False),
+                                  ("joined view, one query per page", joined, False)):
+            if cold:
+                db.clear_analysis_cache()
+            start = time.perf_counter()
+            load()
+            report(label, page * pages, time.perf_counter() - start, "cards")
+
+
+STARTUP_MODULES = ("db_operations", "pydantic", "sqlite3", "tkinter", "gui", "gpt_wrapper", "google.genai", "auth", "requests")
+
+FIRST_WINDOW = """
+import time
+start = time.perf_counter()
+import gui
+app = gui.WelcomePage()
+app.update()
+print(f"{(time.perf_counter() - start) * 1000:.1f}")
+app.destroy()
+"""
+
+
+def bench_startup(runs=5):
+    """Import cost per module (python -X importtime) and time to first window for gui.main()."""
+    print("startup")
+    src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+    with tempfile.TemporaryDirectory() as cwd:
+        # run from an empty directory so no database file exists beforehand
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import gui"], cwd=cwd, capture_output=True, text=True,
+                                env={**os.environ, "PYTHONPATH": src_dir})
+        cumulative = {}
+        for line in result.stderr.splitlines():
+            if line.startswith("import time:") and "|" in line:
+                _, total, name = (part.strip() for part in line[len("import time:"):].split("|"))
+                if total.isdigit():
+                    cumulative[name] = int(total)
+        if result.returncode != 0:
+            print(f"  import gui failed: {result.stderr.strip().splitlines()[-1]}")
+        for name in STARTUP_MODULES:
+            if name in cumulative:
+                print(f"  import {name:<36} {cumulative[name] / 1000:8.1f}ms")
+        print(f"  database file created by import: {os.listdir(cwd) != []}")
+
+        timings = []
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, "-c", FIRST_WINDOW], cwd=cwd, capture_output=True, text=True,
+                                    env={**os.environ, "PYTHONPATH": src_dir})
+            if result.returncode != 0:
+                print(f"  time to first window: unavailable ({result.stderr.strip().splitlines()[-1]})")
+                return
+            timings.append(float(result.stdout))
+        timings.sort()
+        print(f"  time to first window  p50 {timings[len(timings) // 2]:.1f}ms  min {timings[0]:.1f}ms")
+
+
+BENCHMARKS = {
+    "storage": bench_storage_profiles,
+    "analysis": bench_analysis_writes,
+    "search": bench_search,
+    "rows": bench_read_rows,
+    "async": bench_async,
+    "group": bench_group_commit,
+    "transfer": bench_transfer,
+    "purge": bench_purge,
+    "cards": bench_card_analysis,
+    "startup": bench_startup,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--memory", action="store_true", help="run against in-memory databases instead of temp files")
+    args = parser.parse_args()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    global IN_MEMORY
+    IN_MEMORY = args.memory
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
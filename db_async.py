@@ -0,0 +1,216 @@
+"""asyncio facade over db_operations.
+
+Every CRUD helper in db_operations has an awaitable twin here with the same name
+and arguments:
+
+    import db_async
+    await db_async.add_journal_entry(JournalEntry(user_sub=sub, entry_text=text))
+    entries = await db_async.fetch_journal_entries(sub, fast=True)
+
+Reads run on a pool of reader threads. Writes go to a single writer thread,
+because sqlite only ever has one writer. Writes queued behind each other
+therefore never contend for the write lock. The writer queue is bounded, so a
+burst of writers waits (asynchronously) for a free slot instead of piling up
+unbounded work. purge_journal_entries is the exception: it commits in chunks and
+sleeps between them for minutes at a time, so it runs on a thread of its own
+rather than holding up the writer.
+"""
+import asyncio
+import atexit
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import db_operations as db
+
+WRITE_QUEUE_SIZE = 256  # writes accepted but not yet finished, per event loop
+
+READ_OPERATIONS = (
+    "get_user",
+    "user_exists",
+    "fetch_journal_entries",
+    "fetch_journal_entries_page",
+    "fetch_entries_with_analysis",
+    "fetch_unanalysed_entries",
+    "count_unanalysed_entries",
+    "fetch_recent_entries",
+    "search_entries",
+    "get_journal_entry",
+    "fetch_entry_values",
+    "get_entry_values",
+    "journal_entry_has_values",
+    "get_journal_scores",
+    "get_journal_recommendation",
+    "get_journal_nuances",
+    "get_journal_nuance_by_id",
+    "get_analysis_for_entries",
+    "get_entry_analysis",
+    "count_journal_entries",
+    "daily_entry_counts",
+    "fetch_daily_activity",
+    "journal_streaks",
+    "count_positive_days",
+)
+
+WRITE_OPERATIONS = (
+    "new_user",
+    "add_journal_entry",
+    "add_entry_values",
+    "add_journal_scores",
+    "add_journal_nuance",
+    "add_journal_recommendation",
+    "add_journal_scores_bulk",
+    "add_journal_nuances_bulk",
+    "add_journal_recommendations_bulk",
+    "save_analysis",
+    "update_journal_entry",
+    "update_entry_values",
+    "update_journal_scores",
+    "update_journal_recommendation",
+    "update_journal_nuance_by_id",
+    "delete_journal_entry",
+    "delete_entry_values",
+    "delete_user",
+    "delete_journal_nuance_by_id",
+    "delete_journal_nuances_for_entry",
+    "delete_journal_scores",
+    "delete_journal_recommendation",
+    "delete_journal_entries",
+    "delete_journal_entries_for_user",
+    "optimize_search_index",
+)
+
+
+class AsyncDatabase:
+    """Runs db_operations helpers off the event loop: reads in parallel, writes one at a time."""
+
+    def __init__(self, read_workers: Optional[int] = None, write_queue_size: int = WRITE_QUEUE_SIZE):
+        if read_workers is None:
+            # read when constructed, so configure_pool() before this takes effect;
+            # one pooled connection is left for the writer
+            read_workers = max(db.POOL_SIZE - 1, 1)
+        if read_workers < 1 or write_queue_size < 1:
+            raise ValueError("read_workers and write_queue_size must be at least 1")
+        self.write_queue_size = write_queue_size
+        self._readers = ThreadPoolExecutor(read_workers, thread_name_prefix="db-read")
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="db-write")
+        # asyncio primitives belong to one loop, so each loop gets its own slots
+        self._write_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self._closed = False
+
+    async def read(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) on a reader thread."""
+        if self._closed:
+            raise RuntimeError("AsyncDatabase is closed")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(fn, *args, **kwargs))
+
+    async def write(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) on the writer thread, waiting for room in the queue first."""
+        if self._closed:
+            raise RuntimeError("AsyncDatabase is closed")
+        loop = asyncio.get_running_loop()
+        slots = self._write_slots.get(loop)
+        if slots is None:
+            slots = self._write_slots[loop] = asyncio.Semaphore(self.write_queue_size)
+        await slots.acquire()
+        try:
+            future = self._writer.submit(fn, *args, **kwargs)
+        except BaseException:
+            slots.release()
+            raise
+        # free the slot when the write has really finished, even if the caller was cancelled
+        future.add_done_callback(lambda _: _call_soon(loop, slots.release))
+        return await asyncio.wrap_future(future)
+
+    async def purge_journal_entries(self, *args, **kwargs):
+        """db_operations.purge_journal_entries on a thread of its own, so queued writes run during its pauses."""
+        if self._closed:
+            raise RuntimeError("AsyncDatabase is closed")
+        return await asyncio.to_thread(db.purge_journal_entries, *args, **kwargs)
+
+    def close(self, wait: bool = True):
+        """Stop accepting work; with wait=True, finish queued writes first."""
+        self._closed = True
+        self._writer.shutdown(wait=wait)
+        self._readers.shutdown(wait=wait, cancel_futures=not wait)
+
+    async def aclose(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, callback):
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError:
+        pass  # loop already closed; nobody is left waiting on its semaphore
+
+
+def _reader(name):
+    fn = getattr(db, name)
+
+    @functools.wraps(fn)
+    async def method(self, *args, **kwargs):
+        return await self.read(fn, *args, **kwargs)
+    return method
+
+
+def _writer(name):
+    fn = getattr(db, name)
+
+    @functools.wraps(fn)
+    async def method(self, *args, **kwargs):
+        return await self.write(fn, *args, **kwargs)
+    return method
+
+
+for _name in READ_OPERATIONS:
+    setattr(AsyncDatabase, _name, _reader(_name))
+for _name in WRITE_OPERATIONS:
+    setattr(AsyncDatabase, _name, _writer(_name))
+
+
+_default: Optional[AsyncDatabase] = None
+_default_lock = threading.Lock()
+
+# the shared AsyncDatabase used by the module-level functions below
+def get_database() -> AsyncDatabase:
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = AsyncDatabase()
+    return _default
+
+# shut the shared executors down, finishing queued writes (also runs at interpreter exit)
+def close():
+    global _default
+    with _default_lock:
+        database, _default = _default, None
+    if database is not None:
+        database.close()
+
+# registered after db_operations' close_pool hook, so it runs first and queued writes still have a pool
+atexit.register(close)
+
+
+def _module_level(name):
+    method = getattr(AsyncDatabase, name)
+
+    @functools.wraps(method)
+    async def function(*args, **kwargs):
+        return await method(get_database(), *args, **kwargs)
+    return function
+
+
+for _name in READ_OPERATIONS + WRITE_OPERATIONS + ("purge_journal_entries",):
+    globals()[_name] = _module_level(_name)
+del _name
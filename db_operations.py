@@ -1,8 +1,47 @@
+import atexit
+import itertools
+import json
+import os
+import queue
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Iterator, NamedTuple, Optional, List, Tuple, Union
 
+# Database location: a path, ":memory:", or a sqlite "file:" URI. Override it
+# with the INSIDEOUT_DB environment variable or configure(), not by assignment.
+DB_ENV_VAR = "INSIDEOUT_DB"
 DBFOLDER = "user_data.db"
+POOL_SIZE = 5  # max open connections shared by all threads
+POOL_TIMEOUT = 30.0  # seconds to wait for a free connection
+DELETE_CHUNK = 500  # entries per transaction for chunked deletes and purges
+PURGE_PAUSE = 0.01  # seconds a purge sleeps between chunks so other writers get the lock
+VACUUM_PAGES = 256  # free pages handed back to the filesystem after each chunk
+ANALYSIS_CACHE_SIZE = 2048  # entries whose analysis get_analysis_for_entries keeps in memory
+
+# PRAGMAs applied to every connection. "safe" keeps sqlite's rollback journal
+# and fsyncs every commit; "fast" uses WAL so readers never block the writer,
+# and only fsyncs at checkpoints (a power cut can lose the last commits but
+# never corrupts the file).
+STORAGE_PROFILES = {
+    "safe": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "temp_store": "DEFAULT",
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -16000,  # negative = KiB, so ~16MB per connection
+        "temp_store": "MEMORY",
+    },
+}
+STORAGE_PROFILE = "fast"
 
 # data models
 class User(BaseModel):
@@ -39,6 +78,9 @@ class JournalScores(BaseModel):
     disgusted: Optional[int] = None
     sad: Optional[int] = None
 
+# score columns of journal_scores, in table order
+EMOTIONS = ("happy", "angry", "fearful", "surprised", "bad", "disgusted", "sad")
+
 class JournalNuances(BaseModel):
     nuance_id: Optional[int] = None
     journal_entry_no: Optional[int] = None
@@ -49,16 +91,512 @@ class JournalRecommendations(BaseModel):
     recommendation: Optional[str] = None
     is_crisis: Optional[bool] = None
 
+# Lightweight read-only row types mirroring the models above. Getters called with
+# fast=True build these straight from sqlite rows (no pydantic validation), for
+# read paths that load whole histories. Writes still take the pydantic models:
+# convert with e.g. JournalEntry(**row._asdict()).
+class JournalEntryRow(NamedTuple):
+    journal_entry_no: int
+    user_sub: str
+    created_at: str
+    entry_text: str
+
+class JournalScoresRow(NamedTuple):
+    journal_entry_no: int
+    happy: Optional[int]
+    angry: Optional[int]
+    fearful: Optional[int]
+    surprised: Optional[int]
+    bad: Optional[int]
+    disgusted: Optional[int]
+    sad: Optional[int]
+
+class JournalNuancesRow(NamedTuple):
+    nuance_id: int
+    journal_entry_no: int
+    nuance: str
+
+class JournalRecommendationsRow(NamedTuple):
+    journal_entry_no: int
+    recommendation: str
+    is_crisis: bool
+
+# sqlite3 row factory building `row_type` tuples
+def _row_factory(row_type):
+    make = row_type._make
+    return lambda cursor, row: make(row)
+
+def _recommendation_row(cursor, row):
+    return JournalRecommendationsRow(row[0], row[1], bool(row[2]))
+
+# everything the agents stored for one entry; immutable, so cached copies can be shared
+class EntryAnalysis(NamedTuple):
+    journal_entry_no: int
+    scores: Optional[JournalScoresRow]
+    nuances: Tuple[JournalNuancesRow, ...]
+    recommendation: Optional[JournalRecommendationsRow]
+
+# an entry with everything the agents stored for it (the journal_entries_with_analysis view)
+class JournalEntryWithAnalysis(JournalEntry):
+    happy: Optional[int] = None
+    angry: Optional[int] = None
+    fearful: Optional[int] = None
+    surprised: Optional[int] = None
+    bad: Optional[int] = None
+    disgusted: Optional[int] = None
+    sad: Optional[int] = None
+    top_emotion: Optional[str] = None
+    nuances: List[str] = []
+    recommendation: Optional[str] = None
+    is_crisis: Optional[bool] = None
+
+class JournalEntryWithAnalysisRow(NamedTuple):
+    journal_entry_no: int
+    user_sub: str
+    created_at: str
+    entry_text: str
+    happy: Optional[int]
+    angry: Optional[int]
+    fearful: Optional[int]
+    surprised: Optional[int]
+    bad: Optional[int]
+    disgusted: Optional[int]
+    sad: Optional[int]
+    top_emotion: Optional[str]
+    nuances: List[str]
+    recommendation: Optional[str]
+    is_crisis: Optional[bool]
+
+def _entry_with_analysis_row(cursor, row):
+    return JournalEntryWithAnalysisRow(*row[:12], json.loads(row[12]), row[13], None if row[14] is None else bool(row[14]))
+
+# a search hit: the entry plus a snippet with the matched terms highlighted
+class JournalSearchResult(JournalEntry):
+    snippet: Optional[str] = None
+
+# one day of the activity rollup; means are None until an entry that day is scored
+class DailyActivity(BaseModel):
+    day: Optional[str] = None
+    entry_count: int = 0
+    scored_count: int = 0
+    happy: Optional[float] = None
+    angry: Optional[float] = None
+    fearful: Optional[float] = None
+    surprised: Optional[float] = None
+    bad: Optional[float] = None
+    disgusted: Optional[float] = None
+    sad: Optional[float] = None
+
+# Per-user, per-day rollup behind the activity heatmap. Kept in step with
+# journal_entries and journal_scores by triggers, so reads never touch the
+# entries themselves. Scores are stored as sums; divide by scored_count for means.
+_SUMS = ", ".join(f"{e}_sum" for e in EMOTIONS)
+_ENTRY_DAY = "(SELECT user_sub, date(created_at) FROM journal_entries WHERE journal_entry_no = {0}.journal_entry_no)"
+_OLD_SCORES = "(SELECT {0} FROM journal_scores WHERE journal_entry_no = OLD.journal_entry_no)"
+
+DAILY_ACTIVITY_DDL = [
+    "CREATE TABLE IF NOT EXISTS daily_activity(user_sub text, day text, entry_count integer NOT NULL DEFAULT 0, scored_count integer NOT NULL DEFAULT 0, "
+    + ", ".join(f"{e}_sum integer NOT NULL DEFAULT 0" for e in EMOTIONS)
+    + ", PRIMARY KEY (user_sub, day)) WITHOUT ROWID",
+    # entries
+    """CREATE TRIGGER IF NOT EXISTS trg_daily_activity_entry_insert AFTER INSERT ON journal_entries BEGIN
+        INSERT INTO daily_activity(user_sub, day, entry_count) VALUES (NEW.user_sub, date(NEW.created_at), 1)
+        ON CONFLICT(user_sub, day) DO UPDATE SET entry_count = entry_count + 1;
+    END""",
+    # BEFORE so the entry's scores are still there to subtract; the cascade deleting them
+    # can no longer see the entry, so trg_daily_activity_scores_delete skips them
+    f"""CREATE TRIGGER IF NOT EXISTS trg_daily_activity_entry_delete BEFORE DELETE ON journal_entries BEGIN
+        UPDATE daily_activity SET entry_count = entry_count - 1,
+            scored_count = scored_count - {_OLD_SCORES.format("count(*)")},
+            {", ".join(f"{e}_sum = {e}_sum - coalesce({_OLD_SCORES.format(e)}, 0)" for e in EMOTIONS)}
+        WHERE user_sub = OLD.user_sub AND day = date(OLD.created_at);
+        DELETE FROM daily_activity WHERE user_sub = OLD.user_sub AND day = date(OLD.created_at) AND entry_count <= 0;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_daily_activity_entry_move AFTER UPDATE OF user_sub, created_at ON journal_entries
+    WHEN OLD.user_sub IS NOT NEW.user_sub OR date(OLD.created_at) IS NOT date(NEW.created_at) BEGIN
+        UPDATE daily_activity SET entry_count = entry_count - 1,
+            scored_count = scored_count - {_OLD_SCORES.format("count(*)")},
+            {", ".join(f"{e}_sum = {e}_sum - coalesce({_OLD_SCORES.format(e)}, 0)" for e in EMOTIONS)}
+        WHERE user_sub = OLD.user_sub AND day = date(OLD.created_at);
+        DELETE FROM daily_activity WHERE user_sub = OLD.user_sub AND day = date(OLD.created_at) AND entry_count <= 0;
+        INSERT INTO daily_activity(user_sub, day, entry_count, scored_count, {_SUMS})
+        SELECT NEW.user_sub, date(NEW.created_at), 1, count(*), {", ".join(f"coalesce(sum({e}), 0)" for e in EMOTIONS)}
+        FROM journal_scores WHERE journal_entry_no = NEW.journal_entry_no
+        ON CONFLICT(user_sub, day) DO UPDATE SET entry_count = entry_count + 1, scored_count = scored_count + excluded.scored_count,
+            {", ".join(f"{e}_sum = {e}_sum + excluded.{e}_sum" for e in EMOTIONS)};
+    END""",
+    # scores
+    f"""CREATE TRIGGER IF NOT EXISTS trg_daily_activity_scores_insert AFTER INSERT ON journal_scores BEGIN
+        UPDATE daily_activity SET scored_count = scored_count + 1,
+            {", ".join(f"{e}_sum = {e}_sum + coalesce(NEW.{e}, 0)" for e in EMOTIONS)}
+        WHERE (user_sub, day) = {_ENTRY_DAY.format("NEW")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_daily_activity_scores_update AFTER UPDATE ON journal_scores BEGIN
+        UPDATE daily_activity SET
+            {", ".join(f"{e}_sum = {e}_sum - coalesce(OLD.{e}, 0) + coalesce(NEW.{e}, 0)" for e in EMOTIONS)}
+        WHERE (user_sub, day) = {_ENTRY_DAY.format("NEW")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_daily_activity_scores_delete AFTER DELETE ON journal_scores BEGIN
+        UPDATE daily_activity SET scored_count = scored_count - 1,
+            {", ".join(f"{e}_sum = {e}_sum - coalesce(OLD.{e}, 0)" for e in EMOTIONS)}
+        WHERE (user_sub, day) = {_ENTRY_DAY.format("OLD")};
+    END""",
+]
+
+# the rollup recomputed from the base tables; used to backfill when the table is first created
+DAILY_ACTIVITY_FROM_ENTRIES = f"""
+    SELECT e.user_sub, date(e.created_at), count(*), count(s.journal_entry_no), {", ".join(f"coalesce(sum(s.{e}), 0)" for e in EMOTIONS)}
+    FROM journal_entries e LEFT JOIN journal_scores s ON s.journal_entry_no = e.journal_entry_no
+    GROUP BY e.user_sub, date(e.created_at)
+"""
+DAILY_ACTIVITY_BACKFILL = f"INSERT INTO daily_activity(user_sub, day, entry_count, scored_count, {_SUMS}) {DAILY_ACTIVITY_FROM_ENTRIES}"
+
+# Full-text index over journal_entries.entry_text. It is an external-content
+# table (the text lives only in journal_entries) kept in sync by triggers.
+# user_sub is indexed too so a search only intersects that user's doclist, and
+# 2/3-character prefix indexes keep search-as-you-type prefix queries cheap.
+JOURNAL_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS journal_entries_fts USING fts5(user_sub, entry_text, content='journal_entries', content_rowid='journal_entry_no', prefix='2 3', tokenize='porter unicode61')",
+    """CREATE TRIGGER IF NOT EXISTS trg_journal_fts_insert AFTER INSERT ON journal_entries BEGIN
+        INSERT INTO journal_entries_fts(rowid, user_sub, entry_text) VALUES (NEW.journal_entry_no, NEW.user_sub, NEW.entry_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_journal_fts_delete AFTER DELETE ON journal_entries BEGIN
+        INSERT INTO journal_entries_fts(journal_entries_fts, rowid, user_sub, entry_text) VALUES ('delete', OLD.journal_entry_no, OLD.user_sub, OLD.entry_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_journal_fts_update AFTER UPDATE OF user_sub, entry_text ON journal_entries BEGIN
+        INSERT INTO journal_entries_fts(journal_entries_fts, rowid, user_sub, entry_text) VALUES ('delete', OLD.journal_entry_no, OLD.user_sub, OLD.entry_text);
+        INSERT INTO journal_entries_fts(rowid, user_sub, entry_text) VALUES (NEW.journal_entry_no, NEW.user_sub, NEW.entry_text);
+    END""",
+]
+# rebuild from journal_entries and merge into one segment
+JOURNAL_FTS_REBUILD = [
+    "INSERT INTO journal_entries_fts(journal_entries_fts) VALUES ('rebuild')",
+    "INSERT INTO journal_entries_fts(journal_entries_fts) VALUES ('optimize')",
+]
+
+# An entry joined to its scores and recommendation, with its nuances as a JSON
+# array (oldest first) and its strongest emotion, so a page of history needs one
+# query. top_emotion is NULL until the entry is scored; ties go to the first in EMOTIONS.
+ENTRY_ANALYSIS_VIEW_DDL = f"""
+CREATE VIEW IF NOT EXISTS journal_entries_with_analysis AS
+SELECT e.journal_entry_no, e.user_sub, e.created_at, e.entry_text,
+    {", ".join(f"s.{emotion}" for emotion in EMOTIONS)},
+    CASE WHEN s.journal_entry_no IS NOT NULL THEN
+        CASE max({", ".join(f"coalesce(s.{emotion}, 0)" for emotion in EMOTIONS)})
+            {" ".join(f"WHEN coalesce(s.{emotion}, 0) THEN '{emotion}'" for emotion in EMOTIONS)}
+        END
+    END AS top_emotion,
+    -- idx_journal_nuances_entry visits an entry's nuances in nuance_id order
+    (SELECT json_group_array(nuance) FROM journal_nuances n WHERE n.journal_entry_no = e.journal_entry_no) AS nuances,
+    r.recommendation, r.is_crisis
+FROM journal_entries e
+LEFT JOIN journal_scores s ON s.journal_entry_no = e.journal_entry_no
+LEFT JOIN journal_recommendations r ON r.journal_entry_no = e.journal_entry_no
+"""
+
+# Model responses by a hash of everything that went into the request (see
+# llm_cache). Times are unix seconds; used_at orders least-recently-used eviction.
+LLM_CACHE_DDL = [
+    "CREATE TABLE IF NOT EXISTS llm_cache(cache_key text PRIMARY KEY, schema text, response text, created_at real, used_at real, hits integer DEFAULT 0) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS idx_llm_cache_used ON llm_cache(used_at)",
+    "CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at)",
+]
+
+# The journal entries each cached response was made from. Deleting an entry (or
+# its user) cascades to its rows here, and the trigger then drops the response,
+# so no model output about a deleted entry outlives it.
+LLM_CACHE_OWNERS_DDL = [
+    "CREATE TABLE IF NOT EXISTS llm_cache_owners(cache_key text REFERENCES llm_cache(cache_key) ON DELETE CASCADE, journal_entry_no integer REFERENCES journal_entries(journal_entry_no) ON DELETE CASCADE, PRIMARY KEY(cache_key, journal_entry_no)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS idx_llm_cache_owners_entry ON llm_cache_owners(journal_entry_no)",
+    "CREATE TRIGGER IF NOT EXISTS llm_cache_owner_deleted AFTER DELETE ON llm_cache_owners BEGIN DELETE FROM llm_cache WHERE cache_key = old.cache_key; END",
+]
+
 #Connect to db (or create if absent)
 def get_connection():
-    con = sqlite3.connect(DBFOLDER)
+    # check_same_thread is off because pooled connections are handed between threads
+    con = sqlite3.connect(DBFOLDER, check_same_thread=False, uri=DBFOLDER.startswith("file:"))
+    # only takes effect while the file has no tables; older files need enable_incremental_vacuum()
+    con.execute("PRAGMA auto_vacuum = INCREMENTAL")
     con.execute("PRAGMA foreign_keys = ON")
+    for pragma, value in STORAGE_PROFILES[STORAGE_PROFILE].items():
+        con.execute(f"PRAGMA {pragma} = {value}")
     return con
 
-# Create tables if not already present
-def initialize_db():
-    con = get_connection()
-    cur = con.cursor()
+# LRU of EntryAnalysis by journal_entry_no. The write helpers below invalidate the
+# entries they touch when their transaction ends; anything that writes analysis
+# with its own SQL must call clear_analysis_cache().
+class AnalysisCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+class _AnalysisCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[int, EntryAnalysis]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.version = 0  # bumped by every invalidation
+        self.hits = self.misses = 0
+
+    def get_many(self, ids: List[int]) -> Dict[int, EntryAnalysis]:
+        found = {}
+        with self._lock:
+            for n in ids:
+                analysis = self._items.get(n)
+                if analysis is not None:
+                    self._items.move_to_end(n)
+                    found[n] = analysis
+            self.hits += len(found)
+            self.misses += len(ids) - len(found)
+        return found
+
+    # only store what was read at `version`; a write since then may have made it stale
+    def put_many(self, analyses: List[EntryAnalysis], version: int):
+        with self._lock:
+            if version != self.version:
+                return
+            for analysis in analyses:
+                self._items[analysis.journal_entry_no] = analysis
+                self._items.move_to_end(analysis.journal_entry_no)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, ids: Optional[List[int]] = None):
+        with self._lock:
+            self.version += 1
+            if ids is None:
+                self._items.clear()
+            else:
+                for n in ids:
+                    self._items.pop(n, None)
+
+    def info(self) -> AnalysisCacheInfo:
+        with self._lock:
+            return AnalysisCacheInfo(self.hits, self.misses, self.maxsize, len(self._items))
+
+_analysis_cache = _AnalysisCache(ANALYSIS_CACHE_SIZE)
+
+# forget cached analysis for these entries (None = all) once the current transaction ends;
+# not before, or a reader could re-cache the old rows in between
+def _invalidate_analysis(journal_entry_nos: Optional[List[int]] = None):
+    get_pool().after_transaction(lambda: _analysis_cache.invalidate(journal_entry_nos))
+
+def clear_analysis_cache():
+    _analysis_cache.invalidate()
+
+# hits, misses, maxsize, currsize, like functools.lru_cache's cache_info()
+def analysis_cache_info() -> AnalysisCacheInfo:
+    return _analysis_cache.info()
+
+# Pool of long-lived connections shared by every helper in this module.
+# A thread borrows one connection for the length of a `with` block; nested
+# blocks on the same thread reuse it, so helpers can be composed inside one
+# transaction.
+class ConnectionPool:
+    def __init__(self, size: int = POOL_SIZE, connect=None, timeout: float = POOL_TIMEOUT):
+        if size < 1:
+            raise ValueError("pool size must be at least 1")
+        self.size = size
+        self.timeout = timeout
+        self._connect = connect or get_connection
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+    def _acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                con = self._connect()
+                self._all.append(con)
+                return con
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no database connection free after {self.timeout}s") from None
+
+    def _release(self, con: sqlite3.Connection):
+        if con.in_transaction:
+            con.rollback()  # never hand a half-finished transaction to the next borrower
+        with self._lock:
+            if not self._closed:
+                self._idle.put(con)
+                return
+        con.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            yield con  # already borrowed further up this thread's stack
+            return
+        con = self._acquire()
+        self._local.con = con
+        try:
+            yield con
+        finally:
+            self._local.con = None
+            self._release(con)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        if getattr(self._local, "in_tx", False):
+            with self.connection() as con:
+                yield con  # the outermost transaction commits or rolls back
+            return
+        with self.connection() as con:
+            self._local.in_tx = True
+            self._local.after_transaction = []
+            try:
+                yield con
+            except BaseException:
+                con.rollback()
+                raise
+            else:
+                con.commit()
+            finally:
+                self._local.in_tx = False
+                callbacks, self._local.after_transaction = self._local.after_transaction, []
+                for callback in callbacks:
+                    callback()
+
+    def in_transaction(self) -> bool:
+        """Whether this thread is inside transaction()."""
+        return getattr(self._local, "in_tx", False)
+
+    def after_transaction(self, callback):
+        """Run callback once this thread's transaction commits or rolls back (now, if there isn't one)."""
+        if self.in_transaction():
+            self._local.after_transaction.append(callback)
+        else:
+            callback()
+
+    # Close the idle connections now; ones other threads still have borrowed
+    # are closed by _release when their `with` block ends.
+    def close(self):
+        idle = []
+        with self._lock:
+            self._closed = True
+            self._all = []
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+        for con in idle:
+            con.close()
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+# The schema is created/migrated lazily, on the first connection() or
+# transaction() after the pool opens, instead of at import time.
+_initialized_for: Optional[str] = None  # DBFOLDER the schema was last migrated for
+_init_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(POOL_SIZE)
+    return _pool
+
+# resize the pool; open connections are closed and reopened on demand
+def configure_pool(size: int):
+    global POOL_SIZE
+    if size < 1:
+        raise ValueError("pool size must be at least 1")
+    POOL_SIZE = size
+    close_pool()
+
+# shutdown hook: close every pooled connection (also runs at interpreter exit)
+def close_pool():
+    global _pool, _initialized_for
+    with _pool_lock:
+        pool, _pool = _pool, None
+        _initialized_for = None  # re-check the schema when the next pool opens
+    if pool is not None:
+        pool.close()
+
+atexit.register(close_pool)
+
+# switch storage profile ("safe" or "fast"); pooled connections are reopened with it
+def configure_storage(profile: str):
+    global STORAGE_PROFILE
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"unknown storage profile {profile!r}, expected one of {sorted(STORAGE_PROFILES)}")
+    STORAGE_PROFILE = profile
+    close_pool()
+
+_memory_ids = itertools.count(1)
+_keepalive: Optional[sqlite3.Connection] = None  # holds an in-memory database open
+
+# Turn a configured location into what sqlite3.connect() is given. Plain paths are
+# made absolute so a later chdir can't move the database. ":memory:" becomes a
+# named memdb database, so every pooled connection sees the same RAM-backed data
+# (a bare ":memory:" would give each connection its own empty database).
+def _resolve_location(path) -> str:
+    path = os.fspath(path)
+    if path == ":memory:":
+        return f"file:/insideout-{os.getpid()}-{next(_memory_ids)}?vfs=memdb"
+    if path.startswith("file:"):
+        return path
+    return os.path.abspath(path)
+
+def _is_memory(location: str) -> bool:
+    return location.startswith("file:") and ("vfs=memdb" in location or "mode=memory" in location)
+
+# point every helper at another database; returns the resolved location
+def configure(path) -> str:
+    global DBFOLDER, _keepalive
+    location = _resolve_location(path)
+    close_pool()
+    keepalive = _keepalive
+    # sqlite frees an in-memory database with its last connection, so keep one
+    # open until the location changes; close_pool() then doesn't wipe the data
+    _keepalive = sqlite3.connect(location, uri=True, check_same_thread=False) if _is_memory(location) else None
+    if keepalive is not None:
+        keepalive.close()
+    DBFOLDER = location
+    clear_analysis_cache()  # cached rows belong to the old database
+    return location
+
+configure(os.environ.get(DB_ENV_VAR) or DBFOLDER)
+
+# run initialize_db once per process (and again after close_pool or a DBFOLDER change)
+def ensure_initialized():
+    if _initialized_for == DBFOLDER:
+        return
+    with _init_lock:
+        if _initialized_for != DBFOLDER:
+            initialize_db()
+
+# borrow a pooled connection for reads
+def connection():
+    ensure_initialized()
+    return get_pool().connection()
+
+# borrow a pooled connection and commit on success / roll back on error
+def transaction():
+    ensure_initialized()
+    return get_pool().transaction()
+
+# Schema migrations, applied in order. PRAGMA user_version records how many have
+# run, so each one runs exactly once per database, in its own transaction.
+# Append new migrations to MIGRATIONS; never edit or reorder ones that have shipped.
+# Databases created before versioning (user_version 0) already have some of
+# these tables, hence the IF NOT EXISTS.
+
+def _migration_base_tables(cur):
     cur.execute("CREATE TABLE IF NOT EXISTS users(SUB text PRIMARY KEY, created_at datetime default current_timestamp)")
     cur.execute("CREATE TABLE IF NOT EXISTS journal_entries(journal_entry_no integer PRIMARY KEY autoincrement, user_sub text, created_at datetime default current_timestamp, entry_text text, FOREIGN KEY (user_sub) REFERENCES users(SUB) ON DELETE CASCADE)")
     cur.execute("CREATE TABLE IF NOT EXISTS entry_values(entry_values_no integer PRIMARY KEY autoincrement, journal_entry_no integer, created_at datetime default current_timestamp, primary_emotion text, stress integer, energy integer, mood integer, motivation integer, trend text, burnout_risk float, FOREIGN KEY (journal_entry_no) REFERENCES journal_entries(journal_entry_no) ON DELETE CASCADE, UNIQUE(journal_entry_no))")
@@ -66,305 +604,778 @@ def initialize_db():
     cur.execute("CREATE TABLE IF NOT EXISTS journal_scores(journal_entry_no integer PRIMARY KEY, happy integer, angry integer, fearful integer, surprised integer, bad integer, disgusted integer, sad integer, FOREIGN KEY (journal_entry_no) REFERENCES journal_entries(journal_entry_no) ON DELETE CASCADE)")
     cur.execute("CREATE TABLE IF NOT EXISTS journal_nuances(nuance_id integer PRIMARY KEY autoincrement, journal_entry_no integer, nuance text, FOREIGN KEY (journal_entry_no) REFERENCES journal_entries(journal_entry_no) ON DELETE CASCADE)")
     cur.execute("CREATE TABLE IF NOT EXISTS journal_recommendations(journal_entry_no integer PRIMARY KEY, recommendation text, is_crisis boolean, FOREIGN KEY (journal_entry_no) REFERENCES journal_entries(journal_entry_no) ON DELETE CASCADE)")
+
+# indexes for per-user and per-entry lookups (also used by ON DELETE CASCADE)
+def _migration_lookup_indexes(cur):
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_journal_entries_user_created ON journal_entries(user_sub, created_at DESC, journal_entry_no DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_journal_nuances_entry ON journal_nuances(journal_entry_no)")
+
+# daily activity rollup, backfilled from existing entries
+def _migration_daily_activity(cur):
+    for statement in DAILY_ACTIVITY_DDL:
+        cur.execute(statement)
+    cur.execute("DELETE FROM daily_activity")
+    cur.execute(DAILY_ACTIVITY_BACKFILL)
+
+# full-text index, built from existing entries
+def _migration_search_index(cur):
+    for statement in JOURNAL_FTS_DDL:
+        cur.execute(statement)
+    for statement in JOURNAL_FTS_REBUILD:
+        cur.execute(statement)
+
+# entries joined with their analysis
+def _migration_entry_analysis_view(cur):
+    cur.execute(ENTRY_ANALYSIS_VIEW_DDL)
+
+# persistent cache of model responses
+def _migration_llm_cache(cur):
+    for statement in LLM_CACHE_DDL:
+        cur.execute(statement)
+
+# which entries each cached response came from; earlier responses can't be traced, so they go
+def _migration_llm_cache_owners(cur):
+    for statement in LLM_CACHE_OWNERS_DDL:
+        cur.execute(statement)
+    cur.execute("DELETE FROM llm_cache WHERE cache_key NOT IN (SELECT cache_key FROM llm_cache_owners)")
+
+MIGRATIONS = [
+    _migration_base_tables,
+    _migration_lookup_indexes,
+    _migration_daily_activity,
+    _migration_search_index,
+    _migration_entry_analysis_view,
+    _migration_llm_cache,
+    _migration_llm_cache_owners,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# bring the database on `con` up to SCHEMA_VERSION; returns the number of migrations applied
+def migrate(con: sqlite3.Connection) -> int:
+    applied = 0
+    while True:
+        # BEGIN IMMEDIATE takes the write lock first, so two processes starting
+        # together can't both apply the same migration
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            version = con.execute("PRAGMA user_version").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise RuntimeError(f"database schema version {version} is newer than this code supports ({SCHEMA_VERSION})")
+            if version == SCHEMA_VERSION:
+                con.rollback()
+                return applied
+            MIGRATIONS[version](con.cursor())
+            con.execute(f"PRAGMA user_version = {version + 1}")
+        except BaseException:
+            con.rollback()
+            raise
+        con.commit()
+        applied += 1
+
+# the rollup and search triggers; db_transfer drops them during an import
+DERIVED_TRIGGERS = tuple(
+    re.search(r"CREATE TRIGGER IF NOT EXISTS (\w+)", statement).group(1)
+    for statement in DAILY_ACTIVITY_DDL + JOURNAL_FTS_DDL if "CREATE TRIGGER" in statement
+)
+
+def _missing_derived_triggers(con: sqlite3.Connection) -> bool:
+    present = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    return not present.issuperset(DERIVED_TRIGGERS)
+
+# recreate the rollup and search triggers and rebuild what they maintain; run inside a transaction
+def rebuild_derived(con: sqlite3.Connection):
+    for statement in DAILY_ACTIVITY_DDL + JOURNAL_FTS_DDL:
+        con.execute(statement)
+    con.execute("DELETE FROM daily_activity")
+    con.execute(DAILY_ACTIVITY_BACKFILL)
+    for statement in JOURNAL_FTS_REBUILD:
+        con.execute(statement)
+
+# An import killed mid-way leaves its dropped triggers missing, and user_version
+# won't bring them back. Put them back and rebuild daily_activity and the search
+# index; returns whether anything needed repairing.
+def repair_derived(con: sqlite3.Connection) -> bool:
+    if not _missing_derived_triggers(con):
+        return False
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        repaired = _missing_derived_triggers(con)  # another process may have got there first
+        if repaired:
+            rebuild_derived(con)
+    except BaseException:
+        con.rollback()
+        raise
     con.commit()
-    con.close()
+    return repaired
 
-initialize_db()
+# Create or upgrade the schema, and repair triggers an interrupted import left
+# missing. Called automatically on first use; call it directly to pick a storage
+# profile or to migrate up front.
+def initialize_db(profile: Optional[str] = None) -> int:
+    global _initialized_for
+    if profile is not None:
+        configure_storage(profile)
+    with get_pool().connection() as con:
+        applied = migrate(con)
+        repair_derived(con)
+    _initialized_for = DBFOLDER
+    return applied
 
 # create user
 def new_user(user: User) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    try:
-        cur.execute(
-        "INSERT INTO users(SUB) VALUES (?)",
-        (user.sub,),
-        )
-    except sqlite3.IntegrityError:
-        con.close()
-        return False  # User already exists
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        try:
+            cur.execute(
+            "INSERT INTO users(SUB) VALUES (?)",
+            (user.sub,),
+            )
+        except sqlite3.IntegrityError:
+            return False  # User already exists
     return True  # User created successfully
 
 # create journal entry
 def add_journal_entry(entry: JournalEntry) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "INSERT INTO journal_entries(user_sub, entry_text) VALUES (?, ?)",
-        (entry.user_sub, entry.entry_text),
-    )
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute(
+            "INSERT INTO journal_entries(user_sub, entry_text) VALUES (?, ?)",
+            (entry.user_sub, entry.entry_text),
+        )
     return True  # Entry added successfully
 
 # create entry values
 def add_entry_values(values: EntryValues) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "INSERT INTO entry_values(journal_entry_no, primary_emotion, stress, energy, mood, motivation, trend, burnout_risk) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        (values.journal_entry_no, values.primary_emotion, values.stress, values.energy, values.mood, values.motivation, values.trend, values.burnout_risk),)
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute(
+            "INSERT INTO entry_values(journal_entry_no, primary_emotion, stress, energy, mood, motivation, trend, burnout_risk) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (values.journal_entry_no, values.primary_emotion, values.stress, values.energy, values.mood, values.motivation, values.trend, values.burnout_risk),)
     return True  # Values added successfully
 
 # create journal scores
 def add_journal_scores(scores: JournalScores) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "INSERT INTO journal_scores(journal_entry_no, happy, angry, fearful, surprised, bad, disgusted, sad) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        (scores.journal_entry_no, scores.happy, scores.angry, scores.fearful, scores.surprised, scores.bad, scores.disgusted, scores.sad),)
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute(
+            "INSERT INTO journal_scores(journal_entry_no, happy, angry, fearful, surprised, bad, disgusted, sad) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (scores.journal_entry_no, scores.happy, scores.angry, scores.fearful, scores.surprised, scores.bad, scores.disgusted, scores.sad),)
+        _invalidate_analysis([scores.journal_entry_no])
     return True  # Scores added successfully
 
 # create journal nuances
 def add_journal_nuance(nuance: JournalNuances) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "INSERT INTO journal_nuances(journal_entry_no, nuance) VALUES (?, ?)",
-        (nuance.journal_entry_no, nuance.nuance),)
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute(
+            "INSERT INTO journal_nuances(journal_entry_no, nuance) VALUES (?, ?)",
+            (nuance.journal_entry_no, nuance.nuance),)
+        _invalidate_analysis([nuance.journal_entry_no])
     return True  # Nuance added successfully
 
 # create journal recommendations
 def add_journal_recommendation(recommendation: JournalRecommendations) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "INSERT INTO journal_recommendations(journal_entry_no, recommendation, is_crisis) VALUES (?, ?, ?)",
-        (recommendation.journal_entry_no, recommendation.recommendation, recommendation.is_crisis),)
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute(
+            "INSERT INTO journal_recommendations(journal_entry_no, recommendation, is_crisis) VALUES (?, ?, ?)",
+            (recommendation.journal_entry_no, recommendation.recommendation, recommendation.is_crisis),)
+        _invalidate_analysis([recommendation.journal_entry_no])
     return True  # Recommendation added successfully
 
+# bulk variants: one executemany and one commit for the whole batch
+def add_journal_scores_bulk(scores_list: List[JournalScores]) -> int:
+    with transaction() as con:
+        con.executemany(
+            "INSERT INTO journal_scores(journal_entry_no, happy, angry, fearful, surprised, bad, disgusted, sad) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(s.journal_entry_no, s.happy, s.angry, s.fearful, s.surprised, s.bad, s.disgusted, s.sad) for s in scores_list],)
+        _invalidate_analysis([s.journal_entry_no for s in scores_list])
+    return len(scores_list)  # Number of rows added
+
+def add_journal_nuances_bulk(nuances: List[JournalNuances]) -> int:
+    with transaction() as con:
+        con.executemany(
+            "INSERT INTO journal_nuances(journal_entry_no, nuance) VALUES (?, ?)",
+            [(n.journal_entry_no, n.nuance) for n in nuances],)
+        _invalidate_analysis([n.journal_entry_no for n in nuances])
+    return len(nuances)  # Number of rows added
+
+def add_journal_recommendations_bulk(recommendations: List[JournalRecommendations]) -> int:
+    with transaction() as con:
+        con.executemany(
+            "INSERT INTO journal_recommendations(journal_entry_no, recommendation, is_crisis) VALUES (?, ?, ?)",
+            [(r.journal_entry_no, r.recommendation, r.is_crisis) for r in recommendations],)
+        _invalidate_analysis([r.journal_entry_no for r in recommendations])
+    return len(recommendations)  # Number of rows added
+
+# save a full ExeterWellbeingAgent.run_workflow result for an entry in one transaction.
+# `scores` is any object with the EMOTIONS attributes; an existing analysis is replaced.
+def save_analysis(journal_entry_no: int, scores, nuances: List[str], recommendation: str, is_crisis: bool = False) -> bool:
+    with transaction() as con:
+        # upsert rather than INSERT OR REPLACE: REPLACE's implicit delete skips the daily_activity triggers
+        con.execute(
+            "INSERT INTO journal_scores(journal_entry_no, happy, angry, fearful, surprised, bad, disgusted, sad) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(journal_entry_no) DO UPDATE SET happy=excluded.happy, angry=excluded.angry, fearful=excluded.fearful, surprised=excluded.surprised, bad=excluded.bad, disgusted=excluded.disgusted, sad=excluded.sad",
+            (journal_entry_no, *(getattr(scores, emotion) for emotion in EMOTIONS)),)
+        con.execute("DELETE FROM journal_nuances WHERE journal_entry_no=?", (journal_entry_no,))
+        con.executemany(
+            "INSERT INTO journal_nuances(journal_entry_no, nuance) VALUES (?, ?)",
+            [(journal_entry_no, nuance) for nuance in nuances],)
+        con.execute(
+            "INSERT OR REPLACE INTO journal_recommendations(journal_entry_no, recommendation, is_crisis) VALUES (?, ?, ?)",
+            (journal_entry_no, recommendation, is_crisis),)
+        _invalidate_analysis([journal_entry_no])
+    return True  # Analysis saved successfully
+
 
 # fetch journal entries for a user
-def fetch_journal_entries(user_sub: str) -> List[JournalEntry]:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "SELECT journal_entry_no, created_at, entry_text FROM journal_entries WHERE user_sub = ?",
-        (user_sub,),
-    )
-    entries = cur.fetchall()
-    con.close()
-    return [JournalEntry(journal_entry_no=row[0], user_sub = user_sub, created_at=row[1], entry_text=row[2]) for row in entries]  # Return list of JournalEntry objects
+def fetch_journal_entries(user_sub: str, fast: bool = False) -> List[Union[JournalEntry, JournalEntryRow]]:
+    with connection() as con:
+        cur = con.cursor()
+        if fast:
+            cur.row_factory = _row_factory(JournalEntryRow)
+        cur.execute(
+            "SELECT journal_entry_no, user_sub, created_at, entry_text FROM journal_entries WHERE user_sub = ?",
+            (user_sub,),
+        )
+        entries = cur.fetchall()
+    if fast:
+        return entries
+    return [JournalEntry(journal_entry_no=row[0], user_sub=row[1], created_at=row[2], entry_text=row[3]) for row in entries]  # Return list of JournalEntry objects
+
+# fetch one page of a user's journal entries, newest first.
+# `after` is the (created_at, journal_entry_no) of the last entry on the previous page.
+def fetch_journal_entries_page(user_sub: str, after: Optional[Tuple[str, int]] = None, limit: int = 20, fast: bool = False) -> List[Union[JournalEntry, JournalEntryRow]]:
+    with connection() as con:
+        cur = con.cursor()
+        if fast:
+            cur.row_factory = _row_factory(JournalEntryRow)
+        if after is None:
+            cur.execute(
+                "SELECT journal_entry_no, user_sub, created_at, entry_text FROM journal_entries WHERE user_sub = ? ORDER BY created_at DESC, journal_entry_no DESC LIMIT ?",
+                (user_sub, limit),
+            )
+        else:
+            cur.execute(
+                "SELECT journal_entry_no, user_sub, created_at, entry_text FROM journal_entries WHERE user_sub = ? AND (created_at, journal_entry_no) < (?, ?) ORDER BY created_at DESC, journal_entry_no DESC LIMIT ?",
+                (user_sub, after[0], after[1], limit),
+            )
+        entries = cur.fetchall()
+    if fast:
+        return entries
+    return [JournalEntry(journal_entry_no=row[0], user_sub=row[1], created_at=row[2], entry_text=row[3]) for row in entries]  # Return list of JournalEntry objects
+
+# one page of a user's entries, newest first and paged like fetch_journal_entries_page,
+# each with its scores, top emotion, nuances and recommendation, in one query
+def fetch_entries_with_analysis(user_sub: str, after: Optional[Tuple[str, int]] = None, limit: int = 20, fast: bool = False) -> List[Union[JournalEntryWithAnalysis, JournalEntryWithAnalysisRow]]:
+    with connection() as con:
+        cur = con.cursor()
+        cur.row_factory = _entry_with_analysis_row
+        if after is None:
+            cur.execute(
+                "SELECT * FROM journal_entries_with_analysis WHERE user_sub = ? ORDER BY created_at DESC, journal_entry_no DESC LIMIT ?",
+                (user_sub, limit),
+            )
+        else:
+            cur.execute(
+                "SELECT * FROM journal_entries_with_analysis WHERE user_sub = ? AND (created_at, journal_entry_no) < (?, ?) ORDER BY created_at DESC, journal_entry_no DESC LIMIT ?",
+                (user_sub, after[0], after[1], limit),
+            )
+        rows = cur.fetchall()
+    if fast:
+        return rows
+    return [JournalEntryWithAnalysis(**row._asdict()) for row in rows]  # Return list of JournalEntryWithAnalysis objects
+
+# Entries with no scores yet, oldest first, for batch analysis. Anti-join on the
+# journal_scores primary key; page with `after` = the last journal_entry_no seen.
+def fetch_unanalysed_entries(after: int = 0, limit: int = 100, user_sub: Optional[str] = None, fast: bool = False) -> List[Union[JournalEntry, JournalEntryRow]]:
+    with connection() as con:
+        cur = con.cursor()
+        if fast:
+            cur.row_factory = _row_factory(JournalEntryRow)
+        # separate statements rather than "? IS NULL OR user_sub = ?", which would keep
+        # the planner off idx_journal_entries_user_created for a single user
+        if user_sub is None:
+            cur.execute(
+                "SELECT e.journal_entry_no, e.user_sub, e.created_at, e.entry_text FROM journal_entries e "
+                "WHERE e.journal_entry_no > ? "
+                "AND NOT EXISTS (SELECT 1 FROM journal_scores s WHERE s.journal_entry_no = e.journal_entry_no) "
+                "ORDER BY e.journal_entry_no LIMIT ?",
+                (after, limit),
+            )
+        else:
+            cur.execute(
+                "SELECT e.journal_entry_no, e.user_sub, e.created_at, e.entry_text FROM journal_entries e "
+                "WHERE e.user_sub = ? AND e.journal_entry_no > ? "
+                "AND NOT EXISTS (SELECT 1 FROM journal_scores s WHERE s.journal_entry_no = e.journal_entry_no) "
+                "ORDER BY e.journal_entry_no LIMIT ?",
+                (user_sub, after, limit),
+            )
+        entries = cur.fetchall()
+    if fast:
+        return entries
+    return [JournalEntry(journal_entry_no=row[0], user_sub=row[1], created_at=row[2], entry_text=row[3]) for row in entries]  # Return list of JournalEntry objects
+
+# how many entries fetch_unanalysed_entries would still return
+def count_unanalysed_entries(after: int = 0, user_sub: Optional[str] = None) -> int:
+    with connection() as con:
+        cur = con.cursor()
+        if user_sub is None:
+            cur.execute(
+                "SELECT count(*) FROM journal_entries e WHERE e.journal_entry_no > ? "
+                "AND NOT EXISTS (SELECT 1 FROM journal_scores s WHERE s.journal_entry_no = e.journal_entry_no)",
+                (after,),
+            )
+        else:
+            cur.execute(
+                "SELECT count(*) FROM journal_entries e WHERE e.user_sub = ? AND e.journal_entry_no > ? "
+                "AND NOT EXISTS (SELECT 1 FROM journal_scores s WHERE s.journal_entry_no = e.journal_entry_no)",
+                (user_sub, after),
+            )
+        return cur.fetchone()[0]
+
+# cursor to pass as `after` to fetch the page following this entry
+def entry_cursor(entry: Union[JournalEntry, JournalEntryRow, JournalEntryWithAnalysisRow]) -> Tuple[str, int]:
+    return (entry.created_at, entry.journal_entry_no)
+
+# fetch a user's n most recent journal entries, newest first
+def fetch_recent_entries(user_sub: str, n: int = 10, fast: bool = False) -> List[Union[JournalEntry, JournalEntryRow]]:
+    return fetch_journal_entries_page(user_sub, limit=n, fast=fast)
+
+# turn free text into an FTS5 query: every word must match, the last one as a prefix
+# (so results update while typing). Quoting each word keeps FTS5 syntax out of user input.
+def _fts_query(user_sub: str, text: str) -> Optional[str]:
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    user = user_sub.replace('"', '""')
+    return f'user_sub : "{user}" AND entry_text : (' + " AND ".join(f'"{word}"' for word in words) + "*)"
+
+# merge the search index into a single b-tree; worth running after bulk inserts
+def optimize_search_index() -> bool:
+    with transaction() as con:
+        con.execute("INSERT INTO journal_entries_fts(journal_entries_fts) VALUES ('optimize')")
+    return True  # Optimize successful
+
+# ranked full-text search over a user's entries, best match first.
+# Matched terms in the snippet are wrapped in `highlight`.
+def search_entries(user_sub: str, query: str, limit: int = 20, highlight: Tuple[str, str] = ("[", "]")) -> List[JournalSearchResult]:
+    match = _fts_query(user_sub, query)
+    if match is None:
+        return []
+    with connection() as con:
+        cur = con.cursor()
+        # bm25 weights: ignore the user_sub column, rank on entry_text only
+        cur.execute(
+            "SELECT e.journal_entry_no, e.created_at, e.entry_text, snippet(journal_entries_fts, 1, ?, ?, '...', 16) "
+            "FROM journal_entries_fts JOIN journal_entries e ON e.journal_entry_no = journal_entries_fts.rowid "
+            "WHERE journal_entries_fts MATCH ? AND e.user_sub = ? ORDER BY bm25(journal_entries_fts, 0.0, 1.0) LIMIT ?",
+            (highlight[0], highlight[1], match, user_sub, limit),
+        )
+        results = cur.fetchall()
+    return [JournalSearchResult(journal_entry_no=row[0], user_sub=user_sub, created_at=row[1], entry_text=row[2], snippet=row[3]) for row in results]  # Return list of JournalSearchResult objects
 
 # fetch entry values for a journal entry
 def fetch_entry_values(journal_entry_no: int) -> Optional[EntryValues]:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "SELECT created_at, primary_emotion, stress, energy, mood, motivation, trend, burnout_risk FROM entry_values WHERE journal_entry_no = ?",
-        (journal_entry_no,),
-    )
-    values = cur.fetchone()
-    con.close()
+    with connection() as con:
+        cur = con.cursor()
+        cur.execute(
+            "SELECT created_at, primary_emotion, stress, energy, mood, motivation, trend, burnout_risk FROM entry_values WHERE journal_entry_no = ?",
+            (journal_entry_no,),
+        )
+        values = cur.fetchone()
     return EntryValues(journal_entry_no=journal_entry_no, created_at=values[0], primary_emotion=values[1], stress=values[2], energy=values[3], mood=values[4], motivation=values[5], trend=values[6], burnout_risk=values[7]) if values else None  # Return EntryValues object or None
 
 # get user details from sub
 def get_user(sub: str) -> Optional[User]:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT SUB, created_at FROM users WHERE SUB=?", (sub,))
-    user = cur.fetchone()
-    con.close()
+    with connection() as con:
+        cur = con.cursor()
+        cur.execute("SELECT SUB, created_at FROM users WHERE SUB=?", (sub,))
+        user = cur.fetchone()
     return User(sub=sub, created_at=user[1]) if user else None  # Return user details
 
 # get journal entry details from journal_entry_no
-def get_journal_entry(journal_entry_no: int) -> Optional[JournalEntry]:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT journal_entry_no, user_sub, created_at, entry_text FROM journal_entries WHERE journal_entry_no=?", (journal_entry_no,))
-    entry = cur.fetchone()
-    con.close()
+def get_journal_entry(journal_entry_no: int, fast: bool = False) -> Optional[Union[JournalEntry, JournalEntryRow]]:
+    with connection() as con:
+        cur = con.cursor()
+        if fast:
+            cur.row_factory = _row_factory(JournalEntryRow)
+        cur.execute("SELECT journal_entry_no, user_sub, created_at, entry_text FROM journal_entries WHERE journal_entry_no=?", (journal_entry_no,))
+        entry = cur.fetchone()
+    if fast:
+        return entry
     return JournalEntry(journal_entry_no=entry[0], user_sub=entry[1], created_at=entry[2], entry_text=entry[3]) if entry else None  # Return journal entry details
 
 # get entry values from entry_values_no
 def get_entry_values(entry_values_no: int) -> Optional[EntryValues]:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT entry_values_no, journal_entry_no, created_at, primary_emotion, stress, energy, mood, motivation, trend, burnout_risk FROM entry_values WHERE entry_values_no=?", (entry_values_no,))
-    value_set = cur.fetchone()
-    con.close()
+    with connection() as con:
+        cur = con.cursor()
+        cur.execute("SELECT entry_values_no, journal_entry_no, created_at, primary_emotion, stress, energy, mood, motivation, trend, burnout_risk FROM entry_values WHERE entry_values_no=?", (entry_values_no,))
+        value_set = cur.fetchone()
     return EntryValues(entry_values_no=value_set[0], journal_entry_no=value_set[1], created_at=value_set[2], primary_emotion=value_set[3], stress=value_set[4], energy=value_set[5], mood=value_set[6], motivation=value_set[7], trend=value_set[8], burnout_risk=value_set[9]) if value_set else None  # Return entry values details
 
 # get journal scores from journal_entry_no
-def get_journal_scores(journal_entry_no: int) -> Optional[JournalScores]:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT journal_entry_no, happy, angry, fearful, surprised, bad, disgusted, sad FROM journal_scores WHERE journal_entry_no=?", (journal_entry_no,))
-    scores = cur.fetchone()
-    con.close()
+def get_journal_scores(journal_entry_no: int, fast: bool = False) -> Optional[Union[JournalScores, JournalScoresRow]]:
+    with connection() as con:
+        cur = con.cursor()
+        if fast:
+            cur.row_factory = _row_factory(JournalScoresRow)
+        cur.execute("SELECT journal_entry_no, happy, angry, fearful, surprised, bad, disgusted, sad FROM journal_scores WHERE journal_entry_no=?", (journal_entry_no,))
+        scores = cur.fetchone()
+    if fast:
+        return scores
     return JournalScores(journal_entry_no=scores[0], happy=scores[1], angry=scores[2], fearful=scores[3], surprised=scores[4], bad=scores[5], disgusted=scores[6], sad=scores[7]) if scores else None  # Return journal scores details
 
 # get journal recommendations from journal_entry_no
-def get_journal_recommendation(journal_entry_no: int) -> Optional[JournalRecommendations]:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT journal_entry_no, recommendation, is_crisis FROM journal_recommendations WHERE journal_entry_no=?", (journal_entry_no,))
-    recommendation = cur.fetchone()
-    con.close()
+def get_journal_recommendation(journal_entry_no: int, fast: bool = False) -> Optional[Union[JournalRecommendations, JournalRecommendationsRow]]:
+    with connection() as con:
+        cur = con.cursor()
+        if fast:
+            cur.row_factory = _recommendation_row
+        cur.execute("SELECT journal_entry_no, recommendation, is_crisis FROM journal_recommendations WHERE journal_entry_no=?", (journal_entry_no,))
+        recommendation = cur.fetchone()
+    if fast:
+        return recommendation
     return JournalRecommendations(journal_entry_no=recommendation[0], recommendation=recommendation[1], is_crisis=bool(recommendation[2])) if recommendation else None  # Return journal recommendation details
 
 # get nuances for a journal entry
-def get_journal_nuances(journal_entry_no: int) -> List[JournalNuances]:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT nuance_id, journal_entry_no, nuance FROM journal_nuances WHERE journal_entry_no=?", (journal_entry_no,))
-    nuances = cur.fetchall()
-    con.close()
+def get_journal_nuances(journal_entry_no: int, fast: bool = False) -> List[Union[JournalNuances, JournalNuancesRow]]:
+    with connection() as con:
+        cur = con.cursor()
+        if fast:
+            cur.row_factory = _row_factory(JournalNuancesRow)
+        cur.execute("SELECT nuance_id, journal_entry_no, nuance FROM journal_nuances WHERE journal_entry_no=?", (journal_entry_no,))
+        nuances = cur.fetchall()
+    if fast:
+        return nuances
     return [JournalNuances(nuance_id=row[0], journal_entry_no=row[1], nuance=row[2]) for row in nuances]  # Return list of JournalNuances objects
 
 # get single nuance by id
-def get_journal_nuance_by_id(nuance_id: int) -> Optional[JournalNuances]:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT nuance_id, journal_entry_no, nuance FROM journal_nuances WHERE nuance_id=?", (nuance_id,))
-    nuance = cur.fetchone()
-    con.close()
+def get_journal_nuance_by_id(nuance_id: int, fast: bool = False) -> Optional[Union[JournalNuances, JournalNuancesRow]]:
+    with connection() as con:
+        cur = con.cursor()
+        if fast:
+            cur.row_factory = _row_factory(JournalNuancesRow)
+        cur.execute("SELECT nuance_id, journal_entry_no, nuance FROM journal_nuances WHERE nuance_id=?", (nuance_id,))
+        nuance = cur.fetchone()
+    if fast:
+        return nuance
     return JournalNuances(nuance_id=nuance[0], journal_entry_no=nuance[1], nuance=nuance[2]) if nuance else None  # Return JournalNuances object
 
 
+# Scores, nuances and recommendation for many entries at once. Cached entries cost
+# nothing; the rest are read with one IN query per table. Entries without analysis
+# come back with scores and recommendation None and no nuances.
+def get_analysis_for_entries(journal_entry_nos: List[int]) -> Dict[int, EntryAnalysis]:
+    ids = list(dict.fromkeys(int(n) for n in journal_entry_nos))
+    # inside a transaction its own uncommitted writes must be visible, so skip the cache
+    use_cache = not get_pool().in_transaction()
+    found = _analysis_cache.get_many(ids) if use_cache else {}
+    missing = [n for n in ids if n not in found]
+    if missing:
+        version = _analysis_cache.version
+        ids_json = json.dumps(missing)
+        scores, nuances, recommendations = {}, {n: [] for n in missing}, {}
+        with connection() as con:
+            cur = con.cursor()
+            cur.row_factory = _row_factory(JournalScoresRow)
+            for row in cur.execute("SELECT * FROM journal_scores WHERE journal_entry_no IN (SELECT value FROM json_each(?))", (ids_json,)):
+                scores[row.journal_entry_no] = row
+            cur.row_factory = _row_factory(JournalNuancesRow)
+            for row in cur.execute(
+                "SELECT * FROM journal_nuances WHERE journal_entry_no IN (SELECT value FROM json_each(?)) ORDER BY nuance_id", (ids_json,)
+            ):
+                nuances[row.journal_entry_no].append(row)
+            cur.row_factory = _recommendation_row
+            for row in cur.execute("SELECT * FROM journal_recommendations WHERE journal_entry_no IN (SELECT value FROM json_each(?))", (ids_json,)):
+                recommendations[row.journal_entry_no] = row
+        fetched = [EntryAnalysis(n, scores.get(n), tuple(nuances[n]), recommendations.get(n)) for n in missing]
+        if use_cache:
+            _analysis_cache.put_many(fetched, version)
+        found.update((a.journal_entry_no, a) for a in fetched)
+    return {n: found[n] for n in ids}
+
+# read-through lookup for a single entry
+def get_entry_analysis(journal_entry_no: int) -> EntryAnalysis:
+    return get_analysis_for_entries([journal_entry_no])[journal_entry_no]
+
+# aggregates: computed in SQL over idx_journal_entries_user_created or the daily_activity rollup,
+# so no entries are materialised.
+# Days are calendar days of created_at (UTC, as stored by current_timestamp).
+
+# count a user's journal entries
+def count_journal_entries(user_sub: str) -> int:
+    with connection() as con:
+        cur = con.cursor()
+        cur.execute("SELECT count(*) FROM journal_entries WHERE user_sub=?", (user_sub,))
+        count = cur.fetchone()[0]
+    return count
+
+# entries per day between start and end (inclusive, 'YYYY-MM-DD'); days without entries are omitted
+def daily_entry_counts(user_sub: str, start: str, end: str) -> Dict[str, int]:
+    with connection() as con:
+        cur = con.cursor()
+        cur.execute(
+            "SELECT day, entry_count FROM daily_activity WHERE user_sub=? AND day BETWEEN ? AND ? ORDER BY day",
+            (user_sub, start, end),
+        )
+        counts = cur.fetchall()
+    return dict(counts)
+
+# one row per active day between start and end (inclusive), read straight from the rollup
+def fetch_daily_activity(user_sub: str, start: str, end: str) -> List[DailyActivity]:
+    with connection() as con:
+        cur = con.cursor()
+        cur.execute(
+            f"SELECT day, entry_count, scored_count, {_SUMS} FROM daily_activity WHERE user_sub=? AND day BETWEEN ? AND ? ORDER BY day",
+            (user_sub, start, end),
+        )
+        rows = cur.fetchall()
+    return [
+        DailyActivity(day=row[0], entry_count=row[1], scored_count=row[2],
+                      **{e: (total / row[2] if row[2] else None) for e, total in zip(EMOTIONS, row[3:])})
+        for row in rows
+    ]  # Return list of DailyActivity objects
+
+# (current, longest) run of consecutive days with at least one entry.
+# The current streak is still alive if the last entry was today or yesterday.
+def journal_streaks(user_sub: str, today: Optional[str] = None) -> Tuple[int, int]:
+    with connection() as con:
+        cur = con.cursor()
+        cur.execute(
+            """
+            WITH runs AS (
+                SELECT max(day) AS last_day, count(*) AS length
+                FROM (SELECT day, julianday(day) - row_number() OVER (ORDER BY day) AS run FROM daily_activity WHERE user_sub=?)
+                GROUP BY run
+            )
+            SELECT
+                coalesce((SELECT length FROM runs WHERE last_day >= date(coalesce(?, 'now'), '-1 day')), 0),
+                coalesce((SELECT max(length) FROM runs), 0)
+            """,
+            (user_sub, today),
+        )
+        current, longest = cur.fetchone()
+    return current, longest
+
+# days where the mean happy score beats the mean of the strongest negative emotion per entry
+def count_positive_days(user_sub: str) -> int:
+    with connection() as con:
+        cur = con.cursor()
+        cur.execute(
+            """
+            SELECT count(*) FROM (
+                SELECT date(e.created_at) AS day
+                FROM journal_entries e JOIN journal_scores s ON s.journal_entry_no = e.journal_entry_no
+                WHERE e.user_sub=?
+                GROUP BY day
+                HAVING avg(s.happy) > avg(max(s.angry, s.fearful, s.bad, s.disgusted, s.sad))
+            )
+            """,
+            (user_sub,),
+        )
+        count = cur.fetchone()[0]
+    return count
+
 # check if user exists
 def user_exists(sub: str) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT * FROM users WHERE SUB=?", (sub,))
-    user = cur.fetchone()
-    con.close()
+    with connection() as con:
+        cur = con.cursor()
+        cur.execute("SELECT * FROM users WHERE SUB=?", (sub,))
+        user = cur.fetchone()
     return user is not None
 
 # check if journal entry has values set
 def journal_entry_has_values(journal_entry_no: int) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("SELECT * FROM entry_values WHERE journal_entry_no=?", (journal_entry_no,))
-    values = cur.fetchone()
-    con.close()
+    with connection() as con:
+        cur = con.cursor()
+        cur.execute("SELECT * FROM entry_values WHERE journal_entry_no=?", (journal_entry_no,))
+        values = cur.fetchone()
     return values is not None
 
 
 # updates
 def update_journal_entry(journal_entry: JournalEntry) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "UPDATE journal_entries SET entry_text=? WHERE journal_entry_no=?",
-        (journal_entry.entry_text, journal_entry.journal_entry_no),
-    )
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute(
+            "UPDATE journal_entries SET entry_text=? WHERE journal_entry_no=?",
+            (journal_entry.entry_text, journal_entry.journal_entry_no),
+        )
     return True  # Update successful
 
 def update_entry_values(entry_values: EntryValues) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "UPDATE entry_values SET primary_emotion=?, stress=?, energy=?, mood=?, motivation=?, trend=?, burnout_risk=?, created_at=CURRENT_TIMESTAMP WHERE journal_entry_no=?",
-        (entry_values.primary_emotion, entry_values.stress, entry_values.energy, entry_values.mood, entry_values.motivation, entry_values.trend, entry_values.burnout_risk, entry_values.journal_entry_no),
-    )
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute(
+            "UPDATE entry_values SET primary_emotion=?, stress=?, energy=?, mood=?, motivation=?, trend=?, burnout_risk=?, created_at=CURRENT_TIMESTAMP WHERE journal_entry_no=?",
+            (entry_values.primary_emotion, entry_values.stress, entry_values.energy, entry_values.mood, entry_values.motivation, entry_values.trend, entry_values.burnout_risk, entry_values.journal_entry_no),
+        )
     return True  # Update successful
 
 def update_journal_scores(journal_scores: JournalScores) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "UPDATE journal_scores SET happy=?, angry=?, fearful=?, surprised=?, bad=?, disgusted=?, sad=? WHERE journal_entry_no=?",
-        (journal_scores.happy, journal_scores.angry, journal_scores.fearful, journal_scores.surprised, journal_scores.bad, journal_scores.disgusted, journal_scores.sad, journal_scores.journal_entry_no),
-    )
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute(
+            "UPDATE journal_scores SET happy=?, angry=?, fearful=?, surprised=?, bad=?, disgusted=?, sad=? WHERE journal_entry_no=?",
+            (journal_scores.happy, journal_scores.angry, journal_scores.fearful, journal_scores.surprised, journal_scores.bad, journal_scores.disgusted, journal_scores.sad, journal_scores.journal_entry_no),
+        )
+        _invalidate_analysis([journal_scores.journal_entry_no])
     return True  # Update successful
 
 def update_journal_recommendation(journal_recommendation: JournalRecommendations) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "UPDATE journal_recommendations SET recommendation=?, is_crisis=? WHERE journal_entry_no=?",
-        (journal_recommendation.recommendation, journal_recommendation.is_crisis, journal_recommendation.journal_entry_no),
-    )
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute(
+            "UPDATE journal_recommendations SET recommendation=?, is_crisis=? WHERE journal_entry_no=?",
+            (journal_recommendation.recommendation, journal_recommendation.is_crisis, journal_recommendation.journal_entry_no),
+        )
+        _invalidate_analysis([journal_recommendation.journal_entry_no])
     return True  # Update successful
 
 def update_journal_nuance_by_id(journal_nuance: JournalNuances) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute(
-        "UPDATE journal_nuances SET nuance=? WHERE nuance_id=?",
-        (journal_nuance.nuance, journal_nuance.nuance_id),
-    )
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute(
+            "UPDATE journal_nuances SET nuance=? WHERE nuance_id=? RETURNING journal_entry_no",
+            (journal_nuance.nuance, journal_nuance.nuance_id),
+        )
+        _invalidate_analysis([row[0] for row in cur.fetchall()])
     return True  # Update successful
 
 
 # deletions
 def delete_journal_entry(journal_entry_no: int) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM journal_entries WHERE journal_entry_no=?", (journal_entry_no,))
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM journal_entries WHERE journal_entry_no=?", (journal_entry_no,))
+        _invalidate_analysis([journal_entry_no])
     return True  # Deletion successful
 
 def delete_entry_values(journal_entry_no: int) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM entry_values WHERE journal_entry_no=?", (journal_entry_no,))
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM entry_values WHERE journal_entry_no=?", (journal_entry_no,))
     return True  # Deletion successful
 
 def delete_user(sub: str) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM users WHERE SUB=?", (sub,))
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM users WHERE SUB=?", (sub,))
+        _invalidate_analysis()
     return True  # Deletion successful
 
 def delete_journal_nuance_by_id(nuance_id: int) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM journal_nuances WHERE nuance_id=?", (nuance_id,))
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM journal_nuances WHERE nuance_id=? RETURNING journal_entry_no", (nuance_id,))
+        _invalidate_analysis([row[0] for row in cur.fetchall()])
     return True  # Deletion successful
 
 def delete_journal_nuances_for_entry(journal_entry_no: int) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM journal_nuances WHERE journal_entry_no=?", (journal_entry_no,))
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM journal_nuances WHERE journal_entry_no=?", (journal_entry_no,))
+        _invalidate_analysis([journal_entry_no])
     return True  # Deletion successful
 
 def delete_journal_scores(journal_entry_no: int) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM journal_scores WHERE journal_entry_no=?", (journal_entry_no,))
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM journal_scores WHERE journal_entry_no=?", (journal_entry_no,))
+        _invalidate_analysis([journal_entry_no])
     return True  # Deletion successful
 
 def delete_journal_recommendation(journal_entry_no: int) -> bool:
-    con = get_connection()
-    cur = con.cursor()
-    cur.execute("DELETE FROM journal_recommendations WHERE journal_entry_no=?", (journal_entry_no,))
-    con.commit()
-    con.close()
+    with transaction() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM journal_recommendations WHERE journal_entry_no=?", (journal_entry_no,))
+        _invalidate_analysis([journal_entry_no])
     return True  # Deletion successful
 
+# delete entries by id, with their scores, nuances and recommendations (ON DELETE CASCADE); returns the number deleted
+def delete_journal_entries(journal_entry_nos: List[int]) -> int:
+    with transaction() as con:
+        cur = con.cursor()
+        # one JSON array parameter instead of a placeholder per id, so there's no bound-variable limit
+        cur.execute(
+            "DELETE FROM journal_entries WHERE journal_entry_no IN (SELECT value FROM json_each(?))",
+            (json.dumps([int(n) for n in journal_entry_nos]),),
+        )
+        _invalidate_analysis(list(journal_entry_nos))
+        return cur.rowcount
+
+# Delete the entries `select` (a query for journal_entry_no) finds, DELETE_CHUNK per
+# transaction, so a large delete never holds the write lock for long.
+def _delete_entries_chunked(select: str, params: tuple, chunk_size: int, pause: float = 0.0) -> int:
+    deleted = 0
+    while True:
+        with transaction() as con:
+            cur = con.cursor()
+            cur.execute(f"DELETE FROM journal_entries WHERE journal_entry_no IN ({select} LIMIT ?) RETURNING journal_entry_no", (*params, chunk_size))
+            deleted_nos = [row[0] for row in cur.fetchall()]
+            count = len(deleted_nos)
+            _invalidate_analysis(deleted_nos)
+        deleted += count
+        if count < chunk_size:
+            break
+        reclaim_free_pages()
+        if pause:
+            time.sleep(pause)
+    reclaim_free_pages()
+    return deleted
+
+# delete a user's entries, optionally only those from days start..end (inclusive); the account is kept.
+# Inside transaction() the chunks all join the caller's transaction, so it becomes one large delete.
+def delete_journal_entries_for_user(user_sub: str, start: Optional[str] = None, end: Optional[str] = None,
+                                    chunk_size: int = DELETE_CHUNK) -> int:
+    return _delete_entries_chunked(
+        "SELECT journal_entry_no FROM journal_entries WHERE user_sub=? AND created_at >= coalesce(?, '') "
+        "AND created_at < coalesce(date(?, '+1 day'), '9999-12-31')",
+        (user_sub, start, end),
+        chunk_size,
+    )
+
+# Retention job: delete every user's entries older than retention_days, in chunks,
+# pausing between them so the app's own writes aren't held up. Returns the number deleted.
+# Not allowed inside transaction(): the chunks would join it and hold the write lock through every pause.
+def purge_journal_entries(retention_days: int, chunk_size: int = DELETE_CHUNK, pause: float = PURGE_PAUSE) -> int:
+    if get_pool().in_transaction():
+        raise RuntimeError("purge_journal_entries can't run inside transaction(); it commits chunk by chunk")
+    with connection() as con:
+        cur = con.cursor()
+        cutoff = cur.execute("SELECT datetime('now', ?)", (f"-{int(retention_days)} days",)).fetchone()[0]
+        subs = [row[0] for row in cur.execute("SELECT SUB FROM users")]
+    # per user, so each chunk is a range scan of idx_journal_entries_user_created
+    return sum(
+        _delete_entries_chunked(
+            "SELECT journal_entry_no FROM journal_entries WHERE user_sub=? AND created_at < ?", (sub, cutoff), chunk_size, pause
+        )
+        for sub in subs
+    )
+
+# hand up to `pages` free pages back to the filesystem; a no-op unless auto_vacuum is INCREMENTAL,
+# and inside a transaction (executescript would commit it)
+def reclaim_free_pages(pages: int = VACUUM_PAGES) -> int:
+    with connection() as con:
+        cur = con.cursor()
+        if con.in_transaction or cur.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+            return 0
+        before = cur.execute("PRAGMA freelist_count").fetchone()[0]
+        # execute() only steps this pragma once (one page); executescript() runs it to completion
+        con.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        return before - cur.execute("PRAGMA freelist_count").fetchone()[0]
+
+# One-off for databases created before auto_vacuum was set: rewrites the whole file
+# with VACUUM (slow on big files, and it needs the database to itself)
+def enable_incremental_vacuum() -> bool:
+    with connection() as con:
+        if con.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        con.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        con.execute("VACUUM")
+    return True
+
 # Example usage:
 if __name__ == "__main__":
     # Create a new user
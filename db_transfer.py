@@ -0,0 +1,247 @@
+"""Streaming export and import of journal histories (JSONL or CSV).
+
+    python db_transfer.py export backup.jsonl --user SUB   # one account
+    python db_transfer.py export backup_dir                 # every account, one CSV per table
+    python db_transfer.py import backup.jsonl
+
+Rows stream straight from a cursor to the file and back, so memory stays flat
+however many entries an account has. Exports list parent rows before their
+children, so an import can read the file in one pass. Imports commit every
+BATCH_SIZE rows. They also assign fresh journal_entry_no / nuance_id values, so
+an account can be merged into a database that already has other users. The
+full-text index and the daily_activity rollup are rebuilt once at the end,
+rather than by triggers on every row. That rebuild covers the whole database,
+not just the imported rows, and holds the write lock while it runs, so even a
+small import costs time in proportion to every entry already stored.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from pydantic import BaseModel
+
+import db_operations as db
+import db_write_queue
+
+BATCH_SIZE = 5000  # rows per import transaction
+
+# exported columns per table, parents first; row ids other than
+# journal_entry_no are not exported because imports assign new ones
+TABLES: Dict[str, Tuple[str, ...]] = {
+    "users": ("sub", "created_at"),
+    "journal_entries": ("journal_entry_no", "user_sub", "created_at", "entry_text"),
+    "journal_scores": ("journal_entry_no",) + db.EMOTIONS,
+    "journal_nuances": ("journal_entry_no", "nuance"),
+    "journal_recommendations": ("journal_entry_no", "recommendation", "is_crisis"),
+}
+TEXT_COLUMNS = {"sub", "created_at", "user_sub", "entry_text", "nuance", "recommendation"}
+
+Record = Tuple[str, Dict[str, object]]
+
+
+# rows moved per table, and how fast
+class TransferReport(BaseModel):
+    rows: Dict[str, int] = {}
+    skipped: int = 0  # imported child rows whose entry wasn't in the file
+    seconds: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(self.rows.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.total / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        counts = ", ".join(f"{table} {count}" for table, count in self.rows.items())
+        return f"{self.total} rows in {self.seconds:.2f}s ({self.rows_per_second:,.0f} rows/s): {counts}" + (
+            f", {self.skipped} skipped" if self.skipped else "")
+
+
+def _export_query(table: str, user_count: Optional[int]) -> str:
+    columns = ", ".join(f"t.{c}" for c in TABLES[table])
+    order = "t.nuance_id" if table == "journal_nuances" else f"t.{TABLES[table][0]}"
+    if user_count is None:
+        return f"SELECT {columns} FROM {table} t ORDER BY {order}"
+    marks = ", ".join("?" * user_count)
+    if table == "users":
+        return f"SELECT {columns} FROM users t WHERE t.sub IN ({marks}) ORDER BY {order}"
+    if table == "journal_entries":
+        return f"SELECT {columns} FROM journal_entries t WHERE t.user_sub IN ({marks}) ORDER BY {order}"
+    return (f"SELECT {columns} FROM {table} t JOIN journal_entries e ON e.journal_entry_no = t.journal_entry_no "
+            f"WHERE e.user_sub IN ({marks}) ORDER BY {order}")
+
+# every row of every table (or just the given users' rows), read from one snapshot
+def iter_records(user_subs: Optional[Iterable[str]] = None) -> Iterator[Record]:
+    subs = None if user_subs is None else list(user_subs)
+    with db.connection() as con:
+        con.execute("BEGIN")  # later tables see the same snapshot as earlier ones; released with the connection
+        for table, columns in TABLES.items():
+            cur = con.execute(_export_query(table, None if subs is None else len(subs)), subs or ())
+            for row in cur:
+                yield table, dict(zip(columns, row))
+
+
+def _export(records: Iterator[Record], write: Callable[[str, Dict[str, object]], None]) -> TransferReport:
+    report = TransferReport(rows={table: 0 for table in TABLES})
+    start = time.perf_counter()
+    for table, row in records:
+        write(table, row)
+        report.rows[table] += 1
+    report.seconds = time.perf_counter() - start
+    return report
+
+# one JSON object per line, tagged with its table
+def export_jsonl(path: str, user_subs: Optional[Iterable[str]] = None) -> TransferReport:
+    with open(path, "w", encoding="utf-8") as f:
+        return _export(iter_records(user_subs), lambda table, row: f.write(json.dumps({"table": table, **row}) + "\n"))
+
+# one CSV file per table, named after it
+def export_csv(directory: str, user_subs: Optional[Iterable[str]] = None) -> TransferReport:
+    os.makedirs(directory, exist_ok=True)
+    files, writers = {}, {}
+    try:
+        for table, columns in TABLES.items():
+            files[table] = open(os.path.join(directory, f"{table}.csv"), "w", encoding="utf-8", newline="")
+            writers[table] = csv.DictWriter(files[table], fieldnames=columns)
+            writers[table].writeheader()
+        return _export(iter_records(user_subs), lambda table, row: writers[table].writerow(row))
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def read_jsonl(path: str) -> Iterator[Record]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                yield row.pop("table"), row
+
+def read_csv(directory: str) -> Iterator[Record]:
+    for table in TABLES:
+        path = os.path.join(directory, f"{table}.csv")
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                # CSV has no NULL; empty numeric fields mean missing
+                yield table, {k: (None if v == "" and k not in TEXT_COLUMNS else v) for k, v in row.items()}
+
+
+_IMPORT_SQL = {
+    "users": "INSERT OR IGNORE INTO users(SUB, created_at) VALUES (?, coalesce(?, current_timestamp))",
+    "journal_entries": "INSERT INTO journal_entries(user_sub, created_at, entry_text) VALUES (?, coalesce(?, current_timestamp), ?)",
+    # children attach to the entry's new number; rows for entries not in the import match nothing
+    "journal_scores": f"INSERT OR REPLACE INTO journal_scores(journal_entry_no, {', '.join(db.EMOTIONS)}) "
+                      f"SELECT new_no, {', '.join('?' * len(db.EMOTIONS))} FROM import_entry_map WHERE old_no = ?",
+    "journal_nuances": "INSERT INTO journal_nuances(journal_entry_no, nuance) SELECT new_no, ? FROM import_entry_map WHERE old_no = ?",
+    "journal_recommendations": "INSERT OR REPLACE INTO journal_recommendations(journal_entry_no, recommendation, is_crisis) "
+                               "SELECT new_no, ?, ? FROM import_entry_map WHERE old_no = ?",
+}
+
+def _import_params(table: str, row: Dict[str, object]) -> tuple:
+    columns = TABLES[table]
+    if table in ("users", "journal_entries"):
+        return tuple(row.get(c) for c in columns if c != "journal_entry_no")
+    return tuple(row.get(c) for c in columns[1:]) + (row.get("journal_entry_no"),)
+
+# the rollup and full-text triggers; dropped during an import and recreated after it
+_DEFERRED_TRIGGERS = "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ('journal_entries', 'journal_scores')"
+
+# Insert records (parents before children, as exported) in BATCH_SIZE transactions.
+# The rollup and search triggers are off until it finishes, so other writes made
+# meanwhile (db_async, the GUI, another process) aren't indexed or rolled up as
+# they happen. The whole index and rollup are rebuilt at the end, which picks
+# them up along with the imported rows (and takes as long as the database is
+# big, with the write lock held). The per-entry analysis cache is cleared with
+# it, since the import wrote analysis with its own SQL. Refuses to start while
+# the shared group-commit writer is running; if the import dies part way, the
+# next db_operations.initialize_db puts the triggers back.
+def import_records(records: Iterable[Record], batch_size: int = BATCH_SIZE,
+                   progress: Optional[Callable[[TransferReport], None]] = None) -> TransferReport:
+    if db_write_queue.running():
+        raise RuntimeError("close db_write_queue before importing: its writes would bypass the rollup and search triggers")
+    report = TransferReport(rows={table: 0 for table in TABLES})
+    start = time.perf_counter()
+    with db.connection() as con:
+        with db.transaction():
+            con.execute("CREATE TEMP TABLE IF NOT EXISTS import_entry_map(old_no INTEGER PRIMARY KEY, new_no INTEGER NOT NULL)")
+            con.execute("DELETE FROM import_entry_map")
+            for (name,) in con.execute(_DEFERRED_TRIGGERS).fetchall():
+                con.execute(f"DROP TRIGGER {name}")
+        try:
+            table, batch = None, []
+
+            def flush():
+                if not batch:
+                    return
+                with db.transaction():
+                    if table == "journal_entries":
+                        mapping = [(old_no, con.execute(_IMPORT_SQL[table], params).lastrowid) for old_no, params in batch]
+                        con.executemany("INSERT OR REPLACE INTO import_entry_map(old_no, new_no) VALUES (?, ?)", mapping)
+                        inserted = len(batch)
+                    else:
+                        inserted = con.executemany(_IMPORT_SQL[table], batch).rowcount
+                report.rows[table] += inserted
+                if table != "users":
+                    report.skipped += len(batch) - inserted
+                batch.clear()
+                report.seconds = time.perf_counter() - start
+                if progress is not None:
+                    progress(report)
+
+            for record_table, row in records:
+                if record_table not in TABLES:
+                    raise ValueError(f"unknown table {record_table!r} in import")
+                if record_table != table or len(batch) >= batch_size:
+                    flush()
+                    table = record_table
+                params = _import_params(table, row)
+                batch.append((row.get("journal_entry_no"), params) if table == "journal_entries" else params)
+            flush()
+        finally:
+            with db.transaction():
+                db.rebuild_derived(con)
+                con.execute("DROP TABLE import_entry_map")
+                db._invalidate_analysis()  # entries read mid-import may be cached half imported
+    report.seconds = time.perf_counter() - start
+    return report
+
+def import_jsonl(path: str, **kwargs) -> TransferReport:
+    return import_records(read_jsonl(path), **kwargs)
+
+def import_csv(directory: str, **kwargs) -> TransferReport:
+    return import_records(read_csv(directory), **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=("export", "import"))
+    parser.add_argument("path", help="a .jsonl file, or a directory of CSV files")
+    parser.add_argument("--user", action="append", dest="users", help="export only this account (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per import transaction")
+    args = parser.parse_args()
+    jsonl = args.path.endswith(".jsonl")
+    if args.action == "export":
+        report = (export_jsonl if jsonl else export_csv)(args.path, args.users)
+    else:
+        if args.users:
+            parser.error("--user only applies to export")
+        last = [0.0]
+
+        def show(progress):
+            if progress.seconds - last[0] >= 1:
+                last[0] = progress.seconds
+                print(f"  {progress}")
+
+        report = (import_jsonl if jsonl else import_csv)(args.path, batch_size=args.batch_size, progress=show)
+    print(f"{args.action}: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Group-commit writer for db_operations.
+
+Callers hand writes to a background thread and get a Future back straight away:
+
+    import db_write_queue
+    future = db_write_queue.submit(add_journal_entry, entry)
+    future.add_done_callback(...)  # or future.result()
+
+The writer collects whatever is queued, waiting at most MAX_LATENCY after the
+first write, and commits it as one transaction. A burst of writes from many
+callers therefore costs one commit instead of one each. Each write runs in its
+own savepoint, so a failing write only fails its own future. Futures resolve
+after the commit, so a result means the write is committed. It is only durable
+under db_operations' "safe" storage profile: with the default "fast" profile
+(WAL, synchronous=NORMAL) the last commits can be lost on power failure, though
+not on an application crash.
+"""
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+import db_operations as db
+
+MAX_BATCH = 500  # writes per commit
+MAX_LATENCY = 0.05  # seconds the first write in a batch waits for others to join
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """Background thread that batches db_operations writes into group commits."""
+
+    def __init__(self, max_batch: int = MAX_BATCH, max_latency: float = MAX_LATENCY):
+        if max_batch < 1 or max_latency < 0:
+            raise ValueError("max_batch must be at least 1 and max_latency not negative")
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.commits = 0  # transactions committed
+        self.writes = 0  # writes that ran (succeeded or failed) in those transactions
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs) for the next group commit; the Future gets its return value.
+
+        Raises RuntimeError once the writer is closed or its thread has died.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("GroupCommitWriter is closed")
+            self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def flush(self, timeout: Optional[float] = None):
+        """Commit everything submitted so far without waiting out max_latency, and wait for it."""
+        self.submit(None).result(timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Commit pending writes and stop the thread; later submits raise RuntimeError."""
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            # whether stopped or killed, refuse new work and fail anything still queued
+            with self._lock:
+                self._closed = True
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP and item[0].set_running_or_notify_cancel():
+                    item[0].set_exception(RuntimeError("GroupCommitWriter stopped before this write ran"))
+
+    def _loop(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_latency
+            # a flush marker (fn None) commits straight away
+            while len(batch) < self.max_batch and batch[-1][1] is not None:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        outcomes = []
+        try:
+            with db.transaction() as con:
+                con.execute("BEGIN")
+                for _future, fn, args, kwargs in batch:
+                    if fn is None:
+                        outcomes.append((None, None))
+                        continue
+                    con.execute("SAVEPOINT group_write")
+                    try:
+                        outcomes.append((fn(*args, **kwargs), None))
+                    except Exception as e:
+                        con.execute("ROLLBACK TO group_write")
+                        outcomes.append((None, e))
+                    con.execute("RELEASE group_write")
+        except BaseException as e:
+            for future, *_ in batch:
+                future.set_exception(e)  # the commit itself failed, so nothing in the batch was saved
+            if not isinstance(e, Exception):
+                raise  # KeyboardInterrupt, SystemExit...: stop the writer; _run fails what is left
+            return
+        self.commits += 1
+        self.writes += sum(fn is not None for _, fn, _, _ in batch)
+        for (future, *_), (result, error) in zip(batch, outcomes):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+_default: Optional[GroupCommitWriter] = None
+_default_lock = threading.Lock()
+
+# the shared writer used by the module-level functions below
+def get_writer() -> GroupCommitWriter:
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = GroupCommitWriter()
+    return _default
+
+# queue a write on the shared writer
+def submit(fn, *args, **kwargs) -> Future:
+    return get_writer().submit(fn, *args, **kwargs)
+
+# commit and wait for everything queued on the shared writer
+def flush(timeout: Optional[float] = None):
+    if _default is not None:
+        _default.flush(timeout)
+
+# whether the shared writer is started and its thread still alive
+def running() -> bool:
+    writer = _default
+    return writer is not None and writer._thread.is_alive()
+
+# flush and stop the shared writer (also runs at interpreter exit)
+def close(timeout: Optional[float] = None):
+    global _default
+    with _default_lock:
+        writer, _default = _default, None
+    if writer is not None:
+        writer.close(timeout)
+
+# registered after db_operations' close_pool hook, so it runs first and pending writes still have a pool
+atexit.register(close)
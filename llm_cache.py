@@ -0,0 +1,180 @@
+"""Persistent cache of model responses, kept in the journal database.
+
+    cache = llm_cache.get_cache()
+    scores = cache.cached(model_id, system_instruction, prompt, JournalScores, call_the_model, [journal_entry_no])
+
+The key is a SHA-256 of the model id, system instruction, prompt and the
+response schema, including its JSON schema. Changing any of them, even a field
+description on the pydantic model, is therefore a miss rather than a stale hit.
+Hits return a freshly parsed schema instance. Responses expire TTL seconds after
+they were stored. After each store the table is trimmed to MAX_ENTRIES,
+dropping the least recently used rows. A hit only records its use through the
+group-commit writer, so it never waits on a commit.
+
+Every stored response lists the journal entries it was made from in
+llm_cache_owners. Deleting any of them, or their user, deletes the response in
+the same transaction (see db_operations.LLM_CACHE_OWNERS_DDL). A request with no
+owning entry is still answered from the cache but never stored, so nothing in
+the table outlives the entries it describes.
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Callable, Iterable, NamedTuple, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+import db_operations as db
+import db_write_queue
+
+TTL = 30 * 24 * 60 * 60  # seconds a stored response stays valid
+MAX_ENTRIES = 10_000  # rows kept; least recently used go first
+
+Schema = TypeVar("Schema", bound=BaseModel)
+
+
+class ResponseCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    stores: int
+    evictions: int  # expired or least recently used rows removed
+    maxsize: int
+    currsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+# hex digest naming one request; the schema's name and JSON schema both count
+def cache_key(model: str, system_instruction: Optional[str], prompt: str, schema: Type[BaseModel]) -> str:
+    request = [model, system_instruction, prompt, schema.__name__, schema.model_json_schema()]
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+# record owners for cache_key among the given entry numbers that still exist, if the response does
+def _add_owners(con, cache_key: str, journal_entry_nos: str):
+    con.execute(
+        "INSERT OR IGNORE INTO llm_cache_owners(cache_key, journal_entry_no) SELECT ?, journal_entry_no FROM journal_entries "
+        "WHERE journal_entry_no IN (SELECT value FROM json_each(?)) AND EXISTS (SELECT 1 FROM llm_cache WHERE cache_key = ?)",
+        (cache_key, journal_entry_nos, cache_key),
+    )
+
+def _touch(cache_key: str, used_at: float, journal_entry_nos: str = "[]") -> bool:
+    with db.transaction() as con:
+        con.execute("UPDATE llm_cache SET used_at = max(used_at, ?), hits = hits + 1 WHERE cache_key = ?", (used_at, cache_key))
+        _add_owners(con, cache_key, journal_entry_nos)  # the same request made for another entry
+    return True
+
+
+class ResponseCache:
+    """Model responses in the llm_cache table, with in-process hit/miss counters."""
+
+    def __init__(self, ttl: float = TTL, max_entries: int = MAX_ENTRIES, clock: Callable[[], float] = time.time):
+        if ttl <= 0 or max_entries < 1:
+            raise ValueError("ttl must be positive and max_entries at least 1")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stores = self.evictions = 0
+
+    def get(self, key: str, schema: Type[Schema], journal_entry_nos: Iterable[int] = ()) -> Optional[Schema]:
+        """The stored response for key parsed as schema, or None if it is missing or expired.
+
+        On a hit, journal_entry_nos become owners of the response too.
+        """
+        now = self._clock()
+        with db.connection() as con:
+            row = con.execute("SELECT response FROM llm_cache WHERE cache_key = ? AND created_at > ?", (key, now - self.ttl)).fetchone()
+        value = None
+        if row is not None:
+            try:
+                value = schema.model_validate_json(row[0])
+            except ValidationError:
+                pass  # written by an incompatible version of the schema; the caller's store replaces it
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is not None:
+            db_write_queue.submit(_touch, key, now, json.dumps(sorted({int(n) for n in journal_entry_nos})))
+        return value
+
+    def put(self, key: str, schema: Type[BaseModel], value: BaseModel, journal_entry_nos: Iterable[int]) -> bool:
+        """Store value under key, owned by journal_entry_nos, then drop expired rows and trim to max_entries.
+
+        Returns False, storing nothing, if any of the entries no longer exists.
+        """
+        owners = sorted({int(n) for n in journal_entry_nos})
+        if not owners:
+            raise ValueError("a cached response needs at least one journal entry that owns it")
+        owners_json = json.dumps(owners)
+        now = self._clock()
+        with db.transaction() as con:
+            existing = con.execute(
+                "SELECT count(*) FROM journal_entries WHERE journal_entry_no IN (SELECT value FROM json_each(?))", (owners_json,)
+            ).fetchone()[0]
+            if existing < len(owners):
+                return False  # deleted while the model was answering
+            con.execute(
+                "INSERT INTO llm_cache(cache_key, schema, response, created_at, used_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(cache_key) DO UPDATE SET schema=excluded.schema, response=excluded.response, "
+                "created_at=excluded.created_at, used_at=excluded.used_at, hits=0",
+                (key, schema.__name__, value.model_dump_json(), now, now),
+            )
+            _add_owners(con, key, owners_json)
+            # a range scan of idx_llm_cache_created, so it only touches the rows that expired
+            evicted = con.execute("DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl,)).rowcount
+            # idx_llm_cache_used walks rows newest-used first; everything past max_entries goes
+            evicted += con.execute(
+                "DELETE FROM llm_cache WHERE cache_key IN (SELECT cache_key FROM llm_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        with self._lock:
+            self.stores += 1
+            self.evictions += evicted
+        return True
+
+    def cached(self, model: str, system_instruction: Optional[str], prompt: str,
+               schema: Type[Schema], call: Callable[[], Optional[Schema]],
+               journal_entry_nos: Iterable[int] = ()) -> Optional[Schema]:
+        """The cached response for this request, or call()'s.
+
+        call()'s answer is stored if it parsed and journal_entry_nos (the entries
+        the prompt is about) isn't empty.
+        """
+        owners = list(journal_entry_nos)
+        key = cache_key(model, system_instruction, prompt, schema)
+        value = self.get(key, schema, owners)
+        if value is None:
+            value = call()
+            if owners and isinstance(value, schema):
+                self.put(key, schema, value, owners)
+        return value
+
+    def clear(self):
+        """Remove every stored response (the counters are kept)."""
+        with db.transaction() as con:
+            con.execute("DELETE FROM llm_cache")
+
+    def info(self) -> ResponseCacheInfo:
+        with db.connection() as con:
+            currsize = con.execute("SELECT count(*) FROM llm_cache").fetchone()[0]
+        with self._lock:
+            return ResponseCacheInfo(self.hits, self.misses, self.stores, self.evictions, self.max_entries, currsize)
+
+
+_default: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+# the shared ResponseCache used by ExeterWellbeingAgent
+def get_cache() -> ResponseCache:
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = ResponseCache()
+    return _default
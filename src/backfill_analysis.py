@@ -0,0 +1,200 @@
+"""Backfill analysis for journal entries that were saved without any.
+
+    python src/backfill_analysis.py                          # every unscored entry
+    python src/backfill_analysis.py --user SUB --limit 200
+    python src/backfill_analysis.py --concurrency 4 --per-minute 30
+
+Unscored entries (no journal_scores row) are found with an anti-join and read in
+entry order, CHUNK_SIZE at a time. Each chunk is first triaged in a few batched
+model calls (ExeterWellbeingAgent.triage_batch); then up to `concurrency` agent workflows run at
+once, starting no more than `per_minute` entries a minute. Results go to the
+group-commit writer as they arrive, so a chunk is saved in a handful of
+transactions rather than one per entry. Once a chunk is committed, its last entry
+number is written to the checkpoint file, so an interrupted run resumes after it.
+Entries that still fail after RETRIES attempts are recorded in the checkpoint and
+skipped from then on; delete the checkpoint to retry them.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_operations as db
+import db_write_queue
+import local_scorer
+
+CHUNK_SIZE = 50  # entries read, analysed and checkpointed together
+CONCURRENCY = 4  # agent workflows in flight
+RETRIES = 2  # extra attempts for an entry whose workflow raised
+RETRY_BACKOFF = 2.0  # seconds before the first retry, doubling after that
+CHECKPOINT = "backfill_checkpoint.json"
+
+# entry text, journal_entry_no= (and scores=, when triage gave some) -> ExeterWellbeingAgent.run_workflow-style result
+Analyse = Callable[..., dict]
+Triage = Callable[[Dict[int, str]], Dict[int, object]]  # journal_entry_no -> text, to journal_entry_no -> scores
+
+
+# how far a backfill got, and how fast
+class BackfillReport(BaseModel):
+    analysed: int = 0
+    failed: List[int] = []  # entry numbers given up on
+    remaining: int = 0  # unscored entries after the checkpoint when the run stopped
+    seconds: float = 0.0
+
+    @property
+    def entries_per_minute(self) -> float:
+        return self.analysed * 60 / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.analysed} analysed in {self.seconds:.1f}s ({self.entries_per_minute:.1f} entries/min), "
+                f"{len(self.failed)} failed, {self.remaining} remaining")
+
+
+class RateLimiter:
+    """Spaces starts at least 60/per_minute seconds apart, across threads."""
+
+    def __init__(self, per_minute: float):
+        if per_minute <= 0:
+            raise ValueError("per_minute must be positive")
+        self.interval = 60.0 / per_minute
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+# checkpoint file: {"after": last journal_entry_no handled, "failed": [journal_entry_no, ...]}
+def load_checkpoint(path: Optional[str]) -> Dict[str, object]:
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"after": 0, "failed": []}
+
+def save_checkpoint(path: Optional[str], checkpoint: Dict[str, object]):
+    if not path:
+        return
+    # write then rename, so a crash mid-write leaves the previous checkpoint intact
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+def _analyse_with_retries(analyse: Analyse, entry_no: int, text: str, scores, limiter: Optional[RateLimiter], retries: int, backoff: float) -> dict:
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.wait()
+        try:
+            if scores is None:
+                return analyse(text, journal_entry_no=entry_no)
+            return analyse(text, scores=scores, journal_entry_no=entry_no)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+# Analyse unscored entries (oldest first) and save the results; returns once none
+# are left after the checkpoint, or after `limit` entries have been attempted.
+# With `triage`, each chunk is scored up front and analyse gets scores=... for
+# every entry triage scored.
+def backfill(analyse: Analyse, triage: Optional[Triage] = None, user_sub: Optional[str] = None, limit: Optional[int] = None,
+             concurrency: int = CONCURRENCY, per_minute: Optional[float] = None,
+             chunk_size: int = CHUNK_SIZE, checkpoint_path: Optional[str] = None,
+             retries: int = RETRIES, retry_backoff: float = RETRY_BACKOFF,
+             progress: Optional[Callable[[BackfillReport], None]] = None) -> BackfillReport:
+    if concurrency < 1 or chunk_size < 1:
+        raise ValueError("concurrency and chunk_size must be at least 1")
+    checkpoint = load_checkpoint(checkpoint_path)
+    limiter = RateLimiter(per_minute) if per_minute else None
+    report = BackfillReport(failed=list(checkpoint["failed"]))
+    attempted = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency, thread_name_prefix="backfill") as workers:
+        while limit is None or attempted < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - attempted)
+            entries = db.fetch_unanalysed_entries(checkpoint["after"], size, user_sub, fast=True)
+            if not entries:
+                break
+            scores = {}
+            if triage is not None:
+                try:
+                    scores = triage({entry.journal_entry_no: entry.entry_text for entry in entries})
+                except Exception:
+                    pass  # each workflow triages its own entry instead
+            calls = {workers.submit(_analyse_with_retries, analyse, entry.journal_entry_no, entry.entry_text, scores.get(entry.journal_entry_no),
+                                    limiter, retries, retry_backoff): entry
+                     for entry in entries}
+            saves = {}
+            for call in as_completed(calls):
+                entry_no = calls[call].journal_entry_no
+                try:
+                    result = call.result()
+                except Exception:
+                    report.failed.append(entry_no)
+                    continue
+                saves[db_write_queue.submit(db.save_analysis, entry_no, result["scores"], result["nuances"],
+                                            result["recommendation"], result["is_crisis"])] = entry_no
+            db_write_queue.flush()
+            for save, entry_no in saves.items():
+                if save.exception() is None:
+                    report.analysed += 1
+                else:
+                    report.failed.append(entry_no)  # e.g. the entry was deleted mid-run
+            attempted += len(entries)
+            checkpoint = {"after": entries[-1].journal_entry_no, "failed": sorted(report.failed)}
+            save_checkpoint(checkpoint_path, checkpoint)
+            report.remaining = db.count_unanalysed_entries(checkpoint["after"], user_sub)
+            report.seconds = time.perf_counter() - start
+            if progress is not None:
+                progress(report)
+    report.failed.sort()
+    report.remaining = db.count_unanalysed_entries(checkpoint["after"], user_sub)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", help="only this account's entries")
+    parser.add_argument("--limit", type=int, help="stop after this many entries")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="agent workflows in flight")
+    parser.add_argument("--per-minute", type=float, help="most entries started per minute (each is three model calls)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="entries per checkpoint")
+    parser.add_argument("--checkpoint", default=CHECKPOINT, help="resume file (default: %(default)s)")
+    parser.add_argument("--no-batch-triage", action="store_true", help="triage each entry in its own model call")
+    args = parser.parse_args()
+
+    from journal_analyis import ExeterWellbeingAgent  # google-genai is slow to import
+    # each workflow has up to two model calls in flight at once; stored scores
+    # should be the model's, so a failed triage is retried rather than scored locally
+    agent = ExeterWellbeingAgent(max_workers=2 * args.concurrency, local_fallback=False)
+
+    def analyse(text, scores=None, journal_entry_no=None):
+        # without batch triage, the local scorer's guess starts the support call early
+        guess = local_scorer.top_emotion(text) if scores is None else None
+        return agent.run_workflow(text, speculative_emotion=guess, verbose=False, scores=scores, journal_entry_no=journal_entry_no)
+
+    report = backfill(
+        analyse,
+        triage=None if args.no_batch_triage else agent.triage_batch,
+        user_sub=args.user, limit=args.limit, concurrency=args.concurrency, per_minute=args.per_minute,
+        chunk_size=args.chunk_size, checkpoint_path=args.checkpoint, progress=lambda r: print(f"  {r}"),
+    )
+    db_write_queue.close()
+    print(f"backfill: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Local crisis pre-screen: a multi-phrase matcher run before any model call.
+
+    from crisis_screen import screen
+    screen("some days I just want to end it all")  # ['end it all']
+
+CRISIS_PHRASES are compiled once, at import, into an Aho-Corasick automaton
+over words. Its failure links are folded into a full transition table, so
+scanning an entry is one dict lookup per word, whatever the number of phrases.
+Text and phrases are normalised the same way first: lower case, apostrophes
+dropped ("don't" and "dont" agree), and split on anything that isn't a letter
+or digit. Phrases therefore only match whole words ("skill myself" is not
+"kill myself").
+
+A match is enough to show crisis contacts, so the list sticks to phrases that
+are rarely anything else. The screen doesn't try to read negation ("I'm not
+suicidal" still matches): there a false positive costs the user a list of
+phone numbers, and a false negative could cost far more. Anything the list
+misses still goes through the model, whose is_emergency flag and scores can
+raise crisis contacts too.
+
+    python src/crisis_screen.py   # throughput over a synthetic corpus, and crisis-path latency
+"""
+import argparse
+import random
+import re
+import time
+from typing import Dict, Iterable, List, Tuple
+
+# Phrases that are about self-harm in everyday writing too ("kms", a bare "overdose",
+# "jump off", "can't go on", "suicide", "hurt myself", "cut myself", "goodbye forever")
+# are only listed with the context that makes them so.
+CRISIS_PHRASES = (
+    "suicidal", "thinking about suicide", "thought about suicide", "thoughts of suicide", "considering suicide",
+    "kill myself", "killing myself", "end my life", "ending my life", "end it all", "take my own life",
+    "taking my own life", "want to die", "wanna die", "wish i was dead", "wish i were dead", "better off dead", "better off without me", "no reason to live", "nothing to live for", "not worth living",
+    "don't want to be here anymore", "don't want to live", "can't go on living", "self harm", "self harming",
+    "harm myself", "want to hurt myself", "going to hurt myself", "might hurt myself", "urge to hurt myself",
+    "been hurting myself", "want to cut myself", "urge to cut myself", "been cutting myself",
+    "started cutting myself", "take an overdose", "took an overdose", "overdose on purpose", "jump off a bridge",
+    "jump off a building", "hang myself", "say goodbye to everyone",
+)
+
+_APOSTROPHES = str.maketrans("", "", "'\u2019")
+_NOT_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def words(text: str) -> List[str]:
+    return _NOT_WORD.sub(" ", text.lower().translate(_APOSTROPHES)).split()
+
+
+class CrisisScreen:
+    """Aho-Corasick automaton over the words of each phrase; find() returns the phrases present in a text."""
+
+    def __init__(self, phrases: Iterable[str] = CRISIS_PHRASES):
+        self.phrases: Tuple[str, ...] = tuple(dict.fromkeys(p.strip() for p in phrases if words(p)))
+        patterns = [words(phrase) for phrase in self.phrases]
+        # trie
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[Tuple[int, ...]] = [()]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for word in pattern:
+                if word not in goto[state]:
+                    goto.append({})
+                    outputs.append(())
+                    goto[state][word] = len(goto) - 1
+                state = goto[state][word]
+            outputs[state] += (index,)
+        # failure links, breadth first, folded into a complete transition table
+        vocabulary = {word for pattern in patterns for word in pattern}
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [{} for _ in goto]
+        delta[0] = {word: goto[0].get(word, 0) for word in vocabulary}
+        queue = list(goto[0].values())
+        for state in queue:
+            # fail[state] is shallower, so its row is already complete
+            delta[state] = dict(delta[fail[state]])
+            for word, child in goto[state].items():
+                fail[child] = delta[fail[state]][word]
+                outputs[child] += outputs[fail[child]]
+                delta[state][word] = child
+                queue.append(child)
+        # drop transitions back to the root: a missing key means state 0
+        self._delta = [{word: nxt for word, nxt in row.items() if nxt} for row in delta]
+        self._outputs = outputs
+        self.states = len(goto)
+
+    def find(self, text: str) -> List[str]:
+        """Phrases found in text, each once, in order of where they end."""
+        delta, outputs = self._delta, self._outputs
+        found: Dict[int, None] = {}
+        state = 0
+        for word in words(text):
+            state = delta[state].get(word, 0)
+            if outputs[state]:
+                found.update(dict.fromkeys(outputs[state]))
+        return [self.phrases[index] for index in found]
+
+    def matches(self, text: str) -> bool:
+        """Whether any phrase is in text; stops at the first one."""
+        delta, outputs = self._delta, self._outputs
+        state = 0
+        for word in words(text):
+            state = delta[state].get(word, 0)
+            if outputs[state]:
+                return True
+        return False
+
+
+_default = CrisisScreen()
+
+# crisis phrases in text (empty if none), using CRISIS_PHRASES
+def screen(text: str) -> List[str]:
+    return _default.find(text)
+
+
+def _corpus(size: int, crisis_share: float, seed: int = 0) -> List[str]:
+    import local_scorer  # only for its sample sentences
+    rng = random.Random(seed)
+    sentences = list(local_scorer.SAMPLE_ENTRIES)
+    entries = []
+    for _ in range(size):
+        entry = " ".join(rng.choice(sentences) for _ in range(rng.randint(1, 12)))
+        if rng.random() < crisis_share:
+            entry += f" Sometimes I feel like I {rng.choice(('want to die', 'might hurt myself', 'could end it all'))}."
+        entries.append(entry)
+    return entries
+
+def _throughput(corpus: List[str], phrases: List[str]):
+    automaton = CrisisScreen(phrases)
+    # the obvious alternatives, on the same word normalisation
+    padded = [f" {' '.join(words(p))} " for p in automaton.phrases]
+    alternation = re.compile("|".join(re.escape(p) for p in sorted(padded, key=len, reverse=True)))
+
+    def substring_loop(text):
+        text = f" {' '.join(words(text))} "
+        return any(p in text for p in padded)
+
+    def regex_alternation(text):
+        return alternation.search(f" {' '.join(words(text))} ") is not None
+
+    megabytes = sum(map(len, corpus)) / 1e6
+    print(f"{len(automaton.phrases)} phrases ({automaton.states} automaton states):")
+    flagged = None
+    for name, match in (("aho-corasick", automaton.matches), ("substring loop", substring_loop), ("regex alternation", regex_alternation)):
+        start = time.perf_counter()
+        hits = sum(map(match, corpus))
+        seconds = time.perf_counter() - start
+        flagged = hits if flagged is None else flagged
+        assert hits == flagged, f"{name} disagrees: {hits} vs {flagged}"
+        print(f"  {name:18} {len(corpus) / seconds:>10,.0f} entries/s  {megabytes / seconds:6.1f} MB/s  "
+              f"{seconds / len(corpus) * 1e6:7.1f} us/entry  ({hits} flagged)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=20_000, help="synthetic entries to screen")
+    parser.add_argument("--extra-phrases", type=int, default=2000, help="random phrases added for the scaling run")
+    args = parser.parse_args()
+
+    corpus = _corpus(args.entries, crisis_share=0.02)
+    print(f"{len(corpus)} entries, {sum(map(len, corpus)) / 1e6:.1f} MB")
+    _throughput(corpus, list(CRISIS_PHRASES))
+    # the automaton's cost doesn't grow with the phrase list; the alternatives' does
+    rng = random.Random(1)
+    extra = [" ".join("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 8)))
+                      for _ in range(rng.randint(1, 3))) for _ in range(args.extra_phrases)]
+    _throughput(corpus, list(CRISIS_PHRASES) + extra)
+
+    # the crisis path in run_workflow: screen, then local scores, no network
+    import local_scorer
+    print("crisis path:")
+    crisis = [text for text in corpus if _default.matches(text)] or ["I want to die"]
+    timings = []
+    for text in crisis:
+        start = time.perf_counter()
+        if screen(text):
+            local_scorer.score(text)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"  median {timings[len(timings) // 2] * 1e6:.0f} us, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us over {len(timings)} entries "
+          "(versus two sequential model calls before)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from typing import Iterable, Iterator
+
 from google import genai  # type: ignore[import-untyped]
 
 class Wrapper:
@@ -12,6 +14,22 @@ class Wrapper:
         response = self.chat.send_message(user_message)
         return response.text
 
+    def send_stream(self, user_message: str) -> Iterator[str]:
+        """Like send(), but yields the reply's text piece by piece as it arrives."""
+        for chunk in self.chat.send_message_stream(user_message):
+            if chunk.text:
+                yield chunk.text
+
+def complete_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """Re-cut streamed text into whole lines, each yielded as soon as its newline arrives."""
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split("\n")
+        yield from lines
+    if pending:
+        yield pending
+
 if __name__ == "__main__":
     bot = Wrapper()
     while True:
@@ -19,4 +37,6 @@ if __name__ == "__main__":
         if prompt.lower() == "exit":
             break
         else:
-            print(bot.send(prompt))
\ No newline at end of file
+            for text in bot.send_stream(prompt):
+                print(text, end="", flush=True)
+            print()
@@ -2,15 +2,14 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
 import datetime
-import random
 import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from db_operations import add_journal_entry, fetch_journal_entries, JournalEntry, new_user, user_exists, User
-from gpt_wrapper import Wrapper
-
-from auth import login as oidc_login
+import db_write_queue
+from db_operations import add_journal_entry, count_journal_entries, count_positive_days, journal_streaks, fetch_daily_activity, fetch_journal_entries_page, fetch_recent_entries, entry_cursor, search_entries, get_analysis_for_entries, EMOTIONS, JournalEntry, new_user, user_exists, User
+# gpt_wrapper (google-genai) and auth (requests) are slow to import, so they are
+# imported in the background threads that use them rather than before the window opens
 
 
 class BasePage(tk.Frame):
@@ -164,7 +163,7 @@ class JournalPage(BasePage):
         btn_frame.pack(fill="x")
 
         # Submit button
-        submit_btn = tk.Button(
+        self.submit_btn = tk.Button(
             btn_frame,
             text="Save Entry",
             font=("Segoe UI", 12, "bold"),
@@ -178,7 +177,7 @@ class JournalPage(BasePage):
             cursor="hand2",
             command=self._save_entry
         )
-        submit_btn.pack(side="right")
+        self.submit_btn.pack(side="right")
 
         # Character count (optional enhancement)
         char_label = tk.Label(
@@ -208,16 +207,24 @@ class JournalPage(BasePage):
             messagebox.showerror("Error", "User not logged in.")
             return
 
-        try:
-            entry = JournalEntry(user_sub=self.user_sub, entry_text=text)
-            add_journal_entry(entry)
-            messagebox.showinfo("Saved", "Your journal entry has been saved!")
-            # Clear the text area and reset placeholder
-            self.entry_text.delete("1.0", "end")
-            self.entry_text.insert("1.0", "How are you feeling today?")
-            self.entry_text.config(fg="#666")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save entry: {e}")
+        # the background writer commits it (grouped with any other pending writes)
+        # so the window never waits on the disk
+        self.submit_btn.config(state="disabled")
+        entry = JournalEntry(user_sub=self.user_sub, entry_text=text)
+        future = db_write_queue.submit(add_journal_entry, entry)
+        future.add_done_callback(lambda f: self.after(0, self._on_entry_saved, f))
+
+    def _on_entry_saved(self, future):
+        self.submit_btn.config(state="normal")
+        error = future.exception()
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to save entry: {error}")
+            return
+        messagebox.showinfo("Saved", "Your journal entry has been saved!")
+        # Clear the text area and reset placeholder
+        self.entry_text.delete("1.0", "end")
+        self.entry_text.insert("1.0", "How are you feeling today?")
+        self.entry_text.config(fg="#666")
 
 
 class InsightsPage(BasePage):
@@ -228,6 +235,7 @@ class InsightsPage(BasePage):
         self.user_sub = user_sub
         self.patterns_frame = None
         self.loading_label = None
+        self.insight_count = 0
         self._create_content()
         # Fetch insights in background
         self._fetch_insights()
@@ -246,18 +254,19 @@ class InsightsPage(BasePage):
         stats_frame.grid_columnconfigure(2, weight=1, uniform="stat")
 
         # Calculate real stats from database
-        total_entries = 0
+        streak, total_entries, positive_days = "--", "0", "--"
         if self.user_sub:
             try:
-                entries = fetch_journal_entries(self.user_sub)
-                total_entries = len(entries)
+                streak = str(journal_streaks(self.user_sub)[0])
+                total_entries = str(count_journal_entries(self.user_sub))
+                positive_days = str(count_positive_days(self.user_sub))
             except Exception:
                 pass
 
         stats = [
-            ("7", "Day Streak", "#4ecca3"),
-            (str(total_entries), "Total Entries", "#4361ee"),
-            ("--", "Positive Days", "#f9c74f"),
+            (streak, "Day Streak", "#4ecca3"),
+            (total_entries, "Total Entries", "#4361ee"),
+            (positive_days, "Positive Days", "#f9c74f"),
         ]
 
         for i, (value, label, color) in enumerate(stats):
@@ -322,7 +331,7 @@ class InsightsPage(BasePage):
                 self.after(0, self._show_error, "Please log in to see insights.")
                 return
 
-            entries = fetch_journal_entries(self.user_sub)
+            entries = fetch_recent_entries(self.user_sub, 10, fast=True)  # Limit to last 10 entries
             if not entries:
                 self.after(0, self._show_error, "No journal entries yet. Start journaling to get personalized insights!")
                 return
@@ -330,9 +339,11 @@ class InsightsPage(BasePage):
             # Prepare entries for LLM
             entries_text = "\n\n".join([
                 f"[{entry.created_at}]: {entry.entry_text}"
-                for entry in entries[:10]  # Limit to last 10 entries
+                for entry in entries
             ])
 
+            from gpt_wrapper import Wrapper, complete_lines
+
             # Create wrapper with insights-focused system prompt
             wrapper = Wrapper(
                 system_prompt="""You are an empathetic wellness assistant analyzing journal entries.
@@ -342,65 +353,71 @@ class InsightsPage(BasePage):
                 Do not include any other text or explanations."""
             )
 
-            # Get insights from LLM
-            response = wrapper.send(f"Analyze these journal entries and provide insights:\n\n{entries_text}")
-
-            # Parse response into individual insights
-            insights = []
-            for line in response.strip().split("\n"):
+            # Stream insights from LLM, showing each one as soon as its line is complete
+            chunks = wrapper.send_stream(f"Analyze these journal entries and provide insights:\n\n{entries_text}")
+            insights = 0
+            for line in complete_lines(chunks):
                 line = line.strip()
                 if line.startswith("-"):
                     line = line[1:].strip()
                 if line:
-                    insights.append(line)
+                    self.after(0, self._add_insight, line)
+                    insights += 1
+                    if insights == 4:  # Limit to 4 insights
+                        break
 
-            if insights:
-                self.after(0, self._display_insights, insights)
-            else:
+            if not insights:
                 self.after(0, self._show_error, "Could not generate insights. Please try again later.")
 
         except Exception as e:
             self.after(0, self._show_error, f"Could not load insights: {str(e)}")
 
-    def _display_insights(self, insights):
-        """Display the LLM-generated insights."""
+    def _add_insight(self, text):
+        """Display one LLM-generated insight below the ones already shown."""
         # Clear loading label
         if self.loading_label:
             self.loading_label.destroy()
+            self.loading_label = None
 
         icons = ["\u2605", "\u263C", "\u2665", "\u2728"]  # Star, Sun, Heart, Sparkles
+        i = self.insight_count
+        self.insight_count += 1
+        self._add_card(icons[i % len(icons)], "#4ecca3", text)
 
-        for i, text in enumerate(insights[:4]):  # Limit to 4 insights
-            pattern_frame = tk.Frame(self.patterns_frame, bg="#252542")
-            pattern_frame.pack(fill="x", pady=5)
+    def _add_card(self, icon, icon_color, text):
+        """Append a card with an icon and text to the insights list."""
+        pattern_frame = tk.Frame(self.patterns_frame, bg="#252542")
+        pattern_frame.pack(fill="x", pady=5)
 
-            inner = tk.Frame(pattern_frame, bg="#252542")
-            inner.pack(fill="x", padx=20, pady=15)
+        inner = tk.Frame(pattern_frame, bg="#252542")
+        inner.pack(fill="x", padx=20, pady=15)
 
-            icon_label = tk.Label(
-                inner,
-                text=icons[i % len(icons)],
-                font=("DejaVu Sans", 18),
-                bg="#252542",
-                fg="#4ecca3"
-            )
-            icon_label.pack(side="left", padx=(0, 15))
+        icon_label = tk.Label(
+            inner,
+            text=icon,
+            font=("DejaVu Sans", 18),
+            bg="#252542",
+            fg=icon_color
+        )
+        icon_label.pack(side="left", padx=(0, 15))
 
-            text_label = tk.Label(
-                inner,
-                text=text,
-                font=("Segoe UI", 12),
-                bg="#252542",
-                fg="#eee",
-                wraplength=600,
-                justify="left"
-            )
-            text_label.pack(side="left", fill="x", expand=True)
+        text_label = tk.Label(
+            inner,
+            text=text,
+            font=("Segoe UI", 12),
+            bg="#252542",
+            fg="#eee",
+            wraplength=600,
+            justify="left"
+        )
+        text_label.pack(side="left", fill="x", expand=True)
 
     def _show_error(self, message):
-        """Show an error or info message."""
+        """Show an error or info message, in place of the loading text or below the insights already shown."""
         if self.loading_label:
             self.loading_label.config(text=message)
+        else:
+            self._add_card("\u26A0", "#ff6b6b", message)  # Warning sign
 
 
 class HistoryPage(BasePage):
@@ -408,6 +425,7 @@ class HistoryPage(BasePage):
 
     CARD_BG = "#252542"
     CARD_HOVER = "#2f2f52"
+    PAGE_SIZE = 50
 
     def __init__(self, parent, navigate_callback, user_sub=None):
         super().__init__(parent, "History", navigate_callback)
@@ -430,6 +448,51 @@ class HistoryPage(BasePage):
         except (ValueError, TypeError):
             return False
 
+    def _entry_card_data(self, entry, analysis=None):
+        """Convert a JournalEntry (and its EntryAnalysis, if any) into the dict used to render a card."""
+        return {
+            "date": self._format_date(entry.created_at),
+            "preview": entry.entry_text[:200] + "..." if len(entry.entry_text) > 200 else entry.entry_text,
+            "is_sample": False,
+            "is_today": self._is_today(entry.created_at),
+            "created_at": entry.created_at,
+            "analysis": self._analysis_summary(analysis)
+        }
+
+    def _analysis_summary(self, analysis):
+        """One line for a card: strongest emotion and the first few nuances."""
+        if analysis is None:
+            return None
+        parts = []
+        if analysis.scores is not None:
+            values = {e: getattr(analysis.scores, e) or 0 for e in EMOTIONS}
+            top = max(values, key=values.get)
+            if values[top]:
+                parts.append(f"Mostly {top}")
+        parts.extend(n.nuance for n in analysis.nuances[:3])
+        return " · ".join(parts) or None
+
+    def _analyses(self, entries):
+        """Analysis for a page of entries in one batched (and cached) lookup."""
+        try:
+            return get_analysis_for_entries([e.journal_entry_no for e in entries])
+        except Exception:
+            return {}
+
+    def _fetch_page(self):
+        """Fetch the next page of entries (newest first) after the current cursor."""
+        if not self.user_sub:
+            return []
+        try:
+            page = fetch_journal_entries_page(self.user_sub, after=self.cursor, limit=self.PAGE_SIZE, fast=True)
+        except Exception:
+            return []  # If fetch fails, just show what we have
+        if page:
+            self.cursor = entry_cursor(page[-1])
+        self.has_more = len(page) == self.PAGE_SIZE
+        analyses = self._analyses(page)
+        return [self._entry_card_data(entry, analyses.get(entry.journal_entry_no)) for entry in page]
+
     def _create_content(self):
         # Sample journal entries (most recent first)
         sample_entries = [
@@ -442,44 +505,62 @@ class HistoryPage(BasePage):
             {"date": "January 25, 2026", "preview": "Challenging day but I learned a lot from the experience. Growth comes from discomfort.", "is_sample": True},
         ]
 
-        # Fetch real entries from database
-        db_entries = []
-        if self.user_sub:
-            try:
-                journal_entries = fetch_journal_entries(self.user_sub)
-                for entry in journal_entries:
-                    db_entries.append({
-                        "date": self._format_date(entry.created_at),
-                        "preview": entry.entry_text[:200] + "..." if len(entry.entry_text) > 200 else entry.entry_text,
-                        "is_sample": False,
-                        "is_today": self._is_today(entry.created_at),
-                        "created_at": entry.created_at
-                    })
-                # Sort by created_at descending (most recent first)
-                db_entries.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-            except Exception:
-                pass  # If fetch fails, just show sample entries
-
-        # Combine: real entries first, then sample entries
-        all_entries = db_entries + sample_entries
+        # Fetch the first page of real entries from database
+        self.cursor = None
+        self.has_more = False
+        db_entries = self._fetch_page()
+        self.loaded_count = len(db_entries)
+        self.sample_count = len(sample_entries)
 
         # Content container
         content = tk.Frame(self, bg="#1a1a2e")
         content.pack(fill="both", expand=True, padx=40, pady=(10, 30))
 
         # Subtitle
-        real_count = len(db_entries)
-        subtitle_text = f"{len(all_entries)} journal entries"
-        if real_count > 0:
-            subtitle_text += f" ({real_count} saved, {len(sample_entries)} samples)"
-        subtitle = tk.Label(
+        self.subtitle = tk.Label(
             content,
-            text=subtitle_text,
+            text="",
             font=("Segoe UI", 12),
             bg="#1a1a2e",
             fg="#888"
         )
-        subtitle.pack(anchor="w", pady=(0, 15))
+        self.subtitle.pack(anchor="w", pady=(0, 15))
+        self._update_subtitle()
+
+        # Search box (full-text search over saved entries)
+        search_frame = tk.Frame(content, bg="#252542")
+        search_frame.pack(fill="x", pady=(0, 15))
+
+        self.search_var = tk.StringVar()
+        search_entry = tk.Entry(
+            search_frame,
+            textvariable=self.search_var,
+            font=("Segoe UI", 12),
+            bg="#252542",
+            fg="#eee",
+            insertbackground="#4ecca3",
+            relief="flat",
+            highlightthickness=0
+        )
+        search_entry.pack(side="left", fill="x", expand=True, padx=15, pady=10)
+        search_entry.bind("<Return>", self._search)
+        search_entry.bind("<Escape>", self._clear_search)
+
+        search_btn = tk.Button(
+            search_frame,
+            text="Search",
+            font=("Segoe UI", 11, "bold"),
+            bg="#4ecca3",
+            fg="#1a1a2e",
+            activebackground="#3dbb92",
+            activeforeground="#1a1a2e",
+            relief="flat",
+            padx=20,
+            pady=6,
+            cursor="hand2",
+            command=self._search
+        )
+        search_btn.pack(side="right", padx=(0, 10))
 
         # Create scrollable container
         container = tk.Frame(content, bg="#1a1a2e")
@@ -516,89 +597,186 @@ class HistoryPage(BasePage):
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
 
-        # Add entries to scrollable frame
-        for i, entry in enumerate(all_entries):
-            entry_frame = tk.Frame(scrollable_frame, bg=self.CARD_BG, cursor="hand2")
-            entry_frame.pack(fill="x", pady=6)
+        # Real entries go in their own frame so later pages can be appended
+        self.entries_frame = tk.Frame(scrollable_frame, bg="#1a1a2e")
+        self.entries_frame.pack(fill="x")
+        for entry in db_entries:
+            self._add_entry_card(self.entries_frame, entry)
+
+        # Load more button, shown while older entries remain
+        self.load_more_btn = tk.Button(
+            scrollable_frame,
+            text="Load older entries",
+            font=("Segoe UI", 11, "bold"),
+            bg="#252542",
+            fg="#4ecca3",
+            activebackground="#2f2f52",
+            activeforeground="#4ecca3",
+            relief="flat",
+            padx=20,
+            pady=8,
+            cursor="hand2",
+            command=self._load_more
+        )
+        if self.has_more:
+            self.load_more_btn.pack(pady=6)
+
+        # Sample entries always come after the real ones
+        self.samples_frame = tk.Frame(scrollable_frame, bg="#1a1a2e")
+        self.samples_frame.pack(fill="x")
+        for entry in sample_entries:
+            self._add_entry_card(self.samples_frame, entry)
 
-            entry_inner = tk.Frame(entry_frame, bg=self.CARD_BG)
-            entry_inner.pack(fill="x", padx=25, pady=20)
+        # Update canvas width when container resizes
+        def _configure_canvas(event):
+            canvas.itemconfig(canvas.find_all()[0], width=event.width)
+
+        canvas.bind("<Configure>", _configure_canvas)
+
+    def _update_subtitle(self):
+        subtitle_text = f"{self.loaded_count + self.sample_count} journal entries"
+        if self.loaded_count > 0:
+            more = "+" if self.has_more else ""
+            subtitle_text += f" ({self.loaded_count}{more} saved, {self.sample_count} samples)"
+        self.subtitle.configure(text=subtitle_text)
+
+    def _load_more(self):
+        """Append the next page of older entries."""
+        page = self._fetch_page()
+        for entry in page:
+            self._add_entry_card(self.entries_frame, entry)
+        self.loaded_count += len(page)
+        if not self.has_more:
+            self.load_more_btn.pack_forget()
+        self._update_subtitle()
+
+    def _search(self, event=None):
+        """Replace the list with ranked search results for the query."""
+        query = self.search_var.get().strip()
+        if not query:
+            self._clear_search()
+            return
+        try:
+            results = search_entries(self.user_sub, query, limit=self.PAGE_SIZE) if self.user_sub else []
+        except Exception:
+            results = []
 
-            # Header row with date and day indicator
-            header = tk.Frame(entry_inner, bg=self.CARD_BG)
-            header.pack(fill="x")
+        for widget in self.entries_frame.winfo_children():
+            widget.destroy()
+        self.load_more_btn.pack_forget()
+        self.samples_frame.pack_forget()
+
+        analyses = self._analyses(results)
+        for result in results:
+            entry = self._entry_card_data(result, analyses.get(result.journal_entry_no))
+            entry["preview"] = result.snippet
+            self._add_entry_card(self.entries_frame, entry)
+        self.subtitle.configure(text=f"{len(results)} entries matching \"{query}\"")
+
+    def _clear_search(self, event=None):
+        """Go back to the paged list of all entries."""
+        self.search_var.set("")
+        for widget in self.entries_frame.winfo_children():
+            widget.destroy()
+        self.cursor = None
+        page = self._fetch_page()
+        for entry in page:
+            self._add_entry_card(self.entries_frame, entry)
+        self.loaded_count = len(page)
+        self.samples_frame.pack(fill="x")
+        if self.has_more:
+            self.load_more_btn.pack(pady=6, before=self.samples_frame)
+        self._update_subtitle()
+
+    def _add_entry_card(self, parent, entry):
+        """Render a single entry card into parent."""
+        entry_frame = tk.Frame(parent, bg=self.CARD_BG, cursor="hand2")
+        entry_frame.pack(fill="x", pady=6)
+
+        entry_inner = tk.Frame(entry_frame, bg=self.CARD_BG)
+        entry_inner.pack(fill="x", padx=25, pady=20)
+
+        # Header row with date and day indicator
+        header = tk.Frame(entry_inner, bg=self.CARD_BG)
+        header.pack(fill="x")
+
+        date_label = tk.Label(
+            header,
+            text=entry["date"],
+            font=("Segoe UI", 14, "bold"),
+            bg=self.CARD_BG,
+            fg="#4ecca3"
+        )
+        date_label.pack(side="left")
 
-            date_label = tk.Label(
+        # Show badges for entry type
+        if entry.get("is_today"):
+            today_badge = tk.Label(
                 header,
-                text=entry["date"],
-                font=("Segoe UI", 14, "bold"),
-                bg=self.CARD_BG,
-                fg="#4ecca3"
+                text="Today",
+                font=("Segoe UI", 9, "bold"),
+                bg="#4ecca3",
+                fg="#1a1a2e",
+                padx=8,
+                pady=2
             )
-            date_label.pack(side="left")
-
-            # Show badges for entry type
-            if entry.get("is_today"):
-                today_badge = tk.Label(
-                    header,
-                    text="Today",
-                    font=("Segoe UI", 9, "bold"),
-                    bg="#4ecca3",
-                    fg="#1a1a2e",
-                    padx=8,
-                    pady=2
-                )
-                today_badge.pack(side="right")
-            elif entry.get("is_sample"):
-                sample_badge = tk.Label(
-                    header,
-                    text="Sample",
-                    font=("Segoe UI", 9),
-                    bg="#666",
-                    fg="#eee",
-                    padx=8,
-                    pady=2
-                )
-                sample_badge.pack(side="right")
+            today_badge.pack(side="right")
+        elif entry.get("is_sample"):
+            sample_badge = tk.Label(
+                header,
+                text="Sample",
+                font=("Segoe UI", 9),
+                bg="#666",
+                fg="#eee",
+                padx=8,
+                pady=2
+            )
+            sample_badge.pack(side="right")
+
+        preview_label = tk.Label(
+            entry_inner,
+            text=entry["preview"],
+            font=("Segoe UI", 12),
+            bg=self.CARD_BG,
+            fg="#aaa",
+            wraplength=800,
+            justify="left",
+            anchor="w"
+        )
+        preview_label.pack(anchor="w", pady=(10, 0), fill="x")
+
+        # Hover effects
+        all_widgets = [entry_frame, entry_inner, header, date_label, preview_label]
 
-            preview_label = tk.Label(
+        if entry.get("analysis"):
+            analysis_label = tk.Label(
                 entry_inner,
-                text=entry["preview"],
-                font=("Segoe UI", 12),
+                text=entry["analysis"],
+                font=("Segoe UI", 10, "italic"),
                 bg=self.CARD_BG,
-                fg="#aaa",
-                wraplength=800,
-                justify="left",
+                fg="#4ecca3",
                 anchor="w"
             )
-            preview_label.pack(anchor="w", pady=(10, 0), fill="x")
-
-            # Hover effects
-            all_widgets = [entry_frame, entry_inner, header, date_label, preview_label]
-
-            def on_enter(e, widgets=all_widgets):
-                for w in widgets:
-                    try:
-                        w.configure(bg=self.CARD_HOVER)
-                    except:
-                        pass
-
-            def on_leave(e, widgets=all_widgets):
-                for w in widgets:
-                    try:
-                        w.configure(bg=self.CARD_BG)
-                    except:
-                        pass
-
-            for widget in all_widgets:
-                widget.bind("<Enter>", on_enter)
-                widget.bind("<Leave>", on_leave)
-
-        # Update canvas width when container resizes
-        def _configure_canvas(event):
-            canvas.itemconfig(canvas.find_all()[0], width=event.width)
-
-        canvas.bind("<Configure>", _configure_canvas)
+            analysis_label.pack(anchor="w", pady=(8, 0), fill="x")
+            all_widgets.append(analysis_label)
+
+        def on_enter(e, widgets=all_widgets):
+            for w in widgets:
+                try:
+                    w.configure(bg=self.CARD_HOVER)
+                except:
+                    pass
+
+        def on_leave(e, widgets=all_widgets):
+            for w in widgets:
+                try:
+                    w.configure(bg=self.CARD_BG)
+                except:
+                    pass
+
+        for widget in all_widgets:
+            widget.bind("<Enter>", on_enter)
+            widget.bind("<Leave>", on_leave)
 
 
 class HomePage(tk.Frame):
@@ -607,9 +785,10 @@ class HomePage(tk.Frame):
     CARD_BG = "#252542"
     CARD_HOVER = "#2f2f52"
 
-    def __init__(self, parent, user_name, navigate_callback=None):
+    def __init__(self, parent, user_name, navigate_callback=None, user_sub=None):
         super().__init__(parent, bg="#1a1a2e")
         self.user_name = user_name
+        self.user_sub = user_sub
         self.navigate_callback = navigate_callback
         self._create_widgets()
 
@@ -799,18 +978,19 @@ class HomePage(tk.Frame):
         )
         title.pack()
 
-        # Sample data: days with journal entries (1 = journaled, 0 = no entry)
-        # Last 52 weeks worth of data for a full year view
-        random.seed(42)  # Consistent pattern
-
-        # Generate sample activity data (more recent = more likely to have entries)
+        # Calculate which weeks to show (last 52 weeks plus the current one)
         today = datetime.date.today()
+        days_since_sunday = (today.weekday() + 1) % 7
+        start_date = today - datetime.timedelta(days=days_since_sunday + 52*7)
+
+        # Entries per day from the daily_activity rollup (one indexed read)
         activity_data = {}
-        for i in range(365):
-            date = today - datetime.timedelta(days=i)
-            # Higher chance of journaling in recent days
-            probability = 0.7 if i < 30 else (0.5 if i < 90 else 0.3)
-            activity_data[date] = random.random() < probability
+        if self.user_sub:
+            try:
+                for day in fetch_daily_activity(self.user_sub, start_date.isoformat(), today.isoformat()):
+                    activity_data[datetime.date.fromisoformat(day.day)] = day.entry_count
+            except Exception:
+                pass
 
         # Activity grid container (centered)
         grid_frame = tk.Frame(center_container, bg="#252542")
@@ -827,11 +1007,6 @@ class HomePage(tk.Frame):
         month_names = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
                        "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
 
-        # Calculate which months to show based on weeks
-        today = datetime.date.today()
-        days_since_sunday = (today.weekday() + 1) % 7
-        start_date = today - datetime.timedelta(days=days_since_sunday + 52*7)
-
         # Place month labels at correct positions
         last_month = -1
         month_positions = []
@@ -884,6 +1059,7 @@ class HomePage(tk.Frame):
         squares_frame.pack(side="left")
 
         cell_size = 11
+        activity_colors = ["#1a1a2e", "#2d6a4f", "#40916c", "#4ecca3"]
 
         for week in range(53):
             week_frame = tk.Frame(squares_frame, bg="#252542")
@@ -894,10 +1070,10 @@ class HomePage(tk.Frame):
 
                 if current_date > today:
                     color = "#252542"
-                elif current_date in activity_data and activity_data[current_date]:
-                    color = "#4ecca3"
                 else:
-                    color = "#1a1a2e"
+                    # Shade by number of entries that day, matching the legend
+                    count = activity_data.get(current_date, 0)
+                    color = activity_colors[min(count, len(activity_colors) - 1)]
 
                 cell = tk.Frame(
                     week_frame,
@@ -913,7 +1089,7 @@ class HomePage(tk.Frame):
         legend_frame.pack(pady=(12, 0))
 
         # Stats on left
-        total_entries = sum(1 for v in activity_data.values() if v)
+        total_entries = sum(activity_data.values())
         stats_label = tk.Label(
             legend_frame,
             text=f"{total_entries} entries in the last year",
@@ -933,7 +1109,7 @@ class HomePage(tk.Frame):
         less_label.pack(side="left")
 
         # Legend squares
-        for color in ["#1a1a2e", "#2d6a4f", "#40916c", "#4ecca3"]:
+        for color in activity_colors:
             sq = tk.Frame(legend_frame, bg=color, width=10, height=10)
             sq.pack(side="left", padx=2)
             sq.pack_propagate(False)
@@ -1078,6 +1254,7 @@ class WelcomePage(tk.Tk):
 
     def _perform_login(self):
         try:
+            from auth import login as oidc_login
             sub, name, access_token, refresh_token, id_token, expires_in = oidc_login()
             self.user_info = {
                 "sub": sub,
@@ -1118,7 +1295,7 @@ class WelcomePage(tk.Tk):
         # Show the requested page
         user_sub = self.user_info.get("sub") if self.user_info else None
         if page == "home":
-            new_page = HomePage(self, self.user_name, self._navigate_to)
+            new_page = HomePage(self, self.user_name, self._navigate_to, user_sub=user_sub)
         elif page == "journal":
             new_page = JournalPage(self, self._navigate_to, user_sub=user_sub)
         elif page == "insights":
@@ -1,7 +1,15 @@
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from google import genai
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import crisis_screen
+import llm_cache
+import local_scorer
 
 # --- 1. Blueprints (The "Schemas") ---
 
@@ -19,16 +27,72 @@ class AgenticAdvice(BaseModel):
     personalized_suggestion: str = Field(description="Dynamic, friendly advice like 'Try a 10 min walk'")
     is_emergency: bool = Field(description="Must be True if user mentions self-harm or deep crisis")
 
+class EntryScores(JournalScores):
+    journal_entry_no: int = Field(description="The journal_entry_no of the entry these scores are for")
+
+class BatchScores(BaseModel):
+    results: List[EntryScores] = Field(description="One result per journal entry")
+
 class SubAnalysis(BaseModel):
     nuances: List[str] = Field(description="Specific nuances like 'lonely', 'guilt', or 'grief'")
     resource_key: str = Field(description="Keywords for resource matching (e.g., 'academic', 'lonely', 'crisis')")
 
 # --- 2. The Agent Wrapper ---
 
+# Suggestions per top emotion for when the support call fails and local_fallback is on
+LOCAL_SUGGESTIONS = {
+    "happy": "Make a note of what went well today, so you can come back to it.",
+    "angry": "Step away for ten minutes: a short walk or some slow breaths before you respond.",
+    "fearful": "Try writing down what's worrying you and one small next step for each worry.",
+    "surprised": "Give yourself a moment to take it in before deciding what it means.",
+    "bad": "Take a proper break: drink some water, get some fresh air, and aim for an early night.",
+    "disgusted": "Put some distance between you and whatever caused it, and talk it over with someone you trust.",
+    "sad": "Reach out to a friend or family member today, even for a short chat.",
+}
+
+# Batched triage packs entries into one request up to this many prompt tokens
+# (estimated at 4 characters a token) or TRIAGE_BATCH_ENTRIES entries, which
+# keeps the reply well inside the model's output limit.
+TRIAGE_BATCH_TOKENS = 8000
+TRIAGE_BATCH_ENTRIES = 25
+
+# the entries a model call is about, for the response cache; none for unsaved text
+def _owners(journal_entry_no: Optional[int]) -> Tuple[int, ...]:
+    return () if journal_entry_no is None else (journal_entry_no,)
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def split_triage_batches(entries: Mapping[int, str], max_tokens: int = TRIAGE_BATCH_TOKENS,
+                         max_entries: int = TRIAGE_BATCH_ENTRIES) -> List[Dict[int, str]]:
+    """Greedily group entries, in order, into batches under both limits (an oversized entry goes alone)."""
+    batches: List[Dict[int, str]] = []
+    batch: Dict[int, str] = {}
+    tokens = 0
+    for entry_no, text in entries.items():
+        cost = _estimate_tokens(text)
+        if batch and (tokens + cost > max_tokens or len(batch) >= max_entries):
+            batches.append(batch)
+            batch, tokens = {}, 0
+        batch[entry_no] = text
+        tokens += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
 class ExeterWellbeingAgent:
-    def __init__(self):
+    def __init__(self, max_workers: int = 4, cache: Union[bool, llm_cache.ResponseCache, None] = True,
+                 local_fallback: bool = True):
         self.client = genai.Client()
         self.model_id = "gemini-3-flash-preview"
+        # identical requests (re-opened entries, retries) are answered from the database;
+        # True uses the shared cache, None or False always asks the model
+        self.cache = llm_cache.get_cache() if cache is True else (cache or None)
+        # a failed triage or support call (offline, quota) gets local scores or a stock
+        # suggestion instead of failing the workflow
+        self.local_fallback = local_fallback
+        # model calls are network-bound, so independent ones share a small thread pool
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
         
         self.CRISIS_CONTACTS = (
             "It sounds like you're going through a very difficult time. Please reach out for professional support:\n"
@@ -36,89 +100,232 @@ class ExeterWellbeingAgent:
             "- Samaritans: Call 116 123 (Free, 24/7 support).\n"
         )
 
-    def triage(self, entry: str):
-        response = self.client.models.generate_content(
-            model=self.model_id,
-            contents=f"Analyze this journal entry: {entry}",
-            config={
-                "response_mime_type": "application/json",
-                "response_schema": JournalScores,
-            }
+    def _generate(self, contents: str, schema, system_instruction: Optional[str] = None, journal_entry_nos: Iterable[int] = ()):
+        config = {"response_mime_type": "application/json", "response_schema": schema}
+        if system_instruction is not None:
+            config["system_instruction"] = system_instruction
+
+        def call():
+            return self.client.models.generate_content(model=self.model_id, contents=contents, config=config).parsed
+        if self.cache is None:
+            return call()
+        # only responses about a saved entry are stored, so deleting it can delete them
+        return self.cache.cached(self.model_id, system_instruction, contents, schema, call, journal_entry_nos)
+
+    def triage(self, entry: str, journal_entry_no: Optional[int] = None):
+        return self._triage_with_source(entry, journal_entry_no=journal_entry_no)[0]
+
+    def _triage_with_source(self, entry: str, verbose: bool = True, journal_entry_no: Optional[int] = None):
+        """triage(), plus where the scores came from: "model" or "local"."""
+        try:
+            scores = self._generate(f"Analyze this journal entry: {entry}", JournalScores, journal_entry_nos=_owners(journal_entry_no))
+            if scores is None:
+                raise ValueError("triage reply did not parse")
+            return scores, "model"
+        except Exception as e:
+            if not self.local_fallback:
+                raise
+            if verbose:
+                print(f"[Agent] Triage failed, using local scores instead: {e}")
+            return self.local_triage(entry), "local"
+
+    def local_triage(self, entry: str) -> JournalScores:
+        """Scores from the offline lexicon scorer: instant, no network, much coarser than the model."""
+        return JournalScores(**local_scorer.score(entry).scores)
+
+    def local_support(self, top_emotion: str) -> AgenticAdvice:
+        """A stock suggestion for top_emotion from LOCAL_SUGGESTIONS, with no nuances."""
+        suggestion = LOCAL_SUGGESTIONS.get(top_emotion, "Be kind to yourself today: a short walk, some music, or a glass of water.")
+        return AgenticAdvice(nuances=[], personalized_suggestion=suggestion, is_emergency=False)
+
+    def _triage_one_batch(self, batch: Dict[int, str]) -> Dict[int, JournalScores]:
+        entries = "\n\n".join(f"<entry journal_entry_no={entry_no}>\n{text}\n</entry>" for entry_no, text in batch.items())
+        response = self._generate(
+            f"Analyze each of these journal entries separately:\n\n{entries}", BatchScores,
+            "Score every entry on its own. Return exactly one result per entry, with that entry's journal_entry_no.",
+            list(batch),
         )
-        return response.parsed
+        scores = {}
+        for result in (response.results if response is not None else []):
+            if result.journal_entry_no in batch and result.journal_entry_no not in scores:
+                scores[result.journal_entry_no] = JournalScores(**result.model_dump(exclude={"journal_entry_no"}))
+        return scores
+
+    def triage_batch(self, entries: Mapping[int, str]) -> Dict[int, JournalScores]:
+        """Triage many entries (journal_entry_no -> text) in a few model calls.
 
-    def generate_dynamic_support(self, entry: str, top_emotion: str):
+        Entries are split by split_triage_batches and the batches run side by side.
+        Any entry a batch didn't score, or whose batch failed outright, is triaged on
+        its own (so falls back to local scores if allowed); entries that still fail
+        are left out of the result. Call this from
+        your own thread, not from the agent's executor.
+        """
+        batches = split_triage_batches(entries, TRIAGE_BATCH_TOKENS, TRIAGE_BATCH_ENTRIES)
+        batch_calls = [self.executor.submit(self._triage_one_batch, batch) for batch in batches]
+        scores: Dict[int, JournalScores] = {}
+        for call in batch_calls:
+            try:
+                scores.update(call.result())
+            except Exception as e:
+                print(f"[Agent] Batched triage failed, scoring its entries one by one: {e}")
+        missing = [entry_no for entry_no in entries if entry_no not in scores]
+        single_calls = {entry_no: self.executor.submit(self.triage, entries[entry_no], entry_no) for entry_no in missing}
+        for entry_no, call in single_calls.items():
+            try:
+                scores[entry_no] = call.result()
+            except Exception as e:
+                print(f"[Agent] Triage failed for entry {entry_no}: {e}")
+        return {entry_no: scores[entry_no] for entry_no in entries if scores.get(entry_no) is not None}
+
+    def generate_dynamic_support(self, entry: str, top_emotion: str, journal_entry_no: Optional[int] = None):
         """AI generates personalized advice based on the specific context of the entry."""
         prompt = f"The user is feeling {top_emotion}. Based on their entry: '{entry}', suggest one small, practical self-care activity."
         
-        response = self.client.models.generate_content(
-            model=self.model_id,
-            contents=prompt,
-            config={
-                "system_instruction": "Suggest general activities (walks, music, hydration). If the user mentions self-harm, set is_emergency to True.",
-                "response_mime_type": "application/json",
-                "response_schema": AgenticAdvice,
-            }
+        return self._generate(
+            prompt, AgenticAdvice,
+            "Suggest general activities (walks, music, hydration). If the user mentions self-harm, set is_emergency to True.",
+            _owners(journal_entry_no),
         )
-        return response.parsed
     
-    def specialize(self, entry: str, top_emotion: str):
+    def specialize(self, entry: str, top_emotion: str, journal_entry_no: Optional[int] = None):
         prompt = f"The user feels {top_emotion}. Analyze for sub-emotions in this text: {entry}"
         
-        response = self.client.models.generate_content(
-            model=self.model_id,
-            contents=prompt,
-            config={
-                "system_instruction": "Identify sub-emotions. Return a 'resource_key' from: academic, lonely, crisis, anxiety, low_mood, general.",
-                "response_mime_type": "application/json",
-                "response_schema": SubAnalysis,
-            }
+        return self._generate(
+            prompt, SubAnalysis,
+            "Identify sub-emotions. Return a 'resource_key' from: academic, lonely, crisis, anxiety, low_mood, general.",
+            _owners(journal_entry_no),
         )
-        return response.parsed
 
-    def run_workflow(self, entry: str):
-        print(f"\n[Agent] Processing Entry...")
-        
-        # 1. Get Scores
-        scores = self.triage(entry)
-        emotions_dict = scores.model_dump()
-        top_emotion = max(emotions_dict, key=emotions_dict.get)
-        
-        # 2. Pre-emptive Safety Check (Numerical)
-        is_crisis_score = scores.sad > 85 or scores.fearful > 90
-        
-        # 3. Get AI Advice/Nuance
-        advice_data = self.generate_dynamic_support(entry, top_emotion)
-        
-        # Determine final recommendation
-        # We trigger crisis if scores are high OR if the AI flagged an emergency
-        if is_crisis_score or advice_data.is_emergency:
+    def _timed(self, timings: Dict[str, float], stage: str, call, *args):
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            timings[stage] = time.perf_counter() - start
+
+    def run_workflow(self, entry: str, speculative_emotion: Optional[str] = None, verbose: bool = True,
+                     scores: Optional[JournalScores] = None, journal_entry_no: Optional[int] = None):
+        """Triage, then specialize and support side by side (both only need top_emotion).
+
+        With speculative_emotion (say, the user's usual top emotion) the support call
+        starts alongside triage and its answer is kept if triage agrees, so a right
+        guess saves a whole round trip. A wrong guess costs one extra call.
+        verbose=False keeps batch runs quiet. Pass scores (say, from triage_batch)
+        to skip triage altogether. An entry with a crisis_screen phrase in it gets
+        CRISIS_CONTACTS straight away, scored locally without any model call; with
+        local_fallback off it is triaged by the model instead, so stored scores
+        are never the lexicon's. result["scores_source"] says which: "model",
+        "local" or "given". Give journal_entry_no for a saved entry so its model
+        responses are cached (and deleted with it); unsaved text is never cached.
+        """
+        if verbose:
+            print(f"\n[Agent] Processing Entry...")
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        # 0. Local crisis screen: a listed phrase goes straight to crisis contacts, before any model call
+        crisis_terms = self._timed(timings, "screen", crisis_screen.screen, entry)
+        scores_source = "given"
+        if crisis_terms:
+            if scores is None and self.local_fallback:
+                scores, scores_source = self.local_triage(entry), "local"
+            elif scores is None:
+                scores, scores_source = self._timed(timings, "triage", self._triage_with_source, entry, verbose, journal_entry_no)
+            emotions_dict = scores.model_dump()
+            top_emotion = max(emotions_dict, key=emotions_dict.get)
+            nuances, resource_key, speculation = [], "crisis", None
             final_recommendation = self.CRISIS_CONTACTS
             is_crisis = True
         else:
-            final_recommendation = advice_data.personalized_suggestion
-            is_crisis = False
-
-        # --- ALWAYS PRINT REGARDLESS OF OUTCOME ---
-        print("-" * 30)
-        print(f"ANALYSIS COMPLETE")
-        print(f"Top Emotion: {top_emotion.upper()}")
-        print(f"Scores: {emotions_dict}")
-        print(f"Nuances: {advice_data.nuances}")
-        print(f"Recommendation: {final_recommendation}")
-        print("-" * 30)
-        
+            # 1. Get Scores (and maybe guess the support call)
+            speculative_call = None
+            if scores is None:
+                triage_call = self.executor.submit(self._timed, timings, "triage", self._triage_with_source, entry, verbose, journal_entry_no)
+                if speculative_emotion is not None:
+                    speculative_call = self.executor.submit(
+                        self._timed, timings, "speculative_support", self.generate_dynamic_support, entry, speculative_emotion,
+                        journal_entry_no)
+                scores, scores_source = triage_call.result()
+            emotions_dict = scores.model_dump()
+            top_emotion = max(emotions_dict, key=emotions_dict.get)
+
+            # 2. Pre-emptive Safety Check (Numerical)
+            is_crisis_score = scores.sad > 85 or scores.fearful > 90
+
+            # 3. Get AI Advice/Nuance, concurrently
+            specialize_call = self.executor.submit(
+                self._timed, timings, "specialize", self.specialize, entry, top_emotion, journal_entry_no)
+            if speculative_call is not None and speculative_emotion == top_emotion:
+                support_call, speculation = speculative_call, "hit"
+            else:
+                if speculative_call is not None:
+                    speculative_call.cancel()  # a no-op if it already started; its answer is just ignored
+                support_call = self.executor.submit(
+                    self._timed, timings, "support", self.generate_dynamic_support, entry, top_emotion, journal_entry_no)
+                speculation = None if speculative_call is None else "miss"
+            try:
+                advice_data = support_call.result()
+                if advice_data is None:
+                    raise ValueError("support reply did not parse")
+            except Exception as e:
+                if not self.local_fallback:
+                    raise
+                if verbose:
+                    print(f"[Agent] Support call failed, using a stock suggestion instead: {e}")
+                advice_data = self.local_support(top_emotion)
+            try:
+                sub_analysis = specialize_call.result()
+            except Exception as e:
+                if verbose:
+                    print(f"[Agent] Sub-emotion analysis failed, continuing without it: {e}")
+                sub_analysis = None
+
+            nuances = list(advice_data.nuances)
+            if sub_analysis is not None:
+                nuances += [n for n in sub_analysis.nuances if n not in nuances]
+            resource_key = sub_analysis.resource_key if sub_analysis is not None else None
+
+            # Determine final recommendation
+            # We trigger crisis if scores are high OR if the AI flagged an emergency
+            if is_crisis_score or advice_data.is_emergency or resource_key == "crisis":
+                final_recommendation = self.CRISIS_CONTACTS
+                is_crisis = True
+            else:
+                final_recommendation = advice_data.personalized_suggestion
+                is_crisis = False
+        timings["total"] = time.perf_counter() - start
+
+        # --- ALWAYS PRINT REGARDLESS OF OUTCOME (unless asked not to) ---
+        if verbose:
+            print("-" * 30)
+            print(f"ANALYSIS COMPLETE")
+            print(f"Top Emotion: {top_emotion.upper()}")
+            print(f"Scores: {emotions_dict}")
+            print(f"Nuances: {nuances}")
+            if crisis_terms:
+                print(f"Crisis screen matched: {crisis_terms}")
+            print(f"Recommendation: {final_recommendation}")
+            print(f"Timings: {', '.join(f'{stage} {seconds * 1000:.0f}ms' for stage, seconds in timings.items())}"
+                  + (f" (speculation {speculation})" if speculation else ""))
+            print("-" * 30)
+
         return {
             "scores": scores,
-            "nuances": advice_data.nuances,
+            "scores_source": scores_source,
+            "nuances": nuances,
             "recommendation": final_recommendation,
-            "is_crisis": is_crisis
+            "is_crisis": is_crisis,
+            "resource_key": resource_key,
+            "timings": timings,
+            "speculation": speculation,
+            "crisis_terms": crisis_terms,
         }
 
 # --- 3. Execution ---
-agent = ExeterWellbeingAgent()
+if __name__ == "__main__":
+    agent = ExeterWellbeingAgent()
 
-# Example Test Case
-user_journal = "this work is upsetting me"
-result = agent.run_workflow(user_journal)
-print(result)
\ No newline at end of file
+    # Example Test Case
+    user_journal = "this work is upsetting me"
+    result = agent.run_workflow(user_journal)
+    print(result)
@@ -0,0 +1,228 @@
+"""Offline emotion scores for a journal entry, with no model call.
+
+    from local_scorer import score, top_emotion
+    score("I'm so stressed about exams and really tired")  # LocalScores(scores={...}, matches=3)
+
+A small hand-written lexicon, with negation and intensifiers, gives each
+emotion in JournalScores a 0-100 score in a few microseconds. It is much
+coarser than the model. It suits places where a rough answer beats none:
+- as a pre-filter, e.g. the speculative_emotion guess for run_workflow;
+- as ExeterWellbeingAgent's triage fallback when Gemini is unreachable;
+- as deterministic scores in tests.
+
+    python src/local_scorer.py            # entries/sec, and agreement with the model's stored scores
+"""
+import argparse
+import math
+import os
+import re
+import sys
+import time
+from typing import Dict, Iterable, NamedTuple, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_operations as db
+
+EMOTIONS = db.EMOTIONS
+
+# Word stems per emotion with a weight. A word matches the longest stem it
+# starts with, and stems shorter than MIN_STEM or listed in WHOLE_WORDS only
+# match whole words, so "stress" covers "stressed"/"stressful" but "sad"
+# doesn't match "saddle", nor "numb" "number".
+LEXICON: Dict[str, Dict[str, float]] = {
+    "happy": {
+        "happ": 1.0, "joy": 1.0, "glad": 0.8, "great": 0.7, "good": 0.5, "excit": 0.8, "proud": 0.9, "grateful": 0.9,
+        "thankful": 0.9, "love": 0.8, "lovely": 0.8, "fun": 0.6, "enjoy": 0.8, "relax": 0.6, "calm": 0.5, "peace": 0.7,
+        "hope": 0.6, "cheer": 0.8, "delight": 1.0, "content": 0.6, "optimis": 0.8, "confident": 0.7, "smil": 0.7,
+        "laugh": 0.8, "amazing": 0.9, "wonderful": 1.0, "awesome": 0.9, "celebrat": 0.9, "better": 0.4, "win": 0.6,
+    },
+    "angry": {
+        "angry": 1.0, "anger": 1.0, "mad": 0.8, "furious": 1.2, "rage": 1.2, "annoy": 0.8, "irritat": 0.8,
+        "frustrat": 0.9, "hate": 1.0, "resent": 0.9, "bitter": 0.7, "unfair": 0.7, "livid": 1.2, "pissed": 1.0,
+        "fed up": 0.8, "argu": 0.6, "yell": 0.8, "shout": 0.7, "betray": 1.0, "jealous": 0.7,
+    },
+    "fearful": {
+        "afraid": 1.0, "scare": 1.0, "fear": 1.0, "anxi": 1.0, "worr": 0.9, "nervous": 0.9, "panic": 1.2, "terrif": 1.2,
+        "dread": 1.0, "overwhelm": 0.8, "insecur": 0.7, "uneasy": 0.7, "tense": 0.6, "frighten": 1.0, "threat": 0.7,
+        "unsafe": 0.9, "exam": 0.4, "exams": 0.4, "deadline": 0.4,
+    },
+    "surprised": {
+        "surpris": 1.0, "shock": 1.0, "amaz": 0.6, "astonish": 1.0, "unexpect": 0.9, "sudden": 0.6, "startl": 0.9,
+        "stunn": 0.9, "wow": 0.8, "confus": 0.6, "disbelief": 0.9, "out of nowhere": 0.8,
+    },
+    "bad": {
+        "tired": 1.0, "exhaust": 1.0, "stress": 1.0, "busy": 0.7, "bored": 0.9, "boring": 0.8, "burn": 0.8,
+        "drain": 0.9, "sleep": 0.4, "pressur": 0.8, "rush": 0.6, "unwell": 0.8, "sick": 0.7, "awful": 0.8,
+        "terrible": 0.8, "bad": 0.7, "meh": 0.6, "unmotivat": 0.9, "procrastinat": 0.7, "workload": 0.8, "struggl": 0.8,
+        "upset": 0.6,
+    },
+    "disgusted": {
+        "disgust": 1.2, "gross": 1.0, "revolt": 1.0, "sicken": 1.0, "nause": 0.8, "repuls": 1.0, "vile": 1.0,
+        "ashamed": 0.8, "shame": 0.8, "embarrass": 0.7, "awkward": 0.5, "cringe": 0.7, "hypocri": 0.7,
+    },
+    "sad": {
+        "sad": 1.0, "unhapp": 1.0, "depress": 1.2, "down": 0.6, "lonel": 1.0, "alone": 0.8, "cry": 1.0, "cried": 1.0,
+        "tears": 1.0, "miss": 0.6, "missing": 0.6, "missed": 0.6, "grief": 1.2, "griev": 1.2, "loss": 0.8, "lost": 0.6,
+        "hurt": 0.8, "heartbr": 1.2, "hopeless": 1.2, "empty": 0.9, "numb": 0.8, "numbness": 0.8, "worthless": 1.2,
+        "disappoint": 0.8, "regret": 0.7, "gloomy": 0.9, "miserable": 1.1, "upset": 0.6, "low": 0.5,
+    },
+}
+MIN_STEM = 4
+WHOLE_WORDS = {"down", "exam", "miss", "numb"}  # would otherwise match "download", "example", "mission", "number"
+NEGATORS = {"not", "no", "never", "nothing", "hardly", "barely", "without"}
+INTENSIFIERS = {"so": 1.5, "very": 1.5, "really": 1.5, "extremely": 2.0, "incredibly": 2.0, "super": 1.5, "too": 1.3,
+                "quite": 1.2, "bit": 0.6, "slightly": 0.5, "little": 0.6}
+NEGATION_WINDOW = 3  # words after a negator that it applies to
+SATURATION = 2.0  # weighted hits at which a score reaches ~63
+
+_WORD = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+
+def _build_index():
+    stems: Dict[str, Tuple[Tuple[str, float], ...]] = {}
+    whole: Dict[str, Tuple[Tuple[str, float], ...]] = {}
+    phrases = []
+    for emotion, entries in LEXICON.items():
+        for stem, weight in entries.items():
+            if " " in stem:
+                phrases.append((stem, emotion, weight))
+            else:
+                index = whole if stem in WHOLE_WORDS or len(stem) < MIN_STEM else stems
+                index[stem] = index.get(stem, ()) + ((emotion, weight),)
+    return stems, whole, phrases
+
+_STEMS, _WHOLE_WORDS, _PHRASES = _build_index()
+_LONGEST_STEM = max(map(len, _STEMS))
+
+
+def _lookup(word: str):
+    hits = _WHOLE_WORDS.get(word)
+    if hits is not None:
+        return hits
+    for n in range(min(len(word), _LONGEST_STEM), MIN_STEM - 1, -1):
+        hits = _STEMS.get(word[:n])
+        if hits is not None:
+            return hits
+    return None
+
+
+class LocalScores(NamedTuple):
+    scores: Dict[str, int]  # 0-100 per emotion, same keys as JournalScores
+    matches: int  # lexicon hits that counted; 0 means the scorer had nothing to go on
+
+    @property
+    def top_emotion(self) -> str:
+        return max(EMOTIONS, key=self.scores.get)  # ties go to the first in EMOTIONS
+
+
+# 0-100 per emotion for text
+def score(text: str) -> LocalScores:
+    lowered = text.lower()
+    raw = dict.fromkeys(EMOTIONS, 0.0)
+    matches = 0
+    negated_for = 0
+    boost = 1.0
+    for word in _WORD.findall(lowered):
+        if word in NEGATORS or word.endswith("n't"):
+            negated_for = NEGATION_WINDOW
+            continue
+        if word in INTENSIFIERS:
+            boost = INTENSIFIERS[word]
+            continue
+        hits = _lookup(word)
+        if hits is not None:
+            counted = False
+            for emotion, weight in hits:
+                if not negated_for:
+                    raw[emotion] += weight * boost
+                    counted = True
+                elif emotion == "happy":
+                    raw["sad"] += weight * 0.5  # "not happy" leans sad; other negations just cancel
+                    counted = True
+            matches += counted
+        boost = 1.0
+        negated_for = max(negated_for - 1, 0)
+    for phrase, emotion, weight in _PHRASES:
+        count = lowered.count(phrase)
+        if count:
+            matches += count
+            raw[emotion] += weight * count
+    return LocalScores({emotion: round(100 * (1 - math.exp(-raw[emotion] / SATURATION))) for emotion in EMOTIONS}, matches)
+
+# the strongest emotion in text, or None if no lexicon word matched
+def top_emotion(text: str):
+    local = score(text)
+    return local.top_emotion if local.matches else None
+
+
+class AgreementStats(NamedTuple):
+    entries: int
+    top_emotion_agreement: float  # share of entries where both pick the same strongest emotion
+    mean_absolute_error: float  # in score points, over every emotion
+    per_emotion_error: Dict[str, float]
+
+    def __str__(self):
+        per_emotion = ", ".join(f"{emotion} {error:.1f}" for emotion, error in self.per_emotion_error.items())
+        return (f"{self.entries} entries: top emotion agrees {self.top_emotion_agreement:.0%}, "
+                f"mean absolute error {self.mean_absolute_error:.1f} ({per_emotion})")
+
+# how closely local scores follow recorded ones; pairs are (entry text, object with an attribute per emotion)
+def agreement(pairs: Iterable[Tuple[str, object]]) -> AgreementStats:
+    entries = agreed = 0
+    errors = dict.fromkeys(EMOTIONS, 0.0)
+    for text, recorded in pairs:
+        local = score(text)
+        expected = {emotion: getattr(recorded, emotion) or 0 for emotion in EMOTIONS}
+        entries += 1
+        agreed += local.top_emotion == max(EMOTIONS, key=expected.get)
+        for emotion in EMOTIONS:
+            errors[emotion] += abs(local.scores[emotion] - expected[emotion])
+    if not entries:
+        return AgreementStats(0, 0.0, 0.0, dict.fromkeys(EMOTIONS, 0.0))
+    per_emotion = {emotion: total / entries for emotion, total in errors.items()}
+    return AgreementStats(entries, agreed / entries, sum(per_emotion.values()) / len(EMOTIONS), per_emotion)
+
+
+# (entry text, model scores) for analysed entries, from journal_entries_with_analysis
+def recorded_scores(user_sub=None, limit: int = 10_000):
+    with db.connection() as con:
+        cur = con.execute(
+            f"SELECT entry_text, {', '.join(EMOTIONS)} FROM journal_entries_with_analysis "
+            "WHERE top_emotion IS NOT NULL AND (? IS NULL OR user_sub = ?) ORDER BY journal_entry_no DESC LIMIT ?",
+            (user_sub, user_sub, limit),
+        )
+        return [(row[0], db.JournalScoresRow(None, *row[1:])) for row in cur.fetchall()]
+
+SAMPLE_ENTRIES = (
+    "Had a lovely walk with friends and laughed a lot, feeling grateful.",
+    "I'm so stressed about the deadline and really tired, can't sleep.",
+    "Honestly furious that my flatmate ate my food again, so unfair.",
+    "Missing home today. Lonely and a bit down, cried after the call.",
+    "Exam results came out of nowhere, totally shocked, didn't expect that!",
+    "Not happy with how the presentation went, kind of embarrassed.",
+)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", help="compare only this account's analysed entries")
+    parser.add_argument("--limit", type=int, default=10_000, help="most analysed entries to compare")
+    args = parser.parse_args()
+
+    pairs = recorded_scores(args.user, args.limit)
+    texts = [text for text, _ in pairs] or list(SAMPLE_ENTRIES)
+    scored, start = 0, time.perf_counter()
+    while time.perf_counter() - start < 1.0:
+        for text in texts:
+            score(text)
+        scored += len(texts)
+    seconds = time.perf_counter() - start
+    print(f"local scorer: {scored / seconds:,.0f} entries/s ({seconds / scored * 1e6:.1f} us/entry, "
+          f"{sum(map(len, texts)) / len(texts):.0f} characters on average)")
+    if pairs:
+        print(f"agreement with stored model scores: {agreement(pairs)}")
+    else:
+        print("no analysed entries in the database to compare against")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+import db_operations
+import db_write_queue
+from db_operations import *
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+import backfill_analysis
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    previous = db_operations.DBFOLDER
+    configure(":memory:")
+    yield
+    db_write_queue.close()
+    configure(previous)
+
+def _populate(count):
+    new_user(User(sub="backfill_user"))
+    for n in range(count):
+        add_journal_entry(JournalEntry(user_sub="backfill_user", entry_text=f"entry {n}"))
+    return sorted(e.journal_entry_no for e in fetch_journal_entries("backfill_user"))
+
+class FakeAgent:
+    """Stands in for ExeterWellbeingAgent.run_workflow, counting calls in flight."""
+
+    def __init__(self, delay=0.0, fail=()):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+        self.in_flight = self.most_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, text, journal_entry_no=None):
+        with self.lock:
+            self.calls.append(text)
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            if text in self.fail:
+                raise RuntimeError("model unavailable")
+            n = int(text.split()[-1])
+            return {"scores": SimpleNamespace(**{emotion: n for emotion in EMOTIONS}), "nuances": ["backlog"],
+                    "recommendation": f"rest {n}", "is_crisis": False}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+def test_fetch_unanalysed_entries():
+    ids = _populate(6)
+    save_analysis(ids[1], JournalScores(happy=1), [], "walk")
+    save_analysis(ids[4], JournalScores(happy=1), [], "walk")
+    assert [e.journal_entry_no for e in fetch_unanalysed_entries()] == [ids[0], ids[2], ids[3], ids[5]]
+    assert [e.journal_entry_no for e in fetch_unanalysed_entries(after=ids[2], limit=1, fast=True)] == [ids[3]]
+    assert fetch_unanalysed_entries(user_sub="nobody") == []
+    assert count_unanalysed_entries() == 4 and count_unanalysed_entries(after=ids[3]) == 1
+    assert [e.journal_entry_no for e in fetch_unanalysed_entries(after=ids[2], user_sub="backfill_user")] == [ids[3], ids[5]]
+    assert count_unanalysed_entries(after=ids[2], user_sub="backfill_user") == 2
+
+    # a single user's backfill reads only that user's entries
+    statements = []
+    with connection() as con:
+        con.set_trace_callback(statements.append)
+        try:
+            fetch_unanalysed_entries(after=ids[2], user_sub="backfill_user")
+            count_unanalysed_entries(after=ids[2], user_sub="backfill_user")
+        finally:
+            con.set_trace_callback(None)
+        for sql in statements:
+            plan = " ".join(row[3] for row in con.execute("EXPLAIN QUERY PLAN " + sql))
+            assert "idx_journal_entries_user_created (user_sub=?)" in plan, (sql, plan)
+
+def test_backfill_with_concurrency_and_retries():
+    ids = _populate(23)
+    agent = FakeAgent(delay=0.02, fail=("entry 5",))
+    progress = []
+    report = backfill_analysis.backfill(agent, concurrency=4, chunk_size=10, retry_backoff=0, progress=progress.append)
+    assert report.analysed == 22 and report.failed == [ids[5]] and report.remaining == 0
+    assert report.entries_per_minute > 0
+    assert len(progress) == 3
+    assert agent.calls.count("entry 5") == 1 + backfill_analysis.RETRIES
+    assert 1 < agent.most_in_flight <= 4
+    analysis = get_entry_analysis(ids[7])
+    assert analysis.scores.happy == 7 and analysis.recommendation.recommendation == "rest 7"
+    assert count_unanalysed_entries() == 1  # the failed one, left for a retry
+
+def test_backfill_with_batched_triage():
+    ids = _populate(7)
+    triaged, scored_calls = [], []
+
+    def triage(entries):
+        triaged.append(list(entries))
+        # leaves one entry out, as a partly parsed batch would
+        return {n: SimpleNamespace(**{emotion: 50 for emotion in EMOTIONS}) for n in entries if n != ids[3]}
+
+    def analyse(text, scores=None, journal_entry_no=None):
+        assert text == f"entry {ids.index(journal_entry_no)}"
+        scored_calls.append((text, scores is not None))
+        result = FakeAgent()(text)
+        if scores is not None:
+            result["scores"] = scores
+        return result
+
+    report = backfill_analysis.backfill(analyse, triage=triage, chunk_size=4)
+    assert report.analysed == 7
+    assert triaged == [ids[:4], ids[4:]]
+    assert sorted(scored_calls) == sorted((f"entry {n}", n != 3) for n in range(7))
+    assert get_journal_scores(ids[0]).happy == 50 and get_journal_scores(ids[3]).happy == 3
+
+def test_backfill_resumes_from_checkpoint(tmp_path):
+    ids = _populate(12)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    first = backfill_analysis.backfill(FakeAgent(fail=("entry 2",)), limit=5, chunk_size=5, checkpoint_path=checkpoint, retries=0)
+    assert first.analysed == 4 and first.remaining == 7
+    assert json.load(open(checkpoint)) == {"after": ids[4], "failed": [ids[2]]}
+
+    # a new run neither repeats finished work nor retries the failure
+    agent = FakeAgent()
+    second = backfill_analysis.backfill(agent, chunk_size=5, checkpoint_path=checkpoint)
+    assert sorted(agent.calls) == sorted(f"entry {n}" for n in range(5, 12))
+    assert second.analysed == 7 and second.failed == [ids[2]] and second.remaining == 0
+    assert [e.journal_entry_no for e in fetch_unanalysed_entries()] == [ids[2]]
+
+def test_rate_limiter_spaces_starts():
+    limiter = backfill_analysis.RateLimiter(per_minute=600)  # one every 0.1s
+    start = time.monotonic()
+    threads = [threading.Thread(target=limiter.wait) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.monotonic() - start >= 0.29
@@ -0,0 +1,45 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from crisis_screen import CRISIS_PHRASES, CrisisScreen, screen, words
+
+@pytest.mark.parametrize("text, found", [
+    ("Some days I just want to end it all.", ["end it all"]),
+    ("I’m better off dead, honestly", ["better off dead"]),
+    ("i dont want to be here anymore", ["don't want to be here anymore"]),
+    ("Thinking about SELF-HARM again and I want to die", ["self harm", "want to die"]),
+    ("I have a skill myself", []),
+    ("It was a killer workout, exams are killing me", []),
+    ("Lovely walk, feeling grateful", []),
+    ("I took an overdose last night", ["took an overdose"]),
+    ("thinking I might jump off a bridge", ["jump off a bridge"]),
+    # everyday uses of phrases that only count in context
+    ("ran 5 kms today", []),
+    ("Made myself jump off the diving board!", []),
+    ("I can't go on like this with my timetable", []),
+    ("caffeine overdose before the exam", []),
+    ("I hurt myself at football practice today", []),
+    ("cut myself chopping onions for dinner", []),
+    ("Watched Suicide Squad with friends", []),
+    ("we read about suicide rates in sociology", []),
+    ("Said goodbye forever to my old laptop", []),
+    ("hurting myself laughing at that show", []),
+    ("I keep thinking about suicide", ["thinking about suicide"]),
+    ("sometimes I want to hurt myself", ["want to hurt myself"]),
+])
+def test_screen(text, found):
+    assert screen(text) == found
+
+def test_every_phrase_matches_itself():
+    for phrase in CRISIS_PHRASES:
+        assert screen(f"lately {phrase} today") == [phrase]
+
+def test_overlapping_phrases():
+    automaton = CrisisScreen(["he", "she", "his", "hers", "she is", "is his dog"])
+    assert automaton.find("ushers said she is his dog") == ["she", "she is", "his", "is his dog"]
+    assert automaton.find("hers") == ["hers"] and automaton.find("ushers") == []
+    assert automaton.matches("and she") and not automaton.matches("shell")
+    assert CrisisScreen(["a b c", "b"]).find("a b x") == ["b"]  # falls back to the shorter phrase
+    assert words("Don't  STOP-now") == ["dont", "stop", "now"]
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import pytest
+import db_operations
+import db_async
+from db_async import AsyncDatabase
+from db_operations import configure, initialize_db, JournalEntry, JournalScores, User
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_database():
+    previous = db_operations.DBFOLDER
+    configure(":memory:")
+    initialize_db()
+    yield
+    db_async.close()
+    configure(previous)
+
+def test_module_functions_mirror_crud():
+    async def scenario():
+        assert await db_async.new_user(User(sub="async_user")) is True
+        assert await db_async.user_exists("async_user") is True
+        assert await db_async.add_journal_entry(JournalEntry(user_sub="async_user", entry_text="Async entry")) is True
+        entries = await db_async.fetch_journal_entries("async_user")
+        entry_no = entries[0].journal_entry_no
+        assert await db_async.save_analysis(entry_no, JournalScores(happy=70), ["calm"], "keep going") is True
+        scores, nuances = await asyncio.gather(
+            db_async.get_journal_scores(entry_no, fast=True),
+            db_async.get_journal_nuances(entry_no),
+        )
+        assert scores.happy == 70
+        assert [n.nuance for n in nuances] == ["calm"]
+        assert await db_async.count_journal_entries("async_user") == 1
+    asyncio.run(scenario())
+    # names and docs come from db_operations
+    assert db_async.fetch_journal_entries.__name__ == "fetch_journal_entries"
+    assert set(db_async.READ_OPERATIONS + db_async.WRITE_OPERATIONS) <= set(dir(db_operations))
+
+def test_many_concurrent_coroutines():
+    db_operations.new_user(User(sub="crowd_user"))
+
+    async def scenario():
+        async with AsyncDatabase() as database:
+            async def one(n):
+                await database.add_journal_entry(JournalEntry(user_sub="crowd_user", entry_text=f"entry {n}"))
+                return await database.count_journal_entries("crowd_user")
+            counts = await asyncio.gather(*(one(n) for n in range(200)))
+            assert max(counts) == 200
+            assert len(await database.fetch_journal_entries("crowd_user")) == 200
+    asyncio.run(scenario())
+
+def test_single_writer_and_bounded_queue():
+    release = threading.Event()
+    writer_threads = set()
+
+    def blocking_write(n):
+        writer_threads.add(threading.current_thread().name)
+        release.wait(5)
+        return n
+
+    async def scenario():
+        database = AsyncDatabase(read_workers=2, write_queue_size=2)
+        tasks = [asyncio.create_task(database.write(blocking_write, n)) for n in range(6)]
+        await asyncio.sleep(0.1)
+        # one write running, one queued, the rest waiting for a slot on the loop
+        assert database._writer._work_queue.qsize() == 1
+        assert not any(t.done() for t in tasks)
+        # reads are not stuck behind the blocked writer
+        assert await database.user_exists("nobody") is False
+        release.set()
+        assert await asyncio.gather(*tasks) == list(range(6))
+        await database.aclose()
+        with pytest.raises(RuntimeError):
+            await database.user_exists("nobody")
+    asyncio.run(scenario())
+    assert len(writer_threads) == 1
+
+def test_read_workers_follow_pool_size():
+    previous = db_operations.POOL_SIZE
+    try:
+        db_operations.configure_pool(3)
+        database = AsyncDatabase()
+        assert database._readers._max_workers == 2
+        database.close()
+        db_operations.configure_pool(1)
+        database = AsyncDatabase()
+        assert database._readers._max_workers == 1
+        database.close()
+    finally:
+        db_operations.configure_pool(previous)
+
+def test_purge_does_not_hold_up_writes():
+    db_operations.new_user(User(sub="retention_user"))
+    with db_operations.transaction() as con:
+        con.executemany("INSERT INTO journal_entries(user_sub, created_at, entry_text) VALUES ('retention_user', ?, 'old')",
+                        [(f"2001-01-{1 + n % 28:02d} 09:00:00",) for n in range(10)])
+
+    async def scenario():
+        async with AsyncDatabase() as database:
+            purge = asyncio.create_task(database.purge_journal_entries(30, chunk_size=2, pause=0.1))
+            await asyncio.sleep(0.05)
+            # the purge is sleeping between chunks, not occupying the writer
+            assert await database.add_journal_entry(JournalEntry(user_sub="retention_user", entry_text="new")) is True
+            assert not purge.done()
+            assert await purge == 10
+    asyncio.run(scenario())
+    assert [e.entry_text for e in db_operations.fetch_journal_entries("retention_user")] == ["new"]
+    assert "purge_journal_entries" not in db_async.WRITE_OPERATIONS
@@ -1,20 +1,26 @@
 import pytest
 import os
+import subprocess
+import sys
+import threading
+import db_operations
 from db_operations import *
 
-TEST_DBFOLDER = "user_data.db"
-DBFOLDER = TEST_DBFOLDER  # override database path for testing
-
 @pytest.fixture(scope="module", autouse=True)
 def setup_database():
-    # Initialize a clean test database
-    if os.path.exists(TEST_DBFOLDER):
-        os.remove(TEST_DBFOLDER)
+    # Run against a private in-memory database so the real user_data.db is never touched
+    previous = db_operations.DBFOLDER
+    configure(":memory:")
     initialize_db()
     yield
-    # Teardown: delete test DB
-    if os.path.exists(TEST_DBFOLDER):
-        os.remove(TEST_DBFOLDER)
+    configure(previous)
+
+@pytest.fixture
+def database_file(tmp_path):
+    # for tests that need an on-disk database (WAL, upgrading an existing file)
+    previous = db_operations.DBFOLDER
+    yield tmp_path / "test.db"
+    configure(previous)
 
 def test_user_crud():
     user = User(sub="test_user")
@@ -107,3 +113,611 @@ def test_entry_values_crud():
 
 
 
+
+def test_pool_reuses_connections():
+    with connection() as first:
+        pass
+    with connection() as second:
+        assert second is first
+
+    # nested blocks on one thread share the borrowed connection
+    with transaction() as outer:
+        with connection() as inner:
+            assert inner is outer
+
+def test_nested_transaction_rolls_back_together():
+    with pytest.raises(RuntimeError):
+        with transaction():
+            new_user(User(sub="rollback_user"))
+            add_journal_entry(JournalEntry(user_sub="rollback_user", entry_text="never saved"))
+            raise RuntimeError("abort")
+    assert user_exists("rollback_user") is False
+
+def test_pool_threads():
+    new_user(User(sub="thread_user"))
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(20):
+                add_journal_entry(JournalEntry(user_sub="thread_user", entry_text=f"{n}-{i}"))
+                fetch_journal_entries("thread_user")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert len(fetch_journal_entries("thread_user")) == 160
+    assert len(get_pool()._all) <= POOL_SIZE
+
+def test_pool_size_and_shutdown():
+    pool = ConnectionPool(size=1, timeout=0.05)
+    with pool.connection():
+        held = threading.Event()
+        failures = []
+
+        def borrow():
+            try:
+                with pool.connection():
+                    pass
+            except TimeoutError as e:
+                failures.append(e)
+            held.set()
+
+        threading.Thread(target=borrow).start()
+        held.wait(1)
+        assert len(failures) == 1
+    pool.close()
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            pass
+
+def test_close_leaves_borrowed_connections_to_their_borrower():
+    pool = ConnectionPool(size=2)
+    with pool.connection():
+        pass  # one idle connection
+    borrowed, closed, finished = threading.Event(), threading.Event(), []
+
+    def in_flight():
+        with pool.transaction() as con:
+            con.execute("CREATE TEMP TABLE t(x)")
+            borrowed.set()
+            closed.wait(5)
+            con.execute("INSERT INTO t VALUES (1)")  # still usable after pool.close()
+            finished.append(con.execute("SELECT count(*) FROM t").fetchone()[0])
+        finished.append(con)
+
+    worker = threading.Thread(target=in_flight)
+    worker.start()
+    borrowed.wait(5)
+    pool.close()
+    closed.set()
+    worker.join(5)
+    assert finished[0] == 1
+    with pytest.raises(sqlite3.ProgrammingError):
+        finished[1].execute("SELECT 1")  # closed on release
+
+def test_storage_profiles(database_file):
+    configure(database_file)
+    try:
+        initialize_db(profile="safe")
+        with connection() as con:
+            assert con.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+            assert con.execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+
+        initialize_db(profile="fast")
+        with connection() as con:
+            assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert con.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+            assert con.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+
+        with pytest.raises(ValueError):
+            configure_storage("reckless")
+    finally:
+        configure_storage("fast")
+
+def test_hot_queries_use_indexes():
+    new_user(User(sub="plan_user"))
+    add_journal_entry(JournalEntry(user_sub="plan_user", entry_text="Plan entry"))
+    entry_no = fetch_journal_entries("plan_user")[0].journal_entry_no
+
+    # record the SQL every helper runs, then check each plan for a table scan
+    statements = []
+    with connection() as con:
+        con.set_trace_callback(statements.append)
+        try:
+            get_user("plan_user")
+            user_exists("plan_user")
+            fetch_journal_entries("plan_user")
+            fetch_entries_with_analysis("plan_user")
+            fetch_entries_with_analysis("plan_user", after=("9999-12-31", 0))
+            get_journal_entry(entry_no)
+            add_entry_values(EntryValues(journal_entry_no=entry_no, mood=5))
+            fetch_entry_values(entry_no)
+            journal_entry_has_values(entry_no)
+            get_entry_values(1)
+            update_entry_values(EntryValues(journal_entry_no=entry_no, mood=6))
+            add_journal_scores(JournalScores(journal_entry_no=entry_no, happy=50))
+            get_journal_scores(entry_no)
+            update_journal_scores(JournalScores(journal_entry_no=entry_no, happy=60))
+            add_journal_nuance(JournalNuances(journal_entry_no=entry_no, nuance="calm"))
+            nuance_id = get_journal_nuances(entry_no)[0].nuance_id
+            get_journal_nuance_by_id(nuance_id)
+            update_journal_nuance_by_id(JournalNuances(nuance_id=nuance_id, nuance="content"))
+            add_journal_recommendation(JournalRecommendations(journal_entry_no=entry_no, recommendation="walk", is_crisis=False))
+            get_journal_recommendation(entry_no)
+            update_journal_recommendation(JournalRecommendations(journal_entry_no=entry_no, recommendation="run", is_crisis=False))
+            update_journal_entry(JournalEntry(journal_entry_no=entry_no, entry_text="Edited"))
+            delete_journal_nuance_by_id(nuance_id)
+            delete_journal_nuances_for_entry(entry_no)
+            delete_journal_scores(entry_no)
+            delete_journal_recommendation(entry_no)
+            delete_entry_values(entry_no)
+            delete_journal_entry(entry_no)
+            delete_user("plan_user")
+        finally:
+            con.set_trace_callback(None)
+
+        lookups = [sql for sql in statements if " WHERE " in sql.upper() and not sql.startswith("--")]  # "--" marks trigger bodies
+        assert len(lookups) >= 25
+        for sql in lookups:
+            plan = [row[3] for row in con.execute("EXPLAIN QUERY PLAN " + sql)]
+            assert plan, sql
+            assert not any(step.startswith("SCAN") for step in plan), (sql, plan)
+
+def test_keyset_pagination():
+    new_user(User(sub="page_user"))
+    with transaction() as con:
+        # two entries share each timestamp so the id tie-breaker is exercised
+        for i in range(25):
+            con.execute(
+                "INSERT INTO journal_entries(user_sub, created_at, entry_text) VALUES (?, ?, ?)",
+                ("page_user", f"2026-01-{1 + i // 2:02d} 09:00:00", f"entry {i}"),
+            )
+
+    pages = []
+    after = None
+    while True:
+        page = fetch_journal_entries_page("page_user", after=after, limit=10)
+        if not page:
+            break
+        pages.append(page)
+        after = entry_cursor(page[-1])
+
+    assert [len(p) for p in pages] == [10, 10, 5]
+    seen = [e.entry_text for p in pages for e in p]
+    assert seen == [f"entry {i}" for i in reversed(range(25))]
+
+    recent = fetch_recent_entries("page_user", 3)
+    assert [e.entry_text for e in recent] == ["entry 24", "entry 23", "entry 22"]
+
+    # explain the statements the function actually runs, first page and a later one
+    statements = []
+    with connection() as con:
+        con.set_trace_callback(statements.append)
+        try:
+            fetch_journal_entries_page("page_user", limit=10)
+            fetch_journal_entries_page("page_user", after=("2026-01-05 09:00:00", 9), limit=10)
+        finally:
+            con.set_trace_callback(None)
+
+        queries = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+        assert len(queries) == 2
+        for sql in queries:
+            plan = " ".join(row[3] for row in con.execute("EXPLAIN QUERY PLAN " + sql))
+            assert "idx_journal_entries_user_created" in plan, (sql, plan)
+            assert "TEMP B-TREE" not in plan, (sql, plan)
+
+def test_save_analysis_and_bulk_writes():
+    new_user(User(sub="analysis_user"))
+    for i in range(3):
+        add_journal_entry(JournalEntry(user_sub="analysis_user", entry_text=f"Entry {i}"))
+    first, second, third = sorted(e.journal_entry_no for e in fetch_journal_entries("analysis_user"))
+
+    scores = JournalScores(happy=10, angry=20, fearful=30, surprised=40, bad=50, disgusted=60, sad=70)
+    assert save_analysis(first, scores, ["tired", "hopeful"], "Take a walk") is True
+    assert get_journal_scores(first).sad == 70
+    assert [n.nuance for n in get_journal_nuances(first)] == ["tired", "hopeful"]
+    assert get_journal_recommendation(first).recommendation == "Take a walk"
+
+    # saving again replaces the previous analysis
+    save_analysis(first, scores, ["calm"], "Call a friend", is_crisis=True)
+    assert [n.nuance for n in get_journal_nuances(first)] == ["calm"]
+    assert get_journal_recommendation(first).is_crisis is True
+
+    # a failure part-way leaves nothing behind
+    with pytest.raises(sqlite3.IntegrityError):
+        save_analysis(999999, scores, ["lost"], "nothing")
+    assert get_journal_scores(999999) is None
+
+    assert add_journal_scores_bulk([JournalScores(journal_entry_no=n, happy=n) for n in (second, third)]) == 2
+    assert add_journal_nuances_bulk([JournalNuances(journal_entry_no=second, nuance=x) for x in ("a", "b", "c")]) == 3
+    assert add_journal_recommendations_bulk([JournalRecommendations(journal_entry_no=third, recommendation="rest", is_crisis=False)]) == 1
+    assert get_journal_scores(third).happy == third
+    assert len(get_journal_nuances(second)) == 3
+    assert get_journal_recommendation(third).recommendation == "rest"
+
+def test_aggregates():
+    new_user(User(sub="stats_user"))
+    days = ["2026-02-01", "2026-02-02", "2026-02-02", "2026-02-03", "2026-02-07", "2026-02-08"]
+    with transaction() as con:
+        for n, day in enumerate(days):
+            con.execute(
+                "INSERT INTO journal_entries(user_sub, created_at, entry_text) VALUES (?, ?, ?)",
+                ("stats_user", f"{day} 1{n}:00:00", f"entry {n}"),
+            )
+    entries = sorted(fetch_journal_entries("stats_user"), key=lambda e: e.journal_entry_no)
+
+    assert count_journal_entries("stats_user") == 6
+    assert count_journal_entries("nobody") == 0
+
+    assert daily_entry_counts("stats_user", "2026-02-02", "2026-02-07") == {"2026-02-02": 2, "2026-02-03": 1, "2026-02-07": 1}
+
+    assert journal_streaks("stats_user", today="2026-02-08") == (2, 3)
+    assert journal_streaks("stats_user", today="2026-02-09") == (2, 3)
+    assert journal_streaks("stats_user", today="2026-02-10") == (0, 3)
+    assert journal_streaks("nobody") == (0, 0)
+
+    happy = dict(happy=80, angry=5, fearful=5, surprised=5, bad=5, disgusted=5, sad=10)
+    sad = dict(happy=10, angry=5, fearful=5, surprised=5, bad=5, disgusted=5, sad=90)
+    add_journal_scores_bulk([
+        JournalScores(journal_entry_no=entries[0].journal_entry_no, **happy),  # 02-01 positive
+        JournalScores(journal_entry_no=entries[1].journal_entry_no, **happy),  # 02-02 averages out negative
+        JournalScores(journal_entry_no=entries[2].journal_entry_no, **sad),
+        JournalScores(journal_entry_no=entries[3].journal_entry_no, **sad),  # 02-03 negative
+        JournalScores(journal_entry_no=entries[4].journal_entry_no, **happy),  # 02-07 positive
+    ])
+    assert count_positive_days("stats_user") == 2
+
+def test_daily_activity_rollup():
+    # the trigger-maintained table must always match a from-scratch rebuild
+    def rollup(con):
+        return sorted(con.execute("SELECT * FROM daily_activity").fetchall())
+
+    def rebuilt(con):
+        return sorted(con.execute(DAILY_ACTIVITY_FROM_ENTRIES).fetchall())
+
+    new_user(User(sub="rollup_a"))
+    new_user(User(sub="rollup_b"))
+    with transaction() as con:
+        for n, (user, day) in enumerate([("rollup_a", "2026-03-01"), ("rollup_a", "2026-03-01"), ("rollup_a", "2026-03-02"), ("rollup_b", "2026-03-01")]):
+            con.execute("INSERT INTO journal_entries(user_sub, created_at, entry_text) VALUES (?, ?, ?)", (user, f"{day} 0{n}:00:00", "x"))
+    a1, a2, a3 = sorted(e.journal_entry_no for e in fetch_journal_entries("rollup_a"))
+    b1 = fetch_journal_entries("rollup_b")[0].journal_entry_no
+
+    scores = JournalScores(happy=60, angry=10, fearful=10, surprised=10, bad=10, disgusted=10, sad=20)
+    save_analysis(a1, scores, [], "walk")
+    save_analysis(a2, scores.model_copy(update={"happy": 20}), [], "walk")
+    save_analysis(b1, scores, [], "walk")
+
+    day = fetch_daily_activity("rollup_a", "2026-03-01", "2026-03-01")[0]
+    assert (day.entry_count, day.scored_count, day.happy, day.sad) == (2, 2, 40.0, 20.0)
+    assert fetch_daily_activity("rollup_a", "2026-03-02", "2026-03-02")[0].happy is None
+
+    # re-saving, updating and deleting scores adjusts the sums
+    save_analysis(a2, scores.model_copy(update={"happy": 40}), [], "walk")
+    assert fetch_daily_activity("rollup_a", "2026-03-01", "2026-03-01")[0].happy == 50.0
+    update_journal_scores(JournalScores(journal_entry_no=a1, happy=0, angry=0, fearful=0, surprised=0, bad=0, disgusted=0, sad=0))
+    delete_journal_scores(a2)
+    with connection() as con:
+        assert rollup(con) == rebuilt(con)
+
+    # moving an entry to another day carries its scores with it
+    add_journal_scores(JournalScores(journal_entry_no=a2, happy=90, angry=0, fearful=0, surprised=0, bad=0, disgusted=0, sad=0))
+    with transaction() as con:
+        con.execute("UPDATE journal_entries SET created_at='2026-03-02 12:00:00' WHERE journal_entry_no=?", (a2,))
+    assert daily_entry_counts("rollup_a", "2026-03-01", "2026-03-31") == {"2026-03-01": 1, "2026-03-02": 2}
+    with connection() as con:
+        assert rollup(con) == rebuilt(con)
+
+    # deleting an entry (cascading to its scores) and a whole user
+    delete_journal_entry(a1)
+    assert daily_entry_counts("rollup_a", "2026-03-01", "2026-03-31") == {"2026-03-02": 2}
+    delete_user("rollup_b")
+    assert fetch_daily_activity("rollup_b", "2026-01-01", "2026-12-31") == []
+    with connection() as con:
+        assert rollup(con) == rebuilt(con)
+
+def test_daily_activity_backfill():
+    new_user(User(sub="backfill_user"))
+    add_journal_entry(JournalEntry(user_sub="backfill_user", entry_text="before the rollup existed"))
+    with transaction() as con:
+        con.execute("DROP TABLE daily_activity")
+        for (name,) in con.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'trg_daily_activity_%'").fetchall():
+            con.execute(f"DROP TRIGGER {name}")
+        # rewind to just before the rollup migration
+        con.execute(f"PRAGMA user_version = {MIGRATIONS.index(db_operations._migration_daily_activity)}")
+    assert initialize_db() == SCHEMA_VERSION - MIGRATIONS.index(db_operations._migration_daily_activity)
+    assert count_journal_entries("backfill_user") == sum(daily_entry_counts("backfill_user", "0000-01-01", "9999-12-31").values()) == 1
+    with connection() as con:
+        assert sorted(con.execute("SELECT * FROM daily_activity").fetchall()) == sorted(con.execute(DAILY_ACTIVITY_FROM_ENTRIES).fetchall())
+
+def test_search_entries():
+    new_user(User(sub="search_user"))
+    new_user(User(sub="other_search_user"))
+    for text in ["Feeling anxious about my exams tomorrow", "A calm walk by the river", "Exams are done, so relieved!"]:
+        add_journal_entry(JournalEntry(user_sub="search_user", entry_text=text))
+    add_journal_entry(JournalEntry(user_sub="other_search_user", entry_text="My exams went badly"))
+
+    results = search_entries("search_user", "exam")
+    assert sorted(r.entry_text for r in results) == ["Exams are done, so relieved!", "Feeling anxious about my exams tomorrow"]
+    assert all(r.user_sub == "search_user" for r in results)
+
+    # stemming, prefix matching on the last word and highlighting
+    hit = search_entries("search_user", "feel anx")[0]
+    assert hit.snippet == "[Feeling] [anxious] about my exams tomorrow"
+
+    # FTS5 syntax in user input is treated as plain words
+    assert search_entries("search_user", 'exams" (') != []
+    assert search_entries("search_user", "  ?! ") == []
+
+    # the index follows updates and deletes
+    calm = search_entries("search_user", "river")[0]
+    update_journal_entry(JournalEntry(journal_entry_no=calm.journal_entry_no, entry_text="A calm walk by the sea"))
+    assert search_entries("search_user", "river") == []
+    assert search_entries("search_user", "sea")[0].journal_entry_no == calm.journal_entry_no
+    delete_journal_entry(calm.journal_entry_no)
+    assert search_entries("search_user", "sea") == []
+    with connection() as con:
+        con.execute("INSERT INTO journal_entries_fts(journal_entries_fts) VALUES ('integrity-check')")
+
+def test_fast_read_rows_match_models():
+    new_user(User(sub="fast_user"))
+    for i in range(3):
+        add_journal_entry(JournalEntry(user_sub="fast_user", entry_text=f"Fast entry {i}"))
+    entry_no = fetch_recent_entries("fast_user", 1)[0].journal_entry_no
+    save_analysis(entry_no, JournalScores(happy=1, angry=2, fearful=3, surprised=4, bad=5, disgusted=6, sad=7), ["x", "y"], "rest")
+
+    def same(model, row):
+        return model.model_dump() == row._asdict()
+
+    rows = fetch_journal_entries("fast_user", fast=True)
+    assert all(isinstance(r, JournalEntryRow) for r in rows)
+    assert all(same(m, r) for m, r in zip(fetch_journal_entries("fast_user"), rows))
+    assert all(same(m, r) for m, r in zip(fetch_journal_entries_page("fast_user", limit=2), fetch_journal_entries_page("fast_user", limit=2, fast=True)))
+    assert same(get_journal_entry(entry_no), get_journal_entry(entry_no, fast=True))
+    assert same(get_journal_scores(entry_no), get_journal_scores(entry_no, fast=True))
+    assert same(get_journal_recommendation(entry_no), get_journal_recommendation(entry_no, fast=True))
+    assert get_journal_recommendation(entry_no, fast=True).is_crisis is False
+    nuances = get_journal_nuances(entry_no, fast=True)
+    assert all(same(m, r) for m, r in zip(get_journal_nuances(entry_no), nuances))
+    assert same(get_journal_nuance_by_id(nuances[0].nuance_id), get_journal_nuance_by_id(nuances[0].nuance_id, fast=True))
+    assert get_journal_scores(999999, fast=True) is None
+
+    # rows convert back to models at the write boundary
+    row = get_journal_entry(entry_no, fast=True)
+    assert update_journal_entry(JournalEntry(**row._replace(entry_text="Edited")._asdict())) is True
+    assert get_journal_entry(entry_no).entry_text == "Edited"
+
+def test_migrations_upgrade_checked_in_fixture(database_file):
+    # a copy of the pre-versioning database shipped in src/
+    fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "user_data.db")
+    path = database_file
+    path.write_bytes(open(fixture, "rb").read())
+
+    raw = sqlite3.connect(path)
+    assert raw.execute("PRAGMA user_version").fetchone()[0] == 0
+    entries_before = raw.execute("SELECT * FROM journal_entries ORDER BY journal_entry_no").fetchall()
+    raw.close()
+
+    configure(path)
+    assert initialize_db() == SCHEMA_VERSION
+    assert initialize_db() == 0  # already current
+
+    with connection() as con:
+        assert con.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert con.execute("SELECT * FROM journal_entries ORDER BY journal_entry_no").fetchall() == entries_before
+        names = {row[0] for row in con.execute("SELECT name FROM sqlite_master")}
+        assert {"idx_journal_entries_user_created", "idx_journal_nuances_entry", "daily_activity", "journal_entries_fts", "journal_entries_with_analysis"} <= names
+        assert sorted(con.execute("SELECT * FROM daily_activity").fetchall()) == sorted(con.execute(DAILY_ACTIVITY_FROM_ENTRIES).fetchall())
+    sub = entries_before[0][1]
+    assert count_journal_entries(sub) == len(entries_before)
+    assert search_entries(sub, "great")[0].entry_text == "I am feeling great today!!"
+
+    # a database from newer code is refused rather than silently used
+    with transaction() as con:
+        con.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    with pytest.raises(RuntimeError):
+        initialize_db()
+
+def test_lazy_initialization(database_file):
+    path = database_file
+    configure(path)
+    assert not path.exists()
+    # the first helper call creates the schema, later ones skip the check
+    assert user_exists("nobody") is False
+    with connection() as con:
+        assert con.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert initialize_db() == 0
+
+    # first use from many threads at once migrates exactly once
+    close_pool()
+    path.unlink()
+    errors = []
+
+    def first_use():
+        try:
+            new_user(User(sub=f"lazy_{threading.get_ident()}"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=first_use) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    with connection() as con:
+        assert con.execute("SELECT count(*) FROM users").fetchone()[0] == 8
+
+def test_configure_locations(database_file, monkeypatch):
+    monkeypatch.chdir(database_file.parent)
+    # ":memory:" is one RAM database shared by every pooled connection and thread
+    assert configure(":memory:").startswith("file:")
+    new_user(User(sub="ram_user"))
+    seen = []
+    with connection():
+        t = threading.Thread(target=lambda: seen.append(user_exists("ram_user")))
+        t.start()
+        t.join()
+    assert seen == [True]
+    close_pool()  # the data lives until the location changes, not just the pool
+    assert user_exists("ram_user") is True
+    assert os.listdir(database_file.parent) == []
+
+    # relative paths are pinned when configured, so a later chdir can't move the database
+    assert configure("relative.db") == str(database_file.parent / "relative.db")
+    assert configure(":memory:") and user_exists("ram_user") is False
+
+    # INSIDEOUT_DB is read at import
+    result = subprocess.run(
+        [sys.executable, "-c", "import db_operations; print(db_operations.DBFOLDER)"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+        env={**os.environ, DB_ENV_VAR: str(database_file)},
+    )
+    assert result.stdout.strip() == str(database_file)
+
+def test_batch_delete_and_purge():
+    for sub in ("purge_a", "purge_b"):
+        new_user(User(sub=sub))
+        with transaction() as con:
+            con.executemany(
+                "INSERT INTO journal_entries(user_sub, created_at, entry_text) VALUES (?, ?, ?)",
+                [(sub, f"2001-01-{1 + n % 28:02d} 12:00:00", "old " * 200) for n in range(40)] +
+                [(sub, "2099-01-01 12:00:00", "future")],
+            )
+    old_a = [e.journal_entry_no for e in fetch_journal_entries("purge_a") if e.entry_text != "future"]
+    save_analysis(old_a[0], JournalScores(happy=1), ["gone"], "gone")
+
+    # by id, with the analysis cascading
+    assert delete_journal_entries(old_a[:5]) == 5
+    assert delete_journal_entries([]) == 0
+    assert get_journal_scores(old_a[0]) is None and get_journal_nuances(old_a[0]) == []
+    # by date range, in chunks smaller than the match
+    in_range = sum(1 for e in fetch_journal_entries("purge_a") if "2001-01-01" <= e.created_at[:10] <= "2001-01-10")
+    assert delete_journal_entries_for_user("purge_a", "2001-01-01", "2001-01-10", chunk_size=3) == in_range > 3
+    assert all(not "2001-01-01" <= e.created_at[:10] <= "2001-01-10" for e in fetch_journal_entries("purge_a"))
+
+    # retention purge across users; the account and newer entries stay
+    with pytest.raises(RuntimeError):
+        with transaction():
+            purge_journal_entries(30)
+    assert purge_journal_entries(30, chunk_size=4, pause=0) > 0
+    for sub in ("purge_a", "purge_b"):
+        assert [e.entry_text for e in fetch_journal_entries(sub)] == ["future"]
+        assert user_exists(sub)
+    with connection() as con:
+        assert sorted(con.execute("SELECT * FROM daily_activity").fetchall()) == sorted(con.execute(DAILY_ACTIVITY_FROM_ENTRIES).fetchall())
+        assert con.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # new databases start incremental
+    assert delete_journal_entries_for_user("purge_b") == 1
+
+def test_enable_incremental_vacuum(database_file):
+    raw = sqlite3.connect(database_file)
+    raw.execute("CREATE TABLE filler(x)")
+    raw.close()
+    configure(database_file)
+    with connection() as con:
+        assert con.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    assert reclaim_free_pages() == 0
+    assert enable_incremental_vacuum() is True
+    assert enable_incremental_vacuum() is False
+    new_user(User(sub="vacuum_user"))
+    with transaction() as con:
+        con.executemany("INSERT INTO journal_entries(user_sub, entry_text) VALUES ('vacuum_user', ?)", [("x" * 2000,) for _ in range(200)])
+    assert delete_journal_entries_for_user("vacuum_user") == 200
+    with connection() as con:
+        assert con.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+def test_analysis_cache(monkeypatch):
+    new_user(User(sub="cache_user"))
+    for n in range(4):
+        add_journal_entry(JournalEntry(user_sub="cache_user", entry_text=f"Cache entry {n}"))
+    ids = sorted(e.journal_entry_no for e in fetch_journal_entries("cache_user"))
+    save_analysis(ids[0], JournalScores(happy=10), ["tired", "hopeful"], "rest", is_crisis=True)
+    save_analysis(ids[1], JournalScores(sad=20), [], "call a friend")
+    clear_analysis_cache()
+
+    statements = []
+    with connection() as con:
+        con.set_trace_callback(statements.append)
+        try:
+            first = get_analysis_for_entries(ids)
+            assert len(statements) == 3  # one IN query per table, not 3 per entry
+            statements.clear()
+            assert get_analysis_for_entries(ids) == first
+            assert statements == []
+        finally:
+            con.set_trace_callback(None)
+    assert list(first) == ids
+    assert first[ids[0]].scores.happy == 10 and first[ids[0]].recommendation.is_crisis is True
+    assert [n.nuance for n in first[ids[0]].nuances] == ["tired", "hopeful"]
+    assert first[ids[2]] == EntryAnalysis(ids[2], None, (), None)
+    info = analysis_cache_info()
+    assert info.hits >= 4 and info.currsize >= 4
+
+    # every write helper invalidates what it touched
+    update_journal_scores(JournalScores(journal_entry_no=ids[0], happy=11))
+    assert get_entry_analysis(ids[0]).scores.happy == 11
+    update_journal_nuance_by_id(JournalNuances(nuance_id=first[ids[0]].nuances[0].nuance_id, nuance="rested"))
+    assert get_entry_analysis(ids[0]).nuances[0].nuance == "rested"
+    delete_journal_nuance_by_id(first[ids[0]].nuances[1].nuance_id)
+    assert len(get_entry_analysis(ids[0]).nuances) == 1
+    add_journal_scores(JournalScores(journal_entry_no=ids[2], fearful=5))
+    assert get_entry_analysis(ids[2]).scores.fearful == 5
+    delete_journal_recommendation(ids[1])
+    assert get_entry_analysis(ids[1]).recommendation is None
+    delete_journal_entry(ids[1])
+    assert get_entry_analysis(ids[1]) == EntryAnalysis(ids[1], None, (), None)
+
+    # inside a larger transaction the cache is only invalidated once it ends
+    with transaction():
+        save_analysis(ids[3], JournalScores(happy=99), ["late"], "sleep")
+    assert get_entry_analysis(ids[3]).scores.happy == 99
+    with pytest.raises(RuntimeError):
+        with transaction():
+            save_analysis(ids[3], JournalScores(happy=1), [], "rolled back")
+            assert get_entry_analysis(ids[3]).scores.happy == 1  # this transaction's own view
+            raise RuntimeError
+    assert get_entry_analysis(ids[3]).scores.happy == 99
+
+    # bounded, least recently used first out
+    clear_analysis_cache()
+    monkeypatch.setattr(db_operations._analysis_cache, "maxsize", 2)
+    get_analysis_for_entries([ids[0], ids[2], ids[3]])
+    assert analysis_cache_info().currsize == 2
+    assert set(db_operations._analysis_cache._items) == {ids[2], ids[3]}
+
+def test_fetch_entries_with_analysis():
+    new_user(User(sub="joined_user"))
+    with transaction() as con:
+        con.executemany(
+            "INSERT INTO journal_entries(user_sub, created_at, entry_text) VALUES ('joined_user', ?, ?)",
+            [(f"2024-05-{1 + n:02d} 08:00:00", f"Joined {n}") for n in range(5)],
+        )
+    ids = [e.journal_entry_no for e in fetch_journal_entries_page("joined_user", limit=5)]  # newest first
+    save_analysis(ids[0], JournalScores(happy=10, sad=80, angry=80), ["low", "heavy", "quiet"], "talk to someone", is_crisis=True)
+    save_analysis(ids[1], JournalScores(happy=0), [], "rest")
+
+    page = fetch_entries_with_analysis("joined_user", limit=3)
+    assert [e.journal_entry_no for e in page] == ids[:3]
+    first = page[0]
+    assert isinstance(first, JournalEntryWithAnalysis)
+    assert (first.happy, first.sad, first.top_emotion) == (10, 80, "angry")  # tie goes to EMOTIONS order
+    assert first.nuances == ["low", "heavy", "quiet"]
+    assert (first.recommendation, first.is_crisis) == ("talk to someone", True)
+    assert page[1].top_emotion == "happy" and page[1].nuances == [] and page[1].is_crisis is False
+    assert page[2].top_emotion is None and page[2].happy is None and page[2].recommendation is None and page[2].is_crisis is None
+
+    # same rows as the four separate getters, in fast mode too, and the same keyset paging
+    rest = fetch_entries_with_analysis("joined_user", after=entry_cursor(page[-1]), fast=True)
+    assert [e.journal_entry_no for e in rest] == ids[3:]
+    row = fetch_entries_with_analysis("joined_user", limit=1, fast=True)[0]
+    assert isinstance(row, JournalEntryWithAnalysisRow)
+    assert JournalEntryWithAnalysis(**row._asdict()) == first
+    assert row.nuances == [n.nuance for n in get_journal_nuances(ids[0])]
+    assert row[4:11] == get_journal_scores(ids[0], fast=True)[1:]
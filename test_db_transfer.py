@@ -0,0 +1,146 @@
+import json
+import pytest
+import db_operations
+import db_transfer
+from db_operations import *
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    previous = db_operations.DBFOLDER
+    configure(":memory:")
+    yield
+    configure(previous)
+
+def _history(sub):
+    history = []
+    for entry in fetch_journal_entries(sub):
+        history.append((
+            entry.created_at, entry.entry_text,
+            get_journal_scores(entry.journal_entry_no, fast=True)[1:] if get_journal_scores(entry.journal_entry_no) else None,
+            sorted(n.nuance for n in get_journal_nuances(entry.journal_entry_no)),
+            get_journal_recommendation(entry.journal_entry_no, fast=True)[1:] if get_journal_recommendation(entry.journal_entry_no) else None,
+        ))
+    return history
+
+def _populate():
+    for sub in ("mover", "stayer"):
+        new_user(User(sub=sub))
+    with transaction() as con:
+        con.executemany(
+            "INSERT INTO journal_entries(user_sub, created_at, entry_text) VALUES (?, ?, ?)",
+            [("mover" if n % 3 else "stayer", f"2024-03-{1 + n % 20:02d} 09:00:00", f"entry {n}, with \"quotes\"\nand lines") for n in range(60)],
+        )
+    for entry in fetch_journal_entries("mover")[:25]:
+        save_analysis(entry.journal_entry_no, JournalScores(happy=entry.journal_entry_no, sad=5), ["calm", "tired"], "walk", is_crisis=entry.journal_entry_no == 2)
+
+@pytest.mark.parametrize("fmt", ["jsonl", "csv"])
+def test_export_import_round_trip(tmp_path, fmt):
+    _populate()
+    before = _history("mover")
+    path = str(tmp_path / ("mover.jsonl" if fmt == "jsonl" else "mover"))
+    exported = (db_transfer.export_jsonl if fmt == "jsonl" else db_transfer.export_csv)(path, ["mover"])
+    assert exported.rows == {"users": 1, "journal_entries": 40, "journal_scores": 25, "journal_nuances": 50, "journal_recommendations": 25}
+
+    # a different database whose entry numbers overlap the exported ones
+    configure(":memory:")
+    new_user(User(sub="resident"))
+    for n in range(10):
+        add_journal_entry(JournalEntry(user_sub="resident", entry_text=f"resident {n}"))
+    progress = []
+    imported = (db_transfer.import_jsonl if fmt == "jsonl" else db_transfer.import_csv)(path, batch_size=7, progress=progress.append)
+    assert imported.rows == exported.rows
+    assert imported.skipped == 0 and imported.rows_per_second > 0
+    assert len(progress) > 5
+
+    assert _history("mover") == before
+    assert count_journal_entries("resident") == 10
+    with connection() as con:
+        assert sorted(con.execute("SELECT * FROM daily_activity").fetchall()) == sorted(con.execute(DAILY_ACTIVITY_FROM_ENTRIES).fetchall())
+        assert con.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'").fetchone()[0] == 10
+        assert con.execute("SELECT count(*) FROM temp.sqlite_master").fetchone()[0] == 0
+    assert {r.entry_text for r in search_entries("mover", "quotes", limit=100)} == {e.entry_text for e in fetch_journal_entries("mover")}
+    assert search_entries("mover", "resident") == []
+
+    # triggers are back: new writes keep the rollup and the index current
+    add_journal_entry(JournalEntry(user_sub="mover", entry_text="after the move"))
+    assert search_entries("mover", "move")[0].entry_text == "after the move"
+    assert count_journal_entries("mover") == 41
+
+def test_import_skips_orphans_and_restores_triggers_on_error(tmp_path):
+    path = tmp_path / "broken.jsonl"
+    rows = [
+        {"table": "users", "sub": "orphan_user", "created_at": None},
+        {"table": "journal_entries", "journal_entry_no": 7, "user_sub": "orphan_user", "created_at": "2024-01-01 10:00:00", "entry_text": "kept"},
+        {"table": "journal_nuances", "journal_entry_no": 8, "nuance": "no such entry"},
+        {"table": "journal_nuances", "journal_entry_no": 7, "nuance": "fine"},
+    ]
+    path.write_text("\n".join(json.dumps(r) for r in rows) + "\n")
+    report = db_transfer.import_jsonl(str(path))
+    assert report.rows["journal_nuances"] == 1 and report.skipped == 1
+
+    # an entry for an unknown user aborts the import, but the triggers come back
+    path.write_text(json.dumps({"table": "journal_entries", "journal_entry_no": 1, "user_sub": "ghost", "created_at": None, "entry_text": "x"}) + "\n")
+    with pytest.raises(sqlite3.IntegrityError):
+        db_transfer.import_jsonl(str(path))
+    with connection() as con:
+        assert con.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'").fetchone()[0] == 10
+    assert [d.entry_count for d in fetch_daily_activity("orphan_user", "2024-01-01", "2024-01-01")] == [1]
+
+def test_writes_during_an_import_are_indexed_and_rolled_up(tmp_path):
+    _populate()
+    path = str(tmp_path / "mover.jsonl")
+    db_transfer.export_jsonl(path, ["mover"])
+    configure(":memory:")
+    new_user(User(sub="resident"))
+    add_journal_entry(JournalEntry(user_sub="resident", entry_text="deleted mid import"))
+    doomed = fetch_journal_entries("resident")[0].journal_entry_no
+
+    written, read_early = [], []
+
+    def write_meanwhile(progress):
+        # direct db_operations writes, as the GUI makes, while the triggers are off
+        if not written:
+            written.append(add_journal_entry(JournalEntry(user_sub="resident", entry_text="written mid import")))
+            delete_journal_entry(doomed)
+        # and reads that cache an imported entry before its analysis arrives
+        if progress.rows["journal_entries"] and not read_early:
+            read_early.extend(get_analysis_for_entries([e.journal_entry_no for e in fetch_journal_entries("mover")]).values())
+
+    db_transfer.import_jsonl(path, batch_size=7, progress=write_meanwhile)
+    assert [r.entry_text for r in search_entries("resident", "import")] == ["written mid import"]
+    assert read_early and all(analysis.scores is None for analysis in read_early)
+    scored = {a.journal_entry_no for a in read_early if get_journal_scores(a.journal_entry_no) is not None}
+    assert scored and {a.journal_entry_no for a in read_early if get_entry_analysis(a.journal_entry_no).scores is not None} == scored
+    with connection() as con:
+        assert sorted(con.execute("SELECT * FROM daily_activity").fetchall()) == sorted(con.execute(DAILY_ACTIVITY_FROM_ENTRIES).fetchall())
+
+def test_startup_repairs_triggers_left_dropped_by_a_killed_import():
+    _populate()
+    expected_search = {r.entry_text for r in search_entries("mover", "quotes", limit=100)}
+    # what a process killed mid-import leaves behind: no triggers, and writes since then not rolled up or indexed
+    with transaction() as con:
+        for (name,) in con.execute(db_transfer._DEFERRED_TRIGGERS).fetchall():
+            con.execute(f"DROP TRIGGER {name}")
+    add_journal_entry(JournalEntry(user_sub="mover", entry_text="written while the triggers were gone"))
+    assert search_entries("mover", "gone") == []
+
+    db_operations._initialized_for = None  # as on the next start
+    initialize_db()
+    with connection() as con:
+        assert con.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'").fetchone()[0] == 10
+        assert sorted(con.execute("SELECT * FROM daily_activity").fetchall()) == sorted(con.execute(DAILY_ACTIVITY_FROM_ENTRIES).fetchall())
+        assert not repair_derived(con)
+    assert len(search_entries("mover", "gone")) == 1
+    assert {r.entry_text for r in search_entries("mover", "quotes", limit=100)} == expected_search
+
+def test_import_refuses_to_run_alongside_the_write_queue(tmp_path):
+    import db_write_queue
+    path = tmp_path / "one.jsonl"
+    path.write_text(json.dumps({"table": "users", "sub": "queued_user", "created_at": None}) + "\n")
+    db_write_queue.submit(new_user, User(sub="writer_user")).result(timeout=5)
+    try:
+        with pytest.raises(RuntimeError):
+            db_transfer.import_jsonl(str(path))
+    finally:
+        db_write_queue.close()
+    assert db_transfer.import_jsonl(str(path)).rows["users"] == 1
@@ -0,0 +1,93 @@
+import threading
+import time
+import pytest
+import db_operations
+import db_write_queue
+from db_write_queue import GroupCommitWriter
+from db_operations import (configure, initialize_db, add_journal_entry, count_journal_entries, new_user,
+                           save_analysis, fetch_journal_entries, get_journal_scores, JournalEntry, JournalScores, User)
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_database():
+    previous = db_operations.DBFOLDER
+    configure(":memory:")
+    initialize_db()
+    yield
+    db_write_queue.close()
+    configure(previous)
+
+def test_writes_from_many_threads_share_commits():
+    new_user(User(sub="burst_user"))
+    writer = GroupCommitWriter(max_latency=0.2)
+    futures = []
+    lock = threading.Lock()
+
+    def producer(n):
+        for i in range(50):
+            future = writer.submit(add_journal_entry, JournalEntry(user_sub="burst_user", entry_text=f"entry {n} {i}"))
+            with lock:
+                futures.append(future)
+
+    threads = [threading.Thread(target=producer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(f.result(timeout=5) is True for f in futures)
+    assert count_journal_entries("burst_user") == 400
+    assert writer.writes == 400
+    assert writer.commits < 400 // 10
+    writer.close()
+
+def test_failed_write_only_fails_its_own_future():
+    new_user(User(sub="mixed_user"))
+    writer = GroupCommitWriter(max_latency=0.2)
+    ok = writer.submit(add_journal_entry, JournalEntry(user_sub="mixed_user", entry_text="kept"))
+    bad = writer.submit(add_journal_entry, JournalEntry(user_sub="no_such_user", entry_text="orphan"))  # foreign key
+    also_ok = writer.submit(add_journal_entry, JournalEntry(user_sub="mixed_user", entry_text="also kept"))
+    writer.flush()
+    assert ok.result() is True and also_ok.result() is True
+    with pytest.raises(db_operations.sqlite3.IntegrityError):
+        bad.result()
+    assert writer.commits == 1
+    assert sorted(e.entry_text for e in fetch_journal_entries("mixed_user")) == ["also kept", "kept"]
+    writer.close()
+
+def test_latency_bound_and_close():
+    new_user(User(sub="latency_user"))
+    writer = GroupCommitWriter(max_latency=0.05)
+    start = time.monotonic()
+    assert writer.submit(add_journal_entry, JournalEntry(user_sub="latency_user", entry_text="alone")).result(timeout=5) is True
+    assert time.monotonic() - start < 1.0
+
+    # close() commits whatever is still queued, then refuses new work
+    add_journal_entry(JournalEntry(user_sub="latency_user", entry_text="analysed"))
+    entry_no = fetch_journal_entries("latency_user")[0].journal_entry_no
+    slow = GroupCommitWriter(max_latency=60)
+    pending = slow.submit(save_analysis, entry_no, JournalScores(happy=40), ["tired"], "rest")
+    slow.close(timeout=5)
+    assert pending.result(timeout=0) is True
+    assert get_journal_scores(entry_no).happy == 40
+    with pytest.raises(RuntimeError):
+        slow.submit(add_journal_entry, JournalEntry(user_sub="latency_user", entry_text="late"))
+    writer.close()
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")  # re-raised on the writer thread
+def test_base_exception_fails_the_batch_and_stops_the_writer():
+    new_user(User(sub="interrupted_user"))
+    writer = GroupCommitWriter(max_latency=0.2)
+    ok = writer.submit(add_journal_entry, JournalEntry(user_sub="interrupted_user", entry_text="rolled back"))
+
+    def interrupt():
+        raise KeyboardInterrupt
+
+    bad = writer.submit(interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        bad.result(timeout=5)
+    with pytest.raises(KeyboardInterrupt):
+        ok.result(timeout=5)  # same transaction, so it was rolled back too
+    writer._thread.join(timeout=5)
+    assert not writer._thread.is_alive()
+    with pytest.raises(RuntimeError):
+        writer.submit(add_journal_entry, JournalEntry(user_sub="interrupted_user", entry_text="late"))
+    assert count_journal_entries("interrupted_user") == 0
@@ -0,0 +1,53 @@
+import os
+import sys
+import threading
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("google.genai")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+import gpt_wrapper
+from gpt_wrapper import Wrapper, complete_lines
+
+class FakeChat:
+    """Stands in for a genai chat: streams its reply in fixed pieces.
+
+    With hold_after, the stream stops after that many pieces until `release` is set.
+    """
+
+    def __init__(self, pieces, hold_after=None):
+        self.pieces = pieces
+        self.hold_after = hold_after
+        self.release = threading.Event()
+        self.sent = 0  # pieces streamed so far
+
+    def send_message(self, message):
+        return SimpleNamespace(text="".join(piece for piece in self.pieces if piece))
+
+    def send_message_stream(self, message):
+        for piece in self.pieces:
+            if self.sent == self.hold_after:
+                assert self.release.wait(5), "stream was never released"
+            self.sent += 1
+            yield SimpleNamespace(text=piece)
+
+def make_wrapper(monkeypatch, pieces, hold_after=None):
+    chat = FakeChat(pieces, hold_after)
+    monkeypatch.setattr(gpt_wrapper.genai, "Client", lambda: SimpleNamespace(chats=SimpleNamespace(create=lambda **kwargs: chat)))
+    return Wrapper(), chat
+
+def test_send_stream_yields_as_chunks_arrive(monkeypatch):
+    pieces = ["- You write most", " on Sundays\n- Sleep", " comes up often\n", None, "- Keep going"]
+    wrapper, chat = make_wrapper(monkeypatch, pieces, hold_after=2)
+    stream = complete_lines(wrapper.send_stream("entries"))
+    # the first line arrives while the rest of the reply is still held back
+    assert next(stream) == "- You write most on Sundays"
+    assert chat.sent == 2
+    chat.release.set()
+    assert list(stream) == ["- Sleep comes up often", "- Keep going"]
+    assert "".join(make_wrapper(monkeypatch, pieces)[0].send_stream("entries")) == wrapper.send("entries")
+
+def test_complete_lines():
+    assert list(complete_lines(["a", "b\nc", "\n\nd"])) == ["ab", "c", "", "d"]
+    assert list(complete_lines([])) == []
+    assert list(complete_lines(["trailing\n"])) == ["trailing"]
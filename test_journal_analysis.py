@@ -0,0 +1,193 @@
+import os
+import re
+import sys
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+import db_operations
+import db_write_queue
+
+pytest.importorskip("google.genai")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+import journal_analyis
+import llm_cache
+from journal_analyis import AgenticAdvice, BatchScores, EntryScores, ExeterWellbeingAgent, JournalScores, SubAnalysis, split_triage_batches
+
+class FakeModels:
+    """Stands in for client.models: answers by response schema after a fixed delay."""
+
+    def __init__(self, delays, scores=None, resource_key="general", fail=(), drop=(), unparsed=(), meet=()):
+        self.delays = delays
+        # schemas whose calls must all be in flight at once: each waits for the others
+        # at a barrier, which breaks (failing the call) if they were made one after another
+        self.meet = meet
+        self.barrier = threading.Barrier(len(meet), timeout=5) if meet else None
+        self.met = []
+        self.unparsed = unparsed  # schemas whose reply doesn't parse (parsed is None)
+        self.drop = drop  # entry numbers a batched triage leaves out
+        self.scores = scores or dict(happy=10, angry=20, fearful=30, surprised=5, bad=40, disgusted=0, sad=60)
+        self.resource_key = resource_key
+        self.fail = fail
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def generate_content(self, model, contents, config):
+        schema = config["response_schema"]
+        with self.lock:
+            self.calls.append((schema.__name__, contents))
+        if schema.__name__ in self.meet:
+            self.barrier.wait()
+            with self.lock:
+                self.met.append(schema.__name__)
+        time.sleep(self.delays.get(schema.__name__, 0))
+        if schema.__name__ in self.fail:
+            raise RuntimeError("model unavailable")
+        if schema.__name__ in self.unparsed:
+            return SimpleNamespace(parsed=None)
+        if schema is BatchScores:
+            numbers = [int(n) for n in re.findall(r"journal_entry_no=(\d+)", contents)]
+            return SimpleNamespace(parsed=BatchScores(results=[
+                EntryScores(journal_entry_no=n, **dict(self.scores, happy=n)) for n in numbers if n not in self.drop]))
+        if schema is JournalScores:
+            return SimpleNamespace(parsed=JournalScores(**self.scores))
+        if schema is AgenticAdvice:
+            return SimpleNamespace(parsed=AgenticAdvice(nuances=["work stress"], personalized_suggestion="Take a walk", is_emergency=False))
+        return SimpleNamespace(parsed=SubAnalysis(nuances=["work stress", "overwhelm"], resource_key=self.resource_key))
+
+def make_agent(monkeypatch, cache=None, local_fallback=True, **kwargs):
+    models = FakeModels(**kwargs)
+    monkeypatch.setattr(journal_analyis.genai, "Client", lambda: SimpleNamespace(models=models))
+    return ExeterWellbeingAgent(cache=cache, local_fallback=local_fallback), models
+
+def test_support_and_specialize_run_concurrently(monkeypatch):
+    agent, models = make_agent(monkeypatch, delays={}, meet=("AgenticAdvice", "SubAnalysis"), local_fallback=False)
+    result = agent.run_workflow("this work is upsetting me")
+    assert sorted(models.met) == ["AgenticAdvice", "SubAnalysis"]  # both were in flight together
+    assert {"triage", "support", "specialize"} <= set(result["timings"])
+    assert result["nuances"] == ["work stress", "overwhelm"]
+    assert result["resource_key"] == "general" and result["is_crisis"] is False
+    assert result["speculation"] is None and result["scores_source"] == "model"
+    # the dependent calls were told the triaged emotion
+    assert all("sad" in contents for name, contents in models.calls if name != "JournalScores")
+
+def test_speculative_support(monkeypatch):
+    agent, models = make_agent(monkeypatch, delays={}, meet=("JournalScores", "AgenticAdvice"), local_fallback=False)
+    hit = agent.run_workflow("this work is upsetting me", speculative_emotion="sad")
+    assert hit["speculation"] == "hit"
+    assert sorted(models.met) == ["AgenticAdvice", "JournalScores"]  # support overlapped triage
+    assert [name for name, _ in models.calls].count("AgenticAdvice") == 1
+
+    agent, models = make_agent(monkeypatch, delays={})
+    miss = agent.run_workflow("this work is upsetting me", speculative_emotion="happy")
+    assert miss["speculation"] == "miss"
+    assert miss["recommendation"] == "Take a walk"
+    support_prompts = [contents for name, contents in models.calls if name == "AgenticAdvice"]
+    assert len(support_prompts) == 2 and "feeling sad" in support_prompts[-1]
+
+def test_crisis_and_optional_specialize(monkeypatch, capsys):
+    agent, _ = make_agent(monkeypatch, delays={"JournalScores": 0, "AgenticAdvice": 0, "SubAnalysis": 0}, resource_key="crisis")
+    result = agent.run_workflow("entry")
+    assert result["is_crisis"] is True and result["recommendation"] == agent.CRISIS_CONTACTS
+
+    agent, _ = make_agent(monkeypatch, delays={"JournalScores": 0, "AgenticAdvice": 0, "SubAnalysis": 0}, fail=("SubAnalysis",))
+    result = agent.run_workflow("entry")
+    assert result["nuances"] == ["work stress"] and result["resource_key"] is None
+
+    # a failed support call gets a stock suggestion for the top emotion, unless the fallback is off
+    agent, _ = make_agent(monkeypatch, delays={}, fail=("AgenticAdvice",))
+    result = agent.run_workflow("entry")
+    assert result["recommendation"] == journal_analyis.LOCAL_SUGGESTIONS["sad"] and result["is_crisis"] is False
+    assert result["nuances"] == ["work stress", "overwhelm"]
+    agent, _ = make_agent(monkeypatch, delays={}, fail=("AgenticAdvice",), local_fallback=False)
+    with pytest.raises(RuntimeError):
+        agent.run_workflow("entry")
+
+    agent, _ = make_agent(monkeypatch, delays={}, fail=("JournalScores",))
+    assert agent.run_workflow("so happy today")["scores_source"] == "local"
+
+    # an unparsed triage reply is a failure too, and verbose=False stays quiet about it
+    agent, _ = make_agent(monkeypatch, delays={}, unparsed=("JournalScores",))
+    capsys.readouterr()
+    result = agent.run_workflow("so happy today", verbose=False)
+    assert result["scores_source"] == "local" and result["scores"].happy > 50
+    assert capsys.readouterr().out == ""
+    agent, _ = make_agent(monkeypatch, delays={}, unparsed=("JournalScores",), local_fallback=False)
+    with pytest.raises(ValueError):
+        agent.run_workflow("so happy today")
+
+def test_cached_responses(monkeypatch):
+    previous = db_operations.DBFOLDER
+    db_operations.configure(":memory:")
+    try:
+        db_operations.new_user(db_operations.User(sub="agent_user"))
+        for text in ("this work is upsetting me", "a different entry"):
+            db_operations.add_journal_entry(db_operations.JournalEntry(user_sub="agent_user", entry_text=text))
+        upsetting, different = sorted(e.journal_entry_no for e in db_operations.fetch_journal_entries("agent_user"))
+        cache = llm_cache.ResponseCache()
+        agent, models = make_agent(monkeypatch, cache=cache, delays={"JournalScores": 0, "AgenticAdvice": 0, "SubAnalysis": 0})
+        first = agent.run_workflow("this work is upsetting me", journal_entry_no=upsetting)
+        again = agent.run_workflow("this work is upsetting me", journal_entry_no=upsetting)
+        assert len(models.calls) == 3
+        assert again["scores"] == first["scores"] and again["recommendation"] == first["recommendation"]
+        agent.run_workflow("a different entry", journal_entry_no=different)
+        assert len(models.calls) == 6
+        info = cache.info()
+        assert (info.hits, info.misses, info.currsize) == (3, 6, 6)
+        # unsaved text is answered but not stored; a deleted entry takes its responses with it
+        agent.run_workflow("not saved yet")
+        assert cache.info().currsize == 6
+        db_operations.delete_journal_entry(upsetting)
+        assert cache.info().currsize == 3
+    finally:
+        db_write_queue.close()  # commit the queued hit bookkeeping before switching back
+        db_operations.configure(previous)
+
+def test_split_triage_batches():
+    entries = {n: "x" * 400 for n in range(10)}  # ~100 tokens each
+    assert [list(b) for b in split_triage_batches(entries, max_tokens=350, max_entries=10)] == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+    assert [len(b) for b in split_triage_batches(entries, max_tokens=10_000, max_entries=4)] == [4, 4, 2]
+    assert [list(b) for b in split_triage_batches({1: "x" * 4000, 2: "short"}, max_tokens=350)] == [[1], [2]]
+
+def test_triage_batch(monkeypatch):
+    monkeypatch.setattr(journal_analyis, "TRIAGE_BATCH_ENTRIES", 10)
+    agent, models = make_agent(monkeypatch, delays={}, drop=(7,))
+    scores = agent.triage_batch({n: f"entry {n}" for n in range(1, 31)})
+    assert list(scores) == list(range(1, 31))
+    assert scores[12].happy == 12 and isinstance(scores[12], JournalScores)
+    names = [name for name, _ in models.calls]
+    assert names.count("BatchScores") == 3 and names.count("JournalScores") == 1  # entry 7 fell back
+    assert scores[7].happy == 10  # from its own call
+
+    # a failed batch falls back to one call per entry, and a failed call to local scores
+    agent, models = make_agent(monkeypatch, delays={}, fail=("BatchScores", "JournalScores"))
+    scores = agent.triage_batch({1: "so happy today", 2: "lonely and sad"})
+    assert [name for name, _ in models.calls].count("JournalScores") == 2
+    assert scores[1].happy > 50 and scores[2].sad > 50
+
+    # without the local fallback, entries that still fail are left out
+    agent, _ = make_agent(monkeypatch, delays={}, fail=("BatchScores", "JournalScores"), local_fallback=False)
+    assert agent.triage_batch({1: "a", 2: "b"}) == {}
+
+def test_workflow_with_precomputed_scores(monkeypatch):
+    agent, models = make_agent(monkeypatch, delays={})
+    result = agent.run_workflow("entry", speculative_emotion="sad", scores=JournalScores(happy=90, angry=0, fearful=0, surprised=0, bad=0, disgusted=0, sad=0))
+    assert "JournalScores" not in [name for name, _ in models.calls]
+    assert result["scores"].happy == 90 and result["speculation"] is None and result["scores_source"] == "given"
+    assert all("happy" in contents for _, contents in models.calls)
+
+def test_crisis_screen_short_circuits(monkeypatch):
+    agent, models = make_agent(monkeypatch, delays={"JournalScores": 1, "AgenticAdvice": 1, "SubAnalysis": 1})
+    result = agent.run_workflow("I can't do this anymore, I just want to end it all", speculative_emotion="sad")
+    assert models.calls == []
+    assert result["is_crisis"] is True and result["recommendation"] == agent.CRISIS_CONTACTS
+    assert result["crisis_terms"] == ["end it all"] and result["resource_key"] == "crisis"
+    assert set(result["timings"]) == {"screen", "total"}
+    assert set(result["scores"].model_dump()) == set(JournalScores.model_fields)
+    assert result["scores_source"] == "local"
+
+    # without the local fallback (backfill), a crisis entry is still triaged by the model
+    agent, models = make_agent(monkeypatch, delays={}, local_fallback=False)
+    result = agent.run_workflow("I just want to end it all")
+    assert [name for name, _ in models.calls] == ["JournalScores"]
+    assert result["is_crisis"] is True and result["scores_source"] == "model" and result["scores"].sad == 60
@@ -0,0 +1,140 @@
+from typing import List
+import pytest
+from pydantic import BaseModel
+import db_operations
+import db_write_queue
+import llm_cache
+from llm_cache import ResponseCache, cache_key
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    previous = db_operations.DBFOLDER
+    db_operations.configure(":memory:")
+    db_operations.new_user(db_operations.User(sub="cache_user"))
+    for n in range(3):
+        db_operations.add_journal_entry(db_operations.JournalEntry(user_sub="cache_user", entry_text=f"entry {n}"))
+    yield
+    db_write_queue.close()
+    db_operations.configure(previous)
+
+class Advice(BaseModel):
+    nuances: List[str]
+    suggestion: str
+
+def _entries():
+    return sorted(e.journal_entry_no for e in db_operations.fetch_journal_entries("cache_user"))
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+def test_hits_return_parsed_copies():
+    cache = ResponseCache()
+    owners = _entries()[:1]
+    calls = []
+
+    def call():
+        calls.append(1)
+        return Advice(nuances=["tired"], suggestion="walk")
+
+    first = cache.cached("model", "be kind", "entry", Advice, call, owners)
+    second = cache.cached("model", "be kind", "entry", Advice, call, owners)
+    assert len(calls) == 1
+    assert second == first and second is not first and isinstance(second, Advice)
+    # every part of the request is in the key
+    cache.cached("other model", "be kind", "entry", Advice, call, owners)
+    cache.cached("model", None, "entry", Advice, call, owners)
+    cache.cached("model", "be kind", "entry!", Advice, call, owners)
+    assert len(calls) == 4
+    info = cache.info()
+    assert (info.hits, info.misses, info.stores, info.currsize) == (1, 4, 4, 4)
+    assert info.hit_rate == 0.2
+
+    # a failed call (None) is not stored
+    assert cache.cached("model", None, "nothing", Advice, lambda: None, owners) is None
+    assert cache.info().currsize == 4
+
+def test_schema_changes_miss():
+    class Scores(BaseModel):
+        happy: int
+
+    class Scores2(BaseModel):
+        happy: int
+        sad: int
+
+    assert cache_key("m", None, "p", Scores) != cache_key("m", None, "p", Scores2)
+    cache = ResponseCache()
+    key = cache_key("m", None, "p", Scores)
+    cache.put(key, Scores, Scores(happy=1), _entries())
+    assert cache.get(key, Scores2) is None  # unparseable as the new schema
+    assert cache.get(key, Scores) == Scores(happy=1)
+
+def test_ttl_and_lru_eviction():
+    clock = Clock()
+    cache = ResponseCache(ttl=100, max_entries=3, clock=clock)
+    for n in range(3):
+        cache.put(f"key{n}", Advice, Advice(nuances=[], suggestion=str(n)), _entries())
+        clock.now += 1
+    assert cache.get("key0", Advice).suggestion == "0"  # now the most recently used
+    db_write_queue.flush()
+    cache.put("key3", Advice, Advice(nuances=[], suggestion="3"), _entries())
+    assert cache.get("key1", Advice) is None  # least recently used, evicted
+    assert [cache.get(f"key{n}", Advice) is not None for n in (0, 2, 3)] == [True, True, True]
+    assert cache.info().evictions == 1
+
+    clock.now += 101
+    assert cache.get("key3", Advice) is None  # expired
+    cache.put("key4", Advice, Advice(nuances=[], suggestion="4"), _entries())
+    assert cache.info().currsize == 1 and cache.info().evictions == 4
+
+    db_write_queue.flush()
+    with db_operations.connection() as con:
+        assert con.execute("SELECT hits FROM llm_cache").fetchall() == [(0,)]
+        # expiry on every put must not scan the table
+        plan = " ".join(row[3] for row in con.execute("EXPLAIN QUERY PLAN DELETE FROM llm_cache WHERE created_at <= ?", (0,)))
+        assert "idx_llm_cache_created" in plan
+    cache.clear()
+    assert cache.info().currsize == 0
+
+def test_responses_are_deleted_with_their_entries():
+    first, second, third = _entries()
+    cache = ResponseCache()
+    advice = Advice(nuances=["tired"], suggestion="walk")
+    cache.put("one", Advice, advice, [first])
+    cache.put("batch", Advice, advice, [second, third])  # a batched call about two entries
+    cache.put("user", Advice, advice, [third])
+    assert cache.get("one", Advice, [second]) == advice  # the same request for another entry owns it too
+    db_write_queue.flush()
+
+    # deleting any owner deletes the response, and with it the other owners' links
+    db_operations.delete_journal_entry(first)
+    assert cache.get("one", Advice) is None and cache.get("batch", Advice) == advice
+    db_operations.delete_journal_entries([second])
+    assert cache.get("batch", Advice) is None and cache.get("user", Advice) == advice
+    db_operations.delete_user("cache_user")
+    assert cache.info().currsize == 0
+    with db_operations.connection() as con:
+        assert con.execute("SELECT count(*) FROM llm_cache_owners").fetchone()[0] == 0
+
+    # nothing is stored without an entry to own it, or for one already deleted
+    with pytest.raises(ValueError):
+        cache.put("nobody", Advice, advice, [])
+    assert cache.put("gone", Advice, advice, [first]) is False
+    assert cache.cached("model", None, "unsaved text", Advice, lambda: advice) == advice
+    assert cache.info().currsize == 0
+
+def test_retention_purge_deletes_responses():
+    cache = ResponseCache()
+    cache.put("old", Advice, Advice(nuances=[], suggestion="walk"), _entries())
+    with db_operations.transaction() as con:
+        con.execute("UPDATE journal_entries SET created_at = '2000-01-01 00:00:00'")
+    assert db_operations.purge_journal_entries(30, pause=0) == 3
+    assert cache.info().currsize == 0
+
+def test_shared_cache():
+    assert llm_cache.get_cache() is llm_cache.get_cache()
+    with pytest.raises(ValueError):
+        ResponseCache(max_entries=0)
@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import pytest
+import db_operations
+from db_operations import *
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+import local_scorer
+from local_scorer import agreement, score, top_emotion
+
+@pytest.mark.parametrize("text, emotion", [
+    ("Had a lovely walk with friends and laughed a lot, feeling grateful.", "happy"),
+    ("I'm so stressed about the deadline and really tired.", "bad"),
+    ("Honestly furious that my flatmate ate my food again, so unfair.", "angry"),
+    ("Missing home today. Lonely, cried after the call.", "sad"),
+    ("Totally shocked by the results, completely unexpected!", "surprised"),
+    ("Panicking about tomorrow, so anxious I can barely think.", "fearful"),
+    ("That was disgusting and I felt ashamed to be there.", "disgusted"),
+])
+def test_top_emotion(text, emotion):
+    assert top_emotion(text) == emotion
+    assert set(score(text).scores) == set(EMOTIONS)
+
+def test_negation_intensifiers_and_stems():
+    assert score("I am not sad at all").matches == 0 and top_emotion("I am not sad at all") is None
+    assert score("not happy").scores["sad"] > 0 and score("not happy").scores["happy"] == 0
+    assert score("really tired").scores["bad"] > score("tired").scores["bad"] > score("a bit tired").scores["bad"]
+    assert score("stressful week").scores["bad"] > 0  # stem
+    assert score("saddle").matches == 0  # short stems only match whole words
+    for word in ("number", "example", "download", "downtown", "mission", "missile"):
+        assert score(word).matches == 0, word  # nor do the stems in WHOLE_WORDS
+    assert all(score(word).scores["sad"] > 0 for word in ("numb", "numbness", "down", "missing", "missed"))
+    assert score("exams").scores["fearful"] > 0
+    assert score("so fed up").scores["angry"] > 0  # phrase
+    assert all(0 <= value <= 100 for value in score("happy " * 100).scores.values())
+
+def test_agreement_with_recorded_scores():
+    previous = db_operations.DBFOLDER
+    configure(":memory:")
+    try:
+        new_user(User(sub="scorer_user"))
+        for text, happy, sad in [("so happy today", 80, 10), ("lonely and sad", 5, 90), ("an ordinary day", 30, 20)]:
+            add_journal_entry(JournalEntry(user_sub="scorer_user", entry_text=text))
+            entry_no = fetch_recent_entries("scorer_user", 1, fast=True)[0].journal_entry_no
+            save_analysis(entry_no, JournalScores(happy=happy, angry=0, fearful=0, surprised=0, bad=0, disgusted=0, sad=sad), [], "rest")
+        add_journal_entry(JournalEntry(user_sub="scorer_user", entry_text="not analysed yet"))
+        pairs = local_scorer.recorded_scores("scorer_user")
+        assert len(pairs) == 3
+        stats = agreement(pairs)
+        # the third entry has no lexicon words, so its local top emotion is the tie-break, happy
+        assert stats.entries == 3 and stats.top_emotion_agreement == 1.0
+        assert 0 < stats.mean_absolute_error < 100 and set(stats.per_emotion_error) == set(EMOTIONS)
+        assert "3 entries" in str(stats)
+    finally:
+        configure(previous)
+    assert agreement([]).entries == 0
+
+def test_scoring_is_fast():
+    start = time.perf_counter()
+    for _ in range(200):
+        for text in local_scorer.SAMPLE_ENTRIES:
+            score(text)
+    assert (time.perf_counter() - start) / (200 * len(local_scorer.SAMPLE_ENTRIES)) < 0.001